@@ -0,0 +1,383 @@
+"""
+Artifact retention, compaction and archival.
+
+Artifacts keep their payloads in the database for ARTIFACT_RETENTION_DAYS
+(per feature: ARTIFACT_FEATURE_RETENTION_DAYS; 0 keeps them forever, the
+default, so retention is opt-in). After that the compactor moves them out:
+
+- Errors and artifacts with feedback are always archived.
+- Successful artifacts are archived at the feature's sample rate
+  (ARTIFACT_ARCHIVE_SAMPLE_RATE, ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES),
+  chosen by a hash of the artifact ID so reruns decide the same way; the
+  rest are deleted.
+
+Archived artifacts are appended to compressed JSONL files partitioned by
+creation date under ARTIFACT_ARCHIVE_DIR (YYYY/MM/DD/artifacts-*.jsonl.gz,
+or .zst with ARTIFACT_ARCHIVE_COMPRESSION=zstd). Their rows stay in
+ai_artifacts without payloads and with archive_ref naming the file, so
+lists, feedback links and the detail endpoint keep working; the detail
+endpoint reads the payloads back from the archive (load_archived_artifact).
+Payload blobs (see payload_blobs.py) are written into the archived records
+and their references released, for archived and deleted artifacts alike.
+
+Each batch of ARTIFACT_COMPACTION_BATCH_SIZE artifacts is one transaction,
+so the compactor never holds the SQLite write lock for long. The archive
+file is written before the transaction commits: a failed commit leaves an
+unreferenced file, never a row pointing at a missing one. On SQLite the
+pages freed are then returned to the OS with PRAGMA incremental_vacuum
+(databases created with auto_vacuum=INCREMENTAL, see db_config.py; convert
+an existing database once with `python artifact_retention.py --vacuum-full`).
+PostgreSQL reclaims the space with autovacuum.
+
+When a retention period is configured, the compactor runs every
+ARTIFACT_COMPACTION_INTERVAL seconds for the app lifespan. It can also be run
+once from the command line:
+
+    python artifact_retention.py
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import uuid
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from artifacts import artifact_to_dict
+from capture_policy import is_sampled
+from config import settings
+from database import AIArtifact, AIFeedback, get_engine, get_session_local
+from payload_blobs import blob_hashes, load_blobs, release_blobs, restore_blobs
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("grocery-planner-ai.artifact_retention")
+
+_REF_PATTERN = re.compile(r"^\d{4}/\d{2}/\d{2}/artifacts-[0-9a-f]{16}\.jsonl\.(gz|zst)$")
+
+
+def retention_days(feature: str) -> int:
+    """Days a feature's artifacts keep their payloads in the database (0: forever)."""
+    return settings.ARTIFACT_FEATURE_RETENTION_DAYS.get(feature, settings.ARTIFACT_RETENTION_DAYS)
+
+
+def retention_enabled() -> bool:
+    """Whether any feature has a retention period, i.e. the compactor has work to do."""
+    return settings.ARTIFACT_RETENTION_DAYS > 0 or any(
+        days > 0 for days in settings.ARTIFACT_FEATURE_RETENTION_DAYS.values()
+    )
+
+
+def archive_sample_rate(feature: str) -> float:
+    """Fraction of a feature's expired successful artifacts that are archived."""
+    return settings.ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES.get(feature, settings.ARTIFACT_ARCHIVE_SAMPLE_RATE)
+
+
+def _codec() -> str:
+    if settings.ARTIFACT_ARCHIVE_COMPRESSION == "zstd":
+        if zstandard is not None:
+            return "zstd"
+        logger.warning("ARTIFACT_ARCHIVE_COMPRESSION=zstd but zstandard is not installed, using gzip")
+    return "gzip"
+
+
+def archive_path(ref: str) -> str:
+    """
+    Filesystem path of an archive file.
+
+    Raises:
+        ValueError: If the reference is not an archive reference (e.g. a path traversal attempt)
+    """
+    if not _REF_PATTERN.match(ref):
+        raise ValueError(f"Invalid archive reference: {ref!r}")
+    return os.path.join(settings.ARTIFACT_ARCHIVE_DIR, *ref.split("/"))
+
+
+def write_archive(records: list[dict], day: date) -> str:
+    """
+    Write artifact records to a new archive file in the day's partition.
+
+    Returns:
+        The archive reference (path relative to ARTIFACT_ARCHIVE_DIR)
+    """
+    extension = "zst" if _codec() == "zstd" else "gz"
+    ref = f"{day:%Y/%m/%d}/artifacts-{uuid.uuid4().hex[:16]}.jsonl.{extension}"
+    path = archive_path(ref)
+    data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode()
+    if extension == "zst":
+        compressed = zstandard.ZstdCompressor(level=10).compress(data)
+    else:
+        compressed = gzip.compress(data, compresslevel=6)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return ref
+
+
+def load_archived_artifact(ref: str, artifact_id: str) -> Optional[dict]:
+    """
+    Read an archived artifact record.
+
+    Returns:
+        The record (artifact_to_dict format), or None if the file or the
+        artifact is missing
+    """
+    try:
+        with open(archive_path(ref), "rb") as f:
+            compressed = f.read()
+    except FileNotFoundError:
+        logger.warning(f"Archive file {ref} of artifact {artifact_id} is missing")
+        return None
+    if ref.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd archives")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+    else:
+        data = gzip.decompress(compressed)
+
+    marker = f'"id":"{artifact_id}"'.encode()
+    for line in data.splitlines():
+        # Cheap substring test before decoding the line
+        if marker in line:
+            record = json.loads(line)
+            if record["id"] == artifact_id:
+                return record
+    return None
+
+
+def restore_archived_payloads(record: dict, ref: Optional[str]) -> dict:
+    """Fill an artifact_to_dict record's payloads from its archive file, if archived."""
+    if ref:
+        archived = load_archived_artifact(ref, record["id"])
+        if archived is not None:
+            record["input_payload"] = archived["input_payload"]
+            record["output_payload"] = archived["output_payload"]
+    return record
+
+
+def _compact_batch(db: Session, feature: str, cutoff: datetime, batch_size: int) -> tuple[int, int, int]:
+    """Archive or delete one batch; returns (selected, archived, deleted)."""
+    query = (
+        select(AIArtifact)
+        .where(AIArtifact.feature == feature, AIArtifact.archive_ref.is_(None), AIArtifact.created_at < cutoff)
+        .order_by(AIArtifact.created_at)
+        .limit(batch_size)
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        # Other instances' compactors take other rows
+        query = query.with_for_update(skip_locked=True)
+    artifacts = db.scalars(query).all()
+    if not artifacts:
+        return 0, 0, 0
+
+    ids = [artifact.id for artifact in artifacts]
+    with_feedback = set(db.scalars(select(AIFeedback.artifact_id).where(AIFeedback.artifact_id.in_(ids))))
+    rate = archive_sample_rate(feature)
+    by_day, dropped = defaultdict(list), []
+    for artifact in artifacts:
+        if artifact.status != "success" or artifact.id in with_feedback or is_sampled(artifact.id, rate):
+            by_day[artifact.created_at.date()].append(artifact)
+        else:
+            dropped.append(artifact.id)
+
+    blobs = load_blobs(
+        db, (key for day_artifacts in by_day.values() for a in day_artifacts for key in blob_hashes(a.blob_hashes))
+    )
+    archived = 0
+    for day, day_artifacts in by_day.items():
+        ref = write_archive([restore_blobs(artifact_to_dict(a), blobs) for a in day_artifacts], day)
+        db.execute(
+            update(AIArtifact)
+            .where(AIArtifact.id.in_([a.id for a in day_artifacts]))
+            .values(archive_ref=ref, input_payload="null", output_payload=None, blob_hashes=None)
+            .execution_options(synchronize_session=False)
+        )
+        archived += len(day_artifacts)
+    if dropped:
+        db.execute(
+            delete(AIArtifact).where(AIArtifact.id.in_(dropped)).execution_options(synchronize_session=False)
+        )
+    release_blobs(db, (artifact.blob_hashes for artifact in artifacts))
+    db.commit()
+    db.expunge_all()
+    return len(artifacts), archived, len(dropped)
+
+
+def compact_artifacts(db: Session, now: Optional[datetime] = None, batch_size: Optional[int] = None) -> dict[str, int]:
+    """
+    Archive or delete every artifact past its feature's retention.
+
+    Args:
+        db: Database session
+        now: Reference time for the retention cutoffs (default: utcnow)
+        batch_size: Artifacts per transaction (default: ARTIFACT_COMPACTION_BATCH_SIZE)
+
+    Returns:
+        Counts of archived and deleted artifacts
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or settings.ARTIFACT_COMPACTION_BATCH_SIZE
+    totals = {"archived": 0, "deleted": 0}
+    for feature in db.scalars(select(AIArtifact.feature).distinct()).all():
+        days = retention_days(feature)
+        if days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        while True:
+            selected, archived, deleted = _compact_batch(db, feature, cutoff, batch_size)
+            totals["archived"] += archived
+            totals["deleted"] += deleted
+            if selected < batch_size:
+                break
+    if totals["archived"] or totals["deleted"]:
+        logger.info(f"Compacted artifacts: {totals['archived']} archived, {totals['deleted']} deleted")
+    return totals
+
+
+def incremental_vacuum(engine: Engine, pages: Optional[int] = None) -> int:
+    """
+    Return free pages of a SQLite database with auto_vacuum=INCREMENTAL to the OS.
+
+    Args:
+        engine: Database engine
+        pages: Maximum pages to release, 0 for all (default: ARTIFACT_VACUUM_PAGES)
+
+    Returns:
+        Pages released (0 for other databases and other auto_vacuum modes)
+    """
+    if engine.dialect.name != "sqlite":
+        return 0
+    pages = settings.ARTIFACT_VACUUM_PAGES if pages is None else pages
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:  # INCREMENTAL
+            return 0
+        before = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        conn.commit()
+        # The pragma frees one page per step and sqlite3's execute() steps a
+        # statement without result columns only once; executescript() runs it
+        # to completion
+        conn.connection.dbapi_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return before - conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def vacuum_full(engine: Engine) -> None:
+    """Switch an existing SQLite database to auto_vacuum=INCREMENTAL with a full VACUUM (blocks writers)."""
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.exec_driver_sql("VACUUM")
+
+
+class ArtifactCompactor:
+    """
+    Runs compaction passes in the background.
+
+    Args:
+        interval: Seconds between passes (default: ARTIFACT_COMPACTION_INTERVAL)
+    """
+
+    def __init__(self, interval: Optional[int] = None):
+        self.interval = interval if interval is not None else settings.ARTIFACT_COMPACTION_INTERVAL
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self.passes = 0
+        self.archived = 0
+        self.deleted = 0
+        self.vacuumed_pages = 0
+        self.last_run_at: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the compaction task on the running event loop (no-op if the interval is 0)."""
+        if self.running or self.interval <= 0:
+            return
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Artifact compactor started (every {self.interval}s)")
+
+    async def stop(self) -> None:
+        """Stop after the pass in progress, if any."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        logger.info("Artifact compactor stopped")
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Artifact compaction failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def run_once(self) -> dict[str, int]:
+        """Run one compaction pass followed by an incremental vacuum."""
+        db = get_session_local()()
+        try:
+            totals = compact_artifacts(db)
+        finally:
+            db.close()
+        totals["vacuumed_pages"] = incremental_vacuum(get_engine())
+        self.passes += 1
+        self.archived += totals["archived"]
+        self.deleted += totals["deleted"]
+        self.vacuumed_pages += totals["vacuumed_pages"]
+        self.last_run_at = datetime.utcnow()
+        return totals
+
+    def stats(self) -> dict[str, Any]:
+        """Compactor counters for metrics."""
+        return {
+            "running": self.running,
+            "passes": self.passes,
+            "archived": self.archived,
+            "deleted": self.deleted,
+            "vacuumed_pages": self.vacuumed_pages,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+        }
+
+
+artifact_compactor = ArtifactCompactor()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Archive and delete expired artifacts")
+    parser.add_argument(
+        "--vacuum-full", action="store_true",
+        help="First switch an existing SQLite database to incremental auto_vacuum (rewrites the file)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.vacuum_full:
+        vacuum_full(get_engine())
+    totals = ArtifactCompactor().run_once()
+    print(f"Archived {totals['archived']}, deleted {totals['deleted']}, released {totals['vacuumed_pages']} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Batched artifact writer.
+
+Request handlers record artifacts by enqueueing rows; a background task
+writes them in batches (ARTIFACT_WRITER_BATCH_SIZE rows, or whatever arrived
+within ARTIFACT_WRITER_FLUSH_MS of the first) with one INSERT per batch on a
+worker thread, so no request waits for a database commit. The buffer holds
+at most ARTIFACT_WRITER_BUFFER rows; when it is full, record_artifact waits
+for the writer to catch up instead of growing memory.
+
+The writer runs for the app lifespan, which flushes it on shutdown. When it
+is not running (scripts, tests without lifespan, ARTIFACT_WRITER_ENABLED=false),
+rows are written immediately.
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from artifacts import artifact_row, insert_artifacts
+from config import settings
+from database import get_session_local
+
+logger = logging.getLogger("grocery-planner-ai.artifact_writer")
+
+# Queued after the last row by stop()
+_STOP = object()
+
+
+class ArtifactWriter:
+    """
+    Buffers artifact rows and writes them in batches.
+
+    Args:
+        batch_size: Maximum rows per write (default: ARTIFACT_WRITER_BATCH_SIZE)
+        flush_ms: Maximum time a row waits for its batch to fill (default: ARTIFACT_WRITER_FLUSH_MS)
+        buffer_size: Maximum buffered rows (default: ARTIFACT_WRITER_BUFFER)
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_ms: Optional[int] = None,
+        buffer_size: Optional[int] = None,
+    ):
+        self.batch_size = batch_size or settings.ARTIFACT_WRITER_BATCH_SIZE
+        self.flush_ms = flush_ms or settings.ARTIFACT_WRITER_FLUSH_MS
+        self.buffer_size = buffer_size or settings.ARTIFACT_WRITER_BUFFER
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start the writer task on the running event loop."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.buffer_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info("Artifact writer started")
+
+    async def stop(self) -> None:
+        """Write all buffered rows and stop the writer task."""
+        if self._task is None:
+            return
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+        self._queue = None
+        logger.info("Artifact writer stopped")
+
+    async def record_artifact(self, **fields: Any) -> str:
+        """
+        Record an artifact for an AI operation.
+
+        Args:
+            **fields: Artifact fields (see artifacts.create_artifact)
+
+        Returns:
+            The generated artifact ID
+        """
+        row = artifact_row(**fields)
+        if self.running:
+            # Waits while the buffer is full (back-pressure)
+            await self._queue.put(row)
+        else:
+            await asyncio.to_thread(self._write, [row])
+        return row["id"]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+
+            batch = [row]
+            flush_at = loop.time() + self.flush_ms / 1000
+            while len(batch) < self.batch_size:
+                try:
+                    row = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = flush_at - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            await asyncio.to_thread(self._write, batch)
+
+    def _write(self, rows: list[dict]) -> None:
+        """Insert rows in one transaction; on failure, retry them one by one."""
+        db = get_session_local()()
+        try:
+            try:
+                insert_artifacts(db, rows)
+                self.written += len(rows)
+                self.batches += 1
+                logger.debug(f"Wrote {len(rows)} artifacts")
+                return
+            except Exception as e:
+                db.rollback()
+                if len(rows) == 1:
+                    self.failed += 1
+                    logger.error(f"Failed to write artifact {rows[0]['id']}: {e}")
+                    return
+                logger.warning(f"Artifact batch of {len(rows)} failed, writing rows individually: {e}")
+
+            for row in rows:
+                try:
+                    insert_artifacts(db, [row])
+                    self.written += 1
+                except Exception as e:
+                    db.rollback()
+                    self.failed += 1
+                    logger.error(f"Failed to write artifact {row['id']}: {e}")
+        finally:
+            db.close()
+
+    def stats(self) -> dict[str, Any]:
+        """Writer counters for metrics."""
+        return {
+            "running": self.running,
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "buffer_size": self.buffer_size,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+artifact_writer = ArtifactWriter()
+
+
+async def record_artifact(**fields: Any) -> str:
+    """Record an artifact through the shared writer (see ArtifactWriter.record_artifact)."""
+    return await artifact_writer.record_artifact(**fields)
@@ -2,16 +2,28 @@
 Artifact service for storing AI request/response data.
 
 Provides persistence of AI operations for debugging, evaluation, and audit.
+
+The *_async functions are the AsyncSession versions used by the API
+endpoints; writes run the sync implementation on the session's async
+connection (run_sync).
 """
 
+import functools
 import json
 import uuid
 from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from capture_policy import (
+    CAPTURE_HASH, CAPTURE_TRUNCATED, canonical_json, capture_policy, payload_hash, truncate_strings,
+)
 from database import AIArtifact, AIFeedback
+from pagination import APPROXIMATE_COUNT_CAP, keyset_page
+from payload_blobs import extract_blobs, store_blobs
 import logging
 
 logger = logging.getLogger("grocery-planner-ai.artifacts")
@@ -27,6 +39,76 @@ def generate_feedback_id() -> str:
     return f"fb_{uuid.uuid4().hex[:16]}"
 
 
+def artifact_row(
+    request_id: str,
+    tenant_id: str,
+    user_id: Optional[str] = None,
+    feature: str = "",
+    input_payload: dict = None,
+    output_payload: Optional[dict] = None,
+    status: str = "success",
+    error_message: Optional[str] = None,
+    model_id: Optional[str] = None,
+    model_version: Optional[str] = None,
+    latency_ms: Optional[float] = None,
+    cost: Optional[float] = None,
+    job_id: Optional[str] = None,
+) -> dict:
+    """
+    Build an ai_artifacts row with a generated ID.
+
+    The feature's capture policy (see capture_policy.py) decides whether the
+    payloads are stored in full, truncated or not at all; the input hash is
+    always recorded. Long strings in stored payloads are replaced by blob
+    references (see payload_blobs.py).
+
+    Args are those of create_artifact (without db).
+
+    Returns:
+        Column values for AIArtifact, plus the extracted blob strings by hash
+        in payload_blobs (stored by insert_artifacts)
+    """
+    artifact_id = generate_artifact_id()
+    policy = capture_policy(feature)
+    capture = policy.capture_for(artifact_id, status)
+    input_json = canonical_json(input_payload)
+    input_hash = payload_hash(input_json)
+    blobs = {}
+    if capture == CAPTURE_HASH:
+        input_json, output_json = "null", None
+    else:
+        stored_input = input_payload
+        if capture == CAPTURE_TRUNCATED:
+            stored_input = truncate_strings(input_payload, policy.max_chars)
+            output_payload = truncate_strings(output_payload, policy.max_chars)
+        stored_input = extract_blobs(stored_input, blobs)
+        if stored_input is not input_payload:
+            input_json = canonical_json(stored_input)
+        output_payload = extract_blobs(output_payload, blobs)
+        output_json = canonical_json(output_payload) if output_payload else None
+    return {
+        "id": artifact_id,
+        "request_id": request_id,
+        "tenant_id": tenant_id,
+        "user_id": user_id or "system",
+        "feature": feature,
+        "input_payload": input_json,
+        "output_payload": output_json,
+        "input_hash": input_hash,
+        "capture": capture,
+        "blob_hashes": " ".join(sorted(blobs)) or None,
+        "payload_blobs": blobs,
+        "status": status,
+        "error_message": error_message,
+        "model_id": model_id,
+        "model_version": model_version,
+        "latency_ms": latency_ms,
+        "cost": cost,
+        "job_id": job_id,
+        "created_at": datetime.utcnow(),
+    }
+
+
 def create_artifact(
     db: Session,
     request_id: str,
@@ -46,6 +128,9 @@ def create_artifact(
     """
     Create an artifact record for an AI operation.
 
+    Request handlers use artifact_writer.record_artifact instead, which
+    batches writes off the request path.
+
     Args:
         db: Database session
         request_id: Original request ID from caller
@@ -65,14 +150,13 @@ def create_artifact(
     Returns:
         Created AIArtifact instance
     """
-    artifact = AIArtifact(
-        id=generate_artifact_id(),
+    row = artifact_row(
         request_id=request_id,
         tenant_id=tenant_id,
-        user_id=user_id or "system",
+        user_id=user_id,
         feature=feature,
-        input_payload=json.dumps(input_payload),
-        output_payload=json.dumps(output_payload) if output_payload else None,
+        input_payload=input_payload,
+        output_payload=output_payload,
         status=status,
         error_message=error_message,
         model_id=model_id,
@@ -80,8 +164,9 @@ def create_artifact(
         latency_ms=latency_ms,
         cost=cost,
         job_id=job_id,
-        created_at=datetime.utcnow(),
     )
+    store_blobs(db, [row])
+    artifact = AIArtifact(**_artifact_columns(row))
     db.add(artifact)
     db.commit()
     db.refresh(artifact)
@@ -101,6 +186,20 @@ def create_artifact(
     return artifact
 
 
+def insert_artifacts(db: Session, rows: list[dict]) -> None:
+    """Insert artifact rows (see artifact_row), and their blobs, in one transaction with a single executemany."""
+    if rows:
+        store_blobs(db, rows)
+        db.execute(insert(AIArtifact), [_artifact_columns(row) for row in rows])
+        db.commit()
+
+
+def _artifact_columns(row: dict) -> dict:
+    # The row without artifact_row's payload_blobs; rows are not modified, as
+    # the artifact writer retries a failed batch row by row
+    return {key: value for key, value in row.items() if key != "payload_blobs"}
+
+
 def get_artifact(db: Session, artifact_id: str, tenant_id: str) -> Optional[AIArtifact]:
     """
     Get an artifact by ID, scoped to tenant.
@@ -144,9 +243,11 @@ def list_artifacts(
     status: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
+    input_hash: Optional[str] = None,
 ) -> list[AIArtifact]:
     """
-    List artifacts for a tenant with optional filtering.
+    List artifacts for a tenant with optional filtering, newest first.
 
     Args:
         db: Database session
@@ -155,18 +256,117 @@ def list_artifacts(
         status: Optional status filter
         limit: Maximum results
         offset: Pagination offset
+        cursor: Start after this cursor (pagination.next_cursor of the previous page)
+        input_hash: Optional filter on the input hash (calls with the same input)
 
     Returns:
         List of matching AIArtifact records
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    query = _filter_artifacts(db.query(AIArtifact), tenant_id, feature, status, cursor, input_hash)
+    return query.offset(offset).limit(limit).all()
+
+
+def list_artifact_summaries(
+    db: Session,
+    tenant_id: str,
+    fields: Optional[tuple[str, ...]] = None,
+    feature: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    input_hash: Optional[str] = None,
+) -> list[dict]:
+    """
+    List artifacts for a tenant, selecting only the given columns.
+
+    Payloads are neither read nor decoded; use get_artifact for them.
+
+    Args:
+        db: Database session
+        tenant_id: Tenant ID for scoping
+        fields: Names from ARTIFACT_LIST_FIELDS (default: ARTIFACT_SUMMARY_FIELDS)
+        feature: Optional feature filter
+        status: Optional status filter
+        limit: Maximum results
+        offset: Pagination offset
+        cursor: Start after this cursor (pagination.next_cursor of the previous page)
+        input_hash: Optional filter on the input hash (calls with the same input)
+
+    Returns:
+        One dict per artifact with the requested fields
+
+    Raises:
+        ValueError: If a field is not in ARTIFACT_LIST_FIELDS or the cursor is invalid
+    """
+    fields, columns = _artifact_list_columns(fields)
+    rows = _filter_artifacts(db.query(*columns), tenant_id, feature, status, cursor, input_hash)
+    rows = rows.offset(offset).limit(limit)
+    return _summaries(fields, rows)
+
+
+def _artifact_list_columns(fields: Optional[tuple[str, ...]]) -> tuple[tuple[str, ...], list]:
+    fields = fields or ARTIFACT_SUMMARY_FIELDS
+    unknown = [name for name in fields if name not in ARTIFACT_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown artifact fields: {', '.join(unknown)}")
+    return fields, [ARTIFACT_LIST_FIELDS[name].label(name) for name in fields]
+
+
+def _summaries(fields: tuple[str, ...], rows) -> list[dict]:
+    return [
+        {
+            name: value.isoformat() if isinstance(value, datetime) else value
+            for name, value in zip(fields, row)
+        }
+        for row in rows
+    ]
+
+
+def count_artifacts(
+    db: Session,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[str] = None,
+    cap: int = APPROXIMATE_COUNT_CAP,
+    input_hash: Optional[str] = None,
+) -> int:
+    """
+    Count a tenant's matching artifacts, reading at most cap index entries.
+
+    Returns:
+        The count, or cap if there are at least that many
     """
-    query = db.query(AIArtifact).filter(AIArtifact.tenant_id == tenant_id)
+    return db.scalar(_count_artifacts_query(tenant_id, feature, status, cap, input_hash))
+
+
+def _count_artifacts_query(
+    tenant_id: str, feature: Optional[str], status: Optional[str], cap: int, input_hash: Optional[str] = None
+):
+    matching = _filter_artifacts(select(AIArtifact.id), tenant_id, feature, status, input_hash=input_hash)
+    matching = matching.limit(cap).subquery()
+    return select(func.count()).select_from(matching)
+
 
+def _filter_artifacts(
+    query,
+    tenant_id: str,
+    feature: Optional[str],
+    status: Optional[str],
+    cursor: Optional[str] = None,
+    input_hash: Optional[str] = None,
+):
+    query = query.filter(AIArtifact.tenant_id == tenant_id)
     if feature:
         query = query.filter(AIArtifact.feature == feature)
     if status:
         query = query.filter(AIArtifact.status == status)
-
-    return query.order_by(AIArtifact.created_at.desc()).offset(offset).limit(limit).all()
+    if input_hash:
+        query = query.filter(AIArtifact.input_hash == input_hash)
+    return keyset_page(query, AIArtifact.created_at, AIArtifact.id, cursor)
 
 
 def add_feedback(
@@ -232,6 +432,99 @@ def get_feedback_for_artifact(db: Session, artifact_id: str, tenant_id: str) ->
     ).all()
 
 
+async def create_artifact_async(db: AsyncSession, **fields) -> AIArtifact:
+    """Async version of create_artifact."""
+    return await db.run_sync(functools.partial(create_artifact, **fields))
+
+
+async def get_artifact_async(db: AsyncSession, artifact_id: str, tenant_id: str) -> Optional[AIArtifact]:
+    """Async version of get_artifact."""
+    return await db.scalar(
+        select(AIArtifact).where(AIArtifact.id == artifact_id, AIArtifact.tenant_id == tenant_id)
+    )
+
+
+async def list_artifacts_async(
+    db: AsyncSession,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    input_hash: Optional[str] = None,
+) -> list[AIArtifact]:
+    """
+    Async version of list_artifacts.
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    query = _filter_artifacts(select(AIArtifact), tenant_id, feature, status, cursor, input_hash)
+    query = query.offset(offset).limit(limit)
+    return list(await db.scalars(query))
+
+
+async def list_artifact_summaries_async(
+    db: AsyncSession,
+    tenant_id: str,
+    fields: Optional[tuple[str, ...]] = None,
+    feature: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    input_hash: Optional[str] = None,
+) -> list[dict]:
+    """
+    Async version of list_artifact_summaries.
+
+    Raises:
+        ValueError: If a field is not in ARTIFACT_LIST_FIELDS or the cursor is invalid
+    """
+    fields, columns = _artifact_list_columns(fields)
+    query = _filter_artifacts(select(*columns), tenant_id, feature, status, cursor, input_hash)
+    query = query.offset(offset).limit(limit)
+    return _summaries(fields, await db.execute(query))
+
+
+async def count_artifacts_async(
+    db: AsyncSession,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[str] = None,
+    cap: int = APPROXIMATE_COUNT_CAP,
+    input_hash: Optional[str] = None,
+) -> int:
+    """Async version of count_artifacts."""
+    return await db.scalar(_count_artifacts_query(tenant_id, feature, status, cap, input_hash))
+
+
+async def add_feedback_async(db: AsyncSession, **fields) -> AIFeedback:
+    """
+    Async version of add_feedback.
+
+    Raises:
+        ValueError: If neither artifact_id nor job_id is given
+    """
+    return await db.run_sync(functools.partial(add_feedback, **fields))
+
+
+# Columns selectable in artifact list projections (payloads only on the detail endpoint)
+ARTIFACT_LIST_FIELDS = {
+    column.name: column
+    for column in (
+        AIArtifact.id, AIArtifact.request_id, AIArtifact.tenant_id, AIArtifact.user_id,
+        AIArtifact.feature, AIArtifact.status, AIArtifact.error_message, AIArtifact.model_id,
+        AIArtifact.model_version, AIArtifact.latency_ms, AIArtifact.cost, AIArtifact.job_id,
+        AIArtifact.created_at, AIArtifact.archive_ref, AIArtifact.input_hash, AIArtifact.capture,
+    )
+}
+
+# Fields of the summary list view
+ARTIFACT_SUMMARY_FIELDS = ("id", "request_id", "feature", "status", "latency_ms", "job_id", "created_at")
+
+
 def artifact_to_dict(artifact: AIArtifact) -> dict:
     """Convert an artifact to a dictionary for API responses."""
     return {
@@ -250,6 +543,9 @@ def artifact_to_dict(artifact: AIArtifact) -> dict:
         "cost": artifact.cost,
         "job_id": artifact.job_id,
         "created_at": artifact.created_at.isoformat() if artifact.created_at else None,
+        "archived": artifact.archive_ref is not None,
+        "input_hash": artifact.input_hash,
+        "capture": artifact.capture,
     }
 
 
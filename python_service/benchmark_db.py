@@ -0,0 +1,104 @@
+"""
+Artifact insert throughput with default and tuned SQLite settings.
+
+Writes artifacts into a scratch database with SQLite's defaults and with the
+db_config pragmas, both one commit per artifact from concurrent threads (the
+old request path) and in batches (artifact_writer):
+
+    python benchmark_db.py --rows 2000 --threads 4 --batch-size 100
+
+Use --dir to place the scratch database on the disk the service uses (fsync
+cost dominates and differs greatly between tmpfs, SSDs and network volumes).
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from artifacts import artifact_row, insert_artifacts
+from database import Base
+from db_config import SQLITE_DEFAULT_PRAGMAS, create_db_engine, sqlite_pragmas
+from sqlalchemy.orm import sessionmaker
+
+
+def _rows(count: int) -> list[dict]:
+    return [
+        artifact_row(
+            request_id=f"bench_{i}",
+            tenant_id="tenant_bench",
+            user_id="user_bench",
+            feature="categorization",
+            input_payload={"item_name": f"item {i}", "candidate_labels": ["Produce", "Dairy", "Bakery"]},
+            output_payload={"category": "Produce", "confidence": 0.9},
+            latency_ms=12.5,
+        )
+        for i in range(count)
+    ]
+
+
+def _single_commits(session_factory, rows: list[dict], threads: int) -> None:
+    def write(part):
+        db = session_factory()
+        try:
+            for row in part:
+                insert_artifacts(db, [row])
+        finally:
+            db.close()
+
+    workers = [threading.Thread(target=write, args=(rows[i::threads],)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def _batches(session_factory, rows: list[dict], batch_size: int) -> None:
+    db = session_factory()
+    try:
+        for start in range(0, len(rows), batch_size):
+            insert_artifacts(db, rows[start:start + batch_size])
+    finally:
+        db.close()
+
+
+def run(rows: int, threads: int, batch_size: int, directory: Optional[str] = None) -> list[tuple[str, str, float]]:
+    """Rows per second for each (pragma profile, write pattern)."""
+    results = []
+    for profile, pragmas in (("sqlite defaults", SQLITE_DEFAULT_PRAGMAS), ("tuned", sqlite_pragmas())):
+        for pattern in ("commit per row", f"batches of {batch_size}"):
+            with tempfile.TemporaryDirectory(dir=directory) as tmp:
+                engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}", pragmas=pragmas)
+                Base.metadata.create_all(bind=engine)
+                session_factory = sessionmaker(bind=engine)
+                data = _rows(rows)
+
+                start = time.perf_counter()
+                if pattern == "commit per row":
+                    _single_commits(session_factory, data, threads)
+                else:
+                    _batches(session_factory, data, batch_size)
+                elapsed = time.perf_counter() - start
+
+                engine.dispose()
+            results.append((profile, pattern, rows / elapsed))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark artifact inserts on SQLite")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--dir", default=None, help="Directory for the scratch database (default: system temp)")
+    args = parser.parse_args()
+
+    print(f"{'profile':<16} {'pattern':<18} {'rows/s':>10}")
+    for profile, pattern, rate in run(args.rows, args.threads, args.batch_size, args.dir):
+        print(f"{profile:<16} {pattern:<18} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
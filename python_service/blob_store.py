@@ -0,0 +1,113 @@
+"""
+Content-addressed blob store for large job outputs.
+
+Outputs larger than JOB_OUTPUT_INLINE_MAX_BYTES (e.g. thousands of embedding
+vectors) are written here instead of the ai_jobs row, so status and list
+queries neither read nor decode them. Blobs are keyed by the SHA-256 of the
+uncompressed bytes, so identical outputs are stored once, and compressed with
+gzip, or zstd when JOB_BLOB_COMPRESSION=zstd and the zstandard package is
+installed. Files are written atomically under JOB_BLOB_DIR.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import re
+from typing import BinaryIO, Iterator
+
+from config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("grocery-planner-ai.blob_store")
+
+# File extension per codec; part of the blob key so readers know how to decode
+CODEC_EXTENSIONS = {"gzip": "gz", "zstd": "zst"}
+
+_KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.(gz|zst)$")
+
+# Bytes per chunk when streaming a blob
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _codec() -> str:
+    if settings.JOB_BLOB_COMPRESSION == "zstd":
+        if zstandard is not None:
+            return "zstd"
+        logger.warning("JOB_BLOB_COMPRESSION=zstd but zstandard is not installed, using gzip")
+    return "gzip"
+
+
+def blob_codec(key: str) -> str:
+    """Compression codec of a stored blob."""
+    return "zstd" if key.endswith(".zst") else "gzip"
+
+
+def blob_path(key: str) -> str:
+    """
+    Filesystem path of a blob.
+
+    Raises:
+        ValueError: If the key is not a blob key (e.g. a path traversal attempt)
+    """
+    if not _KEY_PATTERN.match(key):
+        raise ValueError(f"Invalid blob key: {key!r}")
+    return os.path.join(settings.JOB_BLOB_DIR, key[:2], key)
+
+
+def put_blob(data: bytes) -> str:
+    """
+    Store bytes compressed, unless identical content is already stored.
+
+    Returns:
+        The blob key (SHA-256 of the content plus codec extension)
+    """
+    codec = _codec()
+    key = f"{hashlib.sha256(data).hexdigest()}.{CODEC_EXTENSIONS[codec]}"
+    path = blob_path(key)
+    if os.path.exists(path):
+        return key
+
+    if codec == "zstd":
+        compressed = zstandard.ZstdCompressor().compress(data)
+    else:
+        compressed = gzip.compress(data, compresslevel=6)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    os.replace(tmp_path, path)
+    return key
+
+
+def open_blob(key: str) -> BinaryIO:
+    """
+    Open a blob for reading its uncompressed content.
+
+    Raises:
+        FileNotFoundError: If the blob does not exist
+    """
+    path = blob_path(key)
+    if blob_codec(key) == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd blobs")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return gzip.open(path, "rb")
+
+
+def read_blob(key: str) -> bytes:
+    """Read a blob's uncompressed content."""
+    with open_blob(key) as f:
+        return f.read()
+
+
+def iter_blob(key: str) -> Iterator[bytes]:
+    """Yield a blob's uncompressed content in chunks."""
+    with open_blob(key) as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            yield chunk
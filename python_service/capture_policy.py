@@ -0,0 +1,121 @@
+"""
+Artifact capture policies.
+
+Every AI call records an artifact row with its metadata (status, latency,
+model) and the SHA-256 of its canonical input JSON, so feedback and
+debugging can always find the call and other calls with the same input.
+Whether the payloads are stored as well is decided per feature
+(ARTIFACT_FEATURE_CAPTURE_POLICIES, default ARTIFACT_CAPTURE_POLICY):
+
+- always: full payloads
+- errors: full payloads for errors only
+- sample:<rate>: full payloads for errors and a fraction of successes,
+  e.g. sample:0.05
+- truncate:<chars>: payloads with every string longer than <chars>
+  shortened, e.g. truncate:1024 (keeps the structure of receipt requests
+  without their base64 images)
+
+Rows without payloads have capture="hash"; the policy is applied before the
+row is queued for the artifact writer, so skipped payloads are never
+buffered or written.
+"""
+
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from config import settings
+
+logger = logging.getLogger("grocery-planner-ai.capture_policy")
+
+# Values of AIArtifact.capture
+CAPTURE_FULL = "full"
+CAPTURE_TRUNCATED = "truncated"
+CAPTURE_HASH = "hash"
+
+POLICY_MODES = ("always", "errors", "sample", "truncate")
+
+
+@dataclass(frozen=True)
+class CapturePolicy:
+    """How much of an artifact is stored."""
+    mode: str = "always"
+    rate: float = 1.0  # sample mode
+    max_chars: int = 0  # truncate mode
+
+    def capture_for(self, artifact_id: str, status: str) -> str:
+        """CAPTURE_FULL, CAPTURE_TRUNCATED or CAPTURE_HASH for an artifact."""
+        if self.mode == "truncate":
+            return CAPTURE_TRUNCATED
+        if self.mode == "always" or status != "success":
+            return CAPTURE_FULL
+        if self.mode == "sample" and is_sampled(artifact_id, self.rate):
+            return CAPTURE_FULL
+        return CAPTURE_HASH
+
+
+def parse_capture_policy(value: str) -> CapturePolicy:
+    """
+    Parse a policy such as "always", "errors", "sample:0.05" or "truncate:1024".
+
+    Raises:
+        ValueError: If the policy is not one of POLICY_MODES or its argument is invalid
+    """
+    mode, _, argument = value.strip().partition(":")
+    if mode not in POLICY_MODES:
+        raise ValueError(f"Unknown artifact capture policy: {value!r}")
+    if mode == "sample":
+        rate = float(argument)
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Sample rate must be between 0 and 1: {value!r}")
+        return CapturePolicy(mode, rate=rate)
+    if mode == "truncate":
+        max_chars = int(argument)
+        if max_chars <= 0:
+            raise ValueError(f"Truncation length must be positive: {value!r}")
+        return CapturePolicy(mode, max_chars=max_chars)
+    return CapturePolicy(mode)
+
+
+def capture_policy(feature: str) -> CapturePolicy:
+    """Capture policy of a feature ("always" if the configured one is invalid)."""
+    value = settings.ARTIFACT_FEATURE_CAPTURE_POLICIES.get(feature, settings.ARTIFACT_CAPTURE_POLICY)
+    try:
+        return parse_capture_policy(value)
+    except ValueError as e:
+        # Never fail the AI call over its artifact
+        logger.error(f"Invalid capture policy for {feature}, capturing everything: {e}")
+        return CapturePolicy()
+
+
+def is_sampled(key: str, rate: float) -> bool:
+    """Deterministic sampling decision: the same key is always in or out at a given rate."""
+    if rate >= 1:
+        return True
+    bucket = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big") / 2**64
+    return bucket < rate
+
+
+def canonical_json(payload: Any) -> str:
+    """Compact JSON with sorted keys, so equal payloads serialize (and hash) equally."""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def payload_hash(payload_json: str) -> str:
+    """SHA-256 hex digest of a canonical_json payload."""
+    return hashlib.sha256(payload_json.encode()).hexdigest()
+
+
+def truncate_strings(payload: Any, max_chars: int) -> Any:
+    """Copy of a JSON value with strings longer than max_chars shortened and marked."""
+    if isinstance(payload, str):
+        if len(payload) <= max_chars:
+            return payload
+        return f"{payload[:max_chars]}...[truncated {len(payload) - max_chars} chars]"
+    if isinstance(payload, dict):
+        return {key: truncate_strings(value, max_chars) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [truncate_strings(value, max_chars) for value in payload]
+    return payload
@@ -9,11 +9,102 @@ Environment variables:
 - CLASSIFICATION_MODEL: Model for zero-shot classification (default: valhalla/distilbart-mnli-12-3)
 - USE_REAL_CLASSIFICATION: Enable real ML classification (default: false)
 - USE_TESSERACT_OCR: Use Tesseract OCR as fallback when VLM is disabled (default: true)
+- OCR_PROCESS_WORKERS: Processes in the Tesseract pool used by receipt jobs (default: CPU count)
+- RECEIPT_UPLOAD_DIR: Directory receipt jobs may read image_path from; empty accepts only image_base64 (default: "")
+- MEAL_PLAN_CACHE_ENABLED: Cache meal plan solutions by canonical problem hash (default: true)
+- MEAL_PLAN_CACHE_SIZE: Maximum in-memory cached solutions (default: 1024)
+- MEAL_PLAN_CACHE_TTL: Cached solution lifetime in seconds (default: 3600)
+- MEAL_PLAN_CACHE_DIR: Directory for persisting cached solutions (default: "", memory only)
+- MEAL_PLAN_CACHE_DISK_SIZE: Maximum cached solution files in MEAL_PLAN_CACHE_DIR (default: 10000)
+- MEAL_PLAN_SOLVER_WORKERS: Threads in the shared meal plan solver pool (default: 4)
+- MEAL_PLAN_BATCH_MAX_PROBLEMS: Most problems accepted in one batch meal plan request (default: 500)
+- EMBEDDING_JOB_CHUNK_SIZE: Texts encoded per saved chunk in embedding_batch jobs (default: 64)
+- JOB_EMBEDDED_WORKER: Run a job worker inside the API process (default: true)
+- JOB_WORKER_PROCESSES: Processes started by `python worker.py` (default: 1)
+- JOB_DEFAULT_CONCURRENCY: Concurrent jobs per feature per worker (default: 2)
+- JOB_FEATURE_CONCURRENCY: Per-feature overrides, e.g. "receipt_extraction=1,embedding_batch=4"
+- JOB_LEASE_SECONDS: Lease duration renewed by worker heartbeats (default: 30)
+- JOB_POLL_INTERVAL: Seconds between queue polls when idle (default: 1.0)
+- JOB_MAX_ATTEMPTS: Attempts before a failing or abandoned job is failed (default: 3)
+- JOB_RETRY_BASE_DELAY: First retry delay in seconds, doubled per attempt (default: 2.0)
+- JOB_RETRY_MAX_DELAY: Maximum retry delay in seconds (default: 300)
+- JOB_TENANT_CONCURRENCY: Maximum running jobs per tenant, 0 for no cap (default: 4)
+- JOB_TENANT_WEIGHTS: Fair-share weights per tenant, e.g. "tenant_a=2" (default weight: 1)
+- JOB_FEATURE_WEIGHTS: Fair-share weights per feature within a tenant (default weight: 1)
+- JOB_FAIRNESS_WINDOW: Seconds of recent job starts counted as service (default: 300)
+- JOB_DEDUP_WINDOW: Seconds a succeeded job is reused for identical submissions, 0 to disable (default: 600)
+- JOB_EVENTS_RECHECK_INTERVAL: Seconds between DB status checks while waiting on job events (default: 2.0)
+- JOB_WEBHOOK_TIMEOUT: Timeout in seconds for job webhook deliveries (default: 10)
+- JOB_WEBHOOK_SECRET: HMAC-SHA256 key for the X-Signature webhook header (default: "", unsigned)
+- JOB_WEBHOOK_ALLOWED_HOSTS: Comma-separated webhook hosts; empty allows any host with only public addresses (default: "")
+- JOB_WEBHOOK_WORKERS: Threads delivering webhooks (default: 4)
+- SQLITE_JOURNAL_MODE: SQLite journal mode, "" for the SQLite default (default: "WAL")
+- SQLITE_SYNCHRONOUS: SQLite synchronous level (default: "NORMAL")
+- SQLITE_CACHE_SIZE_KB: SQLite page cache per connection in KiB (default: 65536)
+- SQLITE_MMAP_SIZE: Bytes of the database file read via mmap (default: 268435456)
+- SQLITE_BUSY_TIMEOUT_MS: Milliseconds a writer waits for the database lock (default: 5000)
+- SQLITE_AUTO_VACUUM: auto_vacuum mode of new SQLite databases (default: "INCREMENTAL")
+- DB_POOL_SIZE: Pooled database connections (default: 8)
+- DB_MAX_OVERFLOW: Connections allowed beyond the pool size (default: 8)
+- DB_POOL_TIMEOUT: Seconds to wait for a pooled connection (default: 30)
+- DB_POOL_RECYCLE: Seconds before a pooled PostgreSQL connection is replaced (default: 1800)
+- DB_MIGRATE_ON_STARTUP: Apply pending schema migrations at startup (default: true)
+- ARTIFACT_WRITER_ENABLED: Write artifacts in batches from a background task (default: true)
+- ARTIFACT_WRITER_BATCH_SIZE: Maximum artifacts per batch write (default: 100)
+- ARTIFACT_WRITER_FLUSH_MS: Maximum milliseconds an artifact waits for its batch (default: 200)
+- ARTIFACT_WRITER_BUFFER: Maximum buffered artifacts before requests wait (default: 10000)
+- ARTIFACT_CAPTURE_POLICY: Payload capture of artifacts: always, errors, sample:<rate> or truncate:<chars> (default: "always")
+- ARTIFACT_FEATURE_CAPTURE_POLICIES: Per-feature overrides, e.g. "categorization=sample:0.05,receipt_extraction=truncate:1024"
+- ARTIFACT_BLOB_MIN_BYTES: Payload strings this long or longer (e.g. base64 images) are stored once in ai_payload_blobs, 0 to disable (default: 4096)
+- ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES: Artifact payload JSON this long or longer is stored compressed on SQLite, 0 to disable (default: 512)
+- ARTIFACT_PAYLOAD_COMPRESSION: Compression of artifact payloads and blobs, "zlib" or "zstd" (needs zstandard) (default: "zlib")
+- ARTIFACT_RETENTION_DAYS: Days artifacts keep their payloads in the database, 0 to keep forever (default: 0)
+- ARTIFACT_FEATURE_RETENTION_DAYS: Per-feature overrides, e.g. "categorization=7,receipt_extraction=90"
+- ARTIFACT_ARCHIVE_SAMPLE_RATE: Fraction of expired successful artifacts archived rather than deleted (default: 1.0)
+- ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES: Per-feature overrides, e.g. "categorization=0.05"
+- ARTIFACT_ARCHIVE_DIR: Directory of the date-partitioned artifact archive (default: "./artifact_archive")
+- ARTIFACT_ARCHIVE_COMPRESSION: Archive compression, "gzip" or "zstd" (needs zstandard) (default: "gzip")
+- ARTIFACT_COMPACTION_INTERVAL: Seconds between artifact compaction passes, 0 to disable (default: 3600)
+- ARTIFACT_COMPACTION_BATCH_SIZE: Artifacts archived per transaction (default: 1000)
+- ARTIFACT_VACUUM_PAGES: Free SQLite pages released per compaction pass, 0 for all (default: 4096)
+- JOB_OUTPUT_INLINE_MAX_BYTES: Larger job outputs go to the blob store, 0 to keep all inline (default: 65536)
+- JOB_BLOB_DIR: Directory of the job output blob store (default: "./job_blobs")
+- JOB_BLOB_COMPRESSION: Blob compression, "gzip" or "zstd" (needs zstandard) (default: "gzip")
 """
 
 import os
 
 
+def _parse_limits(value: str) -> dict[str, int]:
+    """Parse "feature=limit,feature=limit" into a dict."""
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            feature, limit = item.split("=", 1)
+            limits[feature.strip()] = int(limit)
+    return limits
+
+
+def _parse_rates(value: str) -> dict[str, float]:
+    """Parse "feature=rate,feature=rate" into a dict."""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            feature, rate = item.split("=", 1)
+            rates[feature.strip()] = float(rate)
+    return rates
+
+
+def _parse_policies(value: str) -> dict[str, str]:
+    """Parse "feature=policy,feature=policy" into a dict."""
+    policies = {}
+    for item in value.split(","):
+        if "=" in item:
+            feature, policy = item.split("=", 1)
+            policies[feature.strip()] = policy.strip()
+    return policies
+
+
 class Settings:
     """Application settings loaded from environment variables."""
 
@@ -25,6 +116,8 @@ class Settings:
     # Feature flags for gradual rollout
     USE_VLLM_OCR: bool = os.getenv("USE_VLLM_OCR", "false").lower() == "true"
     USE_TESSERACT_OCR: bool = os.getenv("USE_TESSERACT_OCR", "true").lower() == "true"
+    OCR_PROCESS_WORKERS: int = int(os.getenv("OCR_PROCESS_WORKERS", str(os.cpu_count() or 1)))
+    RECEIPT_UPLOAD_DIR: str = os.getenv("RECEIPT_UPLOAD_DIR", "")
 
     # Zero-shot classification settings
     CLASSIFICATION_MODEL: str = os.getenv(
@@ -34,6 +127,88 @@ class Settings:
         "USE_REAL_CLASSIFICATION", "false"
     ).lower() == "true"
 
+    # Meal plan solution cache
+    MEAL_PLAN_CACHE_ENABLED: bool = os.getenv("MEAL_PLAN_CACHE_ENABLED", "true").lower() == "true"
+    MEAL_PLAN_CACHE_SIZE: int = int(os.getenv("MEAL_PLAN_CACHE_SIZE", "1024"))
+    MEAL_PLAN_CACHE_TTL: int = int(os.getenv("MEAL_PLAN_CACHE_TTL", "3600"))
+    MEAL_PLAN_CACHE_DIR: str = os.getenv("MEAL_PLAN_CACHE_DIR", "")
+    MEAL_PLAN_CACHE_DISK_SIZE: int = int(os.getenv("MEAL_PLAN_CACHE_DISK_SIZE", "10000"))
+    MEAL_PLAN_SOLVER_WORKERS: int = int(os.getenv("MEAL_PLAN_SOLVER_WORKERS", "4"))
+    MEAL_PLAN_BATCH_MAX_PROBLEMS: int = int(os.getenv("MEAL_PLAN_BATCH_MAX_PROBLEMS", "500"))
+
+    # Batch embedding jobs
+    EMBEDDING_JOB_CHUNK_SIZE: int = int(os.getenv("EMBEDDING_JOB_CHUNK_SIZE", "64"))
+
+    # Job queue and workers
+    JOB_EMBEDDED_WORKER: bool = os.getenv("JOB_EMBEDDED_WORKER", "true").lower() == "true"
+    JOB_WORKER_PROCESSES: int = int(os.getenv("JOB_WORKER_PROCESSES", "1"))
+    JOB_DEFAULT_CONCURRENCY: int = int(os.getenv("JOB_DEFAULT_CONCURRENCY", "2"))
+    JOB_FEATURE_CONCURRENCY: dict[str, int] = _parse_limits(os.getenv("JOB_FEATURE_CONCURRENCY", ""))
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "30"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    JOB_RETRY_BASE_DELAY: float = float(os.getenv("JOB_RETRY_BASE_DELAY", "2.0"))
+    JOB_RETRY_MAX_DELAY: float = float(os.getenv("JOB_RETRY_MAX_DELAY", "300"))
+    JOB_TENANT_CONCURRENCY: int = int(os.getenv("JOB_TENANT_CONCURRENCY", "4"))
+    JOB_TENANT_WEIGHTS: dict[str, int] = _parse_limits(os.getenv("JOB_TENANT_WEIGHTS", ""))
+    JOB_FEATURE_WEIGHTS: dict[str, int] = _parse_limits(os.getenv("JOB_FEATURE_WEIGHTS", ""))
+    JOB_FAIRNESS_WINDOW: int = int(os.getenv("JOB_FAIRNESS_WINDOW", "300"))
+    JOB_DEDUP_WINDOW: int = int(os.getenv("JOB_DEDUP_WINDOW", "600"))
+    JOB_EVENTS_RECHECK_INTERVAL: float = float(os.getenv("JOB_EVENTS_RECHECK_INTERVAL", "2.0"))
+    JOB_WEBHOOK_TIMEOUT: float = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+    JOB_WEBHOOK_SECRET: str = os.getenv("JOB_WEBHOOK_SECRET", "")
+    JOB_WEBHOOK_ALLOWED_HOSTS: list[str] = [
+        host.strip().lower() for host in os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "").split(",") if host.strip()
+    ]
+    JOB_WEBHOOK_WORKERS: int = int(os.getenv("JOB_WEBHOOK_WORKERS", "4"))
+
+    # Database engine (see db_config.py)
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_AUTO_VACUUM: str = os.getenv("SQLITE_AUTO_VACUUM", "INCREMENTAL")
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "8"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_MIGRATE_ON_STARTUP: bool = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+    # Artifact writer
+    ARTIFACT_WRITER_ENABLED: bool = os.getenv("ARTIFACT_WRITER_ENABLED", "true").lower() == "true"
+    ARTIFACT_WRITER_BATCH_SIZE: int = int(os.getenv("ARTIFACT_WRITER_BATCH_SIZE", "100"))
+    ARTIFACT_WRITER_FLUSH_MS: int = int(os.getenv("ARTIFACT_WRITER_FLUSH_MS", "200"))
+    ARTIFACT_WRITER_BUFFER: int = int(os.getenv("ARTIFACT_WRITER_BUFFER", "10000"))
+
+    # Artifact capture (see capture_policy.py)
+    ARTIFACT_CAPTURE_POLICY: str = os.getenv("ARTIFACT_CAPTURE_POLICY", "always")
+    ARTIFACT_FEATURE_CAPTURE_POLICIES: dict[str, str] = _parse_policies(
+        os.getenv("ARTIFACT_FEATURE_CAPTURE_POLICIES", "")
+    )
+
+    # Artifact payload storage (see payload_blobs.py)
+    ARTIFACT_BLOB_MIN_BYTES: int = int(os.getenv("ARTIFACT_BLOB_MIN_BYTES", "4096"))
+    ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES: int = int(os.getenv("ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES", "512"))
+    ARTIFACT_PAYLOAD_COMPRESSION: str = os.getenv("ARTIFACT_PAYLOAD_COMPRESSION", "zlib").lower()
+
+    # Artifact retention and archival (see artifact_retention.py)
+    ARTIFACT_RETENTION_DAYS: int = int(os.getenv("ARTIFACT_RETENTION_DAYS", "0"))
+    ARTIFACT_FEATURE_RETENTION_DAYS: dict[str, int] = _parse_limits(os.getenv("ARTIFACT_FEATURE_RETENTION_DAYS", ""))
+    ARTIFACT_ARCHIVE_SAMPLE_RATE: float = float(os.getenv("ARTIFACT_ARCHIVE_SAMPLE_RATE", "1.0"))
+    ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES: dict[str, float] = _parse_rates(
+        os.getenv("ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES", "")
+    )
+    ARTIFACT_ARCHIVE_DIR: str = os.getenv("ARTIFACT_ARCHIVE_DIR", "./artifact_archive")
+    ARTIFACT_ARCHIVE_COMPRESSION: str = os.getenv("ARTIFACT_ARCHIVE_COMPRESSION", "gzip").lower()
+    ARTIFACT_COMPACTION_INTERVAL: int = int(os.getenv("ARTIFACT_COMPACTION_INTERVAL", "3600"))
+    ARTIFACT_COMPACTION_BATCH_SIZE: int = int(os.getenv("ARTIFACT_COMPACTION_BATCH_SIZE", "1000"))
+    ARTIFACT_VACUUM_PAGES: int = int(os.getenv("ARTIFACT_VACUUM_PAGES", "4096"))
+
+    JOB_OUTPUT_INLINE_MAX_BYTES: int = int(os.getenv("JOB_OUTPUT_INLINE_MAX_BYTES", "65536"))
+    JOB_BLOB_DIR: str = os.getenv("JOB_BLOB_DIR", "./job_blobs")
+    JOB_BLOB_COMPRESSION: str = os.getenv("JOB_BLOB_COMPRESSION", "gzip").lower()
+
     # Debug mode
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
 
@@ -1,21 +1,53 @@
 """
 Database module for AI job tracking and artifact storage.
 
-Uses SQLite for simplicity and persistence without requiring additional infrastructure.
+Uses SQLite for simplicity and persistence without requiring additional
+infrastructure, or PostgreSQL (AI_DATABASE_URL) when several service
+instances share one database. Payload columns are JSONB on PostgreSQL and
+TEXT elsewhere; either way the models read and write JSON strings. Large
+artifact payloads are stored compressed on SQLite (PostgreSQL compresses
+large JSONB values itself), and long strings in them such as base64 images
+are stored once in ai_payload_blobs (see payload_blobs.py).
+Engine tuning (WAL, pragmas, pooling) lives in db_config.py and schema
+changes to existing databases in migrations.py.
+
+API endpoints use AsyncSession (get_async_db) so queries do not block the
+event loop; worker processes and scripts use the sync Session (get_db,
+get_session_local).
 """
 
+import json
+import logging
 import os
+import zlib
 from datetime import datetime
 from enum import Enum
 
-from sqlalchemy import create_engine, Column, String, Text, Float, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import (
+    Column, String, Text, Float, Integer, DateTime, ForeignKey, UniqueConstraint,
+    Enum as SQLEnum, Index, JSON, LargeBinary, TypeDecorator,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import sessionmaker, relationship, declarative_base
 
+from config import settings
+from db_config import create_async_db_engine, create_db_engine
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger("grocery-planner-ai.database")
+
 Base = declarative_base()
 
 # Lazy initialization for engine and session
 _engine = None
 _SessionLocal = None
+_async_engine = None
+_AsyncSessionLocal = None
 
 
 def get_database_url() -> str:
@@ -27,9 +59,7 @@ def get_engine():
     """Get or create the database engine."""
     global _engine
     if _engine is None:
-        database_url = get_database_url()
-        connect_args = {"check_same_thread": False} if "sqlite" in database_url else {}
-        _engine = create_engine(database_url, connect_args=connect_args)
+        _engine = create_db_engine(get_database_url())
     return _engine
 
 
@@ -41,11 +71,38 @@ def get_session_local():
     return _SessionLocal
 
 
+def get_async_engine():
+    """Get or create the asyncio database engine."""
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_db_engine(get_database_url())
+    return _async_engine
+
+
+def get_async_session_local():
+    """Get or create the asyncio session factory."""
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        # Objects stay readable after commit; lazy refreshes would need an await
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _AsyncSessionLocal
+
+
+async def dispose_async_engine():
+    """Close the pooled connections of the asyncio engine, if one was created."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+
+
 def reset_engine():
-    """Reset the engine for testing purposes."""
-    global _engine, _SessionLocal
+    """Reset the engines for testing purposes."""
+    global _engine, _SessionLocal, _async_engine, _AsyncSessionLocal
     _engine = None
     _SessionLocal = None
+    _async_engine = None
+    _AsyncSessionLocal = None
 
 
 # For backwards compatibility
@@ -59,12 +116,92 @@ def SessionLocal():
     return get_session_local()
 
 
+class JSONPayload(TypeDecorator):
+    """
+    A JSON document stored as a JSON string.
+
+    JSONB on PostgreSQL (validated and queryable server-side), TEXT elsewhere.
+    Python None is SQL NULL; the string "null" is a JSON null.
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(Text())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name != "postgresql":
+            return value
+        document = json.loads(value)
+        return JSON.NULL if document is None else document
+
+    def process_result_value(self, value, dialect):
+        if value is None or isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+
+# First bytes of a zstd frame; anything else compressed is zlib
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def payload_codec() -> str:
+    """zstd if ARTIFACT_PAYLOAD_COMPRESSION=zstd and zstandard is installed, otherwise zlib."""
+    if settings.ARTIFACT_PAYLOAD_COMPRESSION == "zstd" and zstandard is not None:
+        return "zstd"
+    return "zlib"
+
+
+def compress_payload(data: bytes) -> bytes:
+    """Compress with the payload_codec()."""
+    if payload_codec() == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return zlib.compress(data, 6)
+
+
+def decompress_payload(data: bytes) -> bytes:
+    """Decompress compress_payload output of either codec."""
+    if data[:4] == _ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd payloads")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+class CompressedJSONPayload(JSONPayload):
+    """
+    A JSONPayload stored compressed when large.
+
+    On SQLite, JSON strings of ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES or more are
+    written as compressed BLOB values (SQLite stores them in the TEXT column
+    as they are); shorter ones, and rows written before, stay TEXT. On
+    PostgreSQL the value is JSONB, which TOAST compresses.
+    """
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return super().process_bind_param(value, dialect)
+        min_bytes = settings.ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES
+        if min_bytes and len(value) >= min_bytes:
+            return compress_payload(value.encode())
+        return value
+
+    def process_result_value(self, value, dialect):
+        if isinstance(value, bytes):
+            return decompress_payload(value).decode()
+        return super().process_result_value(value, dialect)
+
+
 class JobStatus(str, Enum):
     """Status values for AI jobs."""
     QUEUED = "queued"
     RUNNING = "running"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"
 
 
 class AIJob(Base):
@@ -74,21 +211,38 @@ class AIJob(Base):
     Jobs are tenant-scoped and include full status tracking with timestamps.
     """
     __tablename__ = "ai_jobs"
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "idempotency_key", name="uq_ai_jobs_tenant_idempotency_key"),
+        # Tenant list queries: filter by tenant (and feature or status), newest
+        # first by the (created_at, id) pagination key
+        Index("ix_ai_jobs_tenant_created", "tenant_id", "created_at", "id"),
+        Index("ix_ai_jobs_tenant_feature_created", "tenant_id", "feature", "created_at", "id"),
+        Index("ix_ai_jobs_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+    )
 
     id = Column(String(64), primary_key=True, index=True)
-    tenant_id = Column(String(64), nullable=False, index=True)
+    tenant_id = Column(String(64), nullable=False)
     user_id = Column(String(64), nullable=False)
     feature = Column(String(64), nullable=False, index=True)
-    status = Column(SQLEnum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    # VARCHAR rather than a native PostgreSQL enum, so new statuses need no ALTER TYPE
+    status = Column(SQLEnum(JobStatus, native_enum=False), default=JobStatus.QUEUED, nullable=False)
+    priority = Column(Integer, default=0, nullable=False)  # higher runs first
 
     # Input/output storage
-    input_payload = Column(Text, nullable=True)  # JSON string
-    output_payload = Column(Text, nullable=True)  # JSON string
+    input_payload = Column(JSONPayload, nullable=True)  # JSON string
+    output_payload = Column(JSONPayload, nullable=True)  # JSON string (None if offloaded)
+    output_ref = Column(String(80), nullable=True)  # blob_store key of an offloaded output
+    output_size = Column(Integer, nullable=True)  # serialized output size in bytes
     error_message = Column(Text, nullable=True)
 
     # Metadata
     model_id = Column(String(128), nullable=True)
     model_version = Column(String(32), nullable=True)
+    webhook_url = Column(String(512), nullable=True)
+
+    # Deduplication (see jobs.submit_job)
+    fingerprint = Column(String(64), nullable=True, index=True)
+    idempotency_key = Column(String(128), nullable=True)
 
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -99,9 +253,44 @@ class AIJob(Base):
     latency_ms = Column(Float, nullable=True)
     cost = Column(Float, nullable=True)
 
+    # Progress percentage (0-100) reported by resumable handlers
+    progress = Column(Float, nullable=True)
+
+    # Worker lease (see jobs.claim_next_job)
+    attempts = Column(Integer, default=0, nullable=False)
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True, index=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    # Retries and expiry (see jobs.RetryPolicy and jobs.expire_overdue_jobs)
+    next_attempt_at = Column(DateTime, nullable=True)  # retry backoff: not claimable before
+    deadline_at = Column(DateTime, nullable=True)  # queued jobs expire unrun after this
+
     # Relationships
     artifacts = relationship("AIArtifact", back_populates="job", cascade="all, delete-orphan")
     feedback = relationship("AIFeedback", back_populates="job", cascade="all, delete-orphan")
+    chunks = relationship("AIJobChunk", back_populates="job", cascade="all, delete-orphan")
+
+
+class AIJobChunk(Base):
+    """
+    Partial result of a chunked job, persisted as each chunk completes.
+
+    A job re-claimed after a crash resumes after its saved chunks; the rows
+    are deleted once the job succeeds.
+    """
+    __tablename__ = "ai_job_chunks"
+    __table_args__ = (
+        UniqueConstraint("job_id", "chunk_index", name="uq_ai_job_chunks_job_chunk"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(String(64), ForeignKey("ai_jobs.id"), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    output_payload = Column(JSONPayload, nullable=False)  # JSON string
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    job = relationship("AIJob", back_populates="chunks")
 
 
 class AIArtifact(Base):
@@ -111,17 +300,31 @@ class AIArtifact(Base):
     Each artifact captures the full context of an AI operation.
     """
     __tablename__ = "ai_artifacts"
+    __table_args__ = (
+        # Tenant list queries: filter by tenant (and feature or status), newest
+        # first by the (created_at, id) pagination key
+        Index("ix_ai_artifacts_tenant_created", "tenant_id", "created_at", "id"),
+        Index("ix_ai_artifacts_tenant_feature_created", "tenant_id", "feature", "created_at", "id"),
+        Index("ix_ai_artifacts_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+        # Compaction: a feature's oldest artifacts still holding their payloads
+        Index("ix_ai_artifacts_feature_archive_created", "feature", "archive_ref", "created_at"),
+        # Calls with the same input (list filter), newest first
+        Index("ix_ai_artifacts_tenant_input_hash_created", "tenant_id", "input_hash", "created_at", "id"),
+    )
 
     id = Column(String(64), primary_key=True, index=True)
     job_id = Column(String(64), ForeignKey("ai_jobs.id"), nullable=True, index=True)
     request_id = Column(String(64), nullable=False, index=True)
-    tenant_id = Column(String(64), nullable=False, index=True)
+    tenant_id = Column(String(64), nullable=False)
     user_id = Column(String(64), nullable=True)
     feature = Column(String(64), nullable=False, index=True)
 
     # Input/output
-    input_payload = Column(Text, nullable=False)  # JSON string
-    output_payload = Column(Text, nullable=True)  # JSON string
+    input_payload = Column(CompressedJSONPayload, nullable=False)  # JSON string ("null" unless captured)
+    output_payload = Column(CompressedJSONPayload, nullable=True)  # JSON string
+    blob_hashes = Column(Text, nullable=True)  # space-separated ai_payload_blobs referenced by the payloads
+    input_hash = Column(String(64), nullable=True)  # SHA-256 of the canonical input JSON
+    capture = Column(String(16), nullable=True)  # "full", "truncated" or "hash" (see capture_policy)
 
     # Status
     status = Column(String(16), default="success", nullable=False)
@@ -136,11 +339,31 @@ class AIArtifact(Base):
     latency_ms = Column(Float, nullable=True)
     cost = Column(Float, nullable=True)
 
+    # Archive file holding the payloads once compacted (see artifact_retention)
+    archive_ref = Column(String(128), nullable=True)
+
     # Relationships
     job = relationship("AIJob", back_populates="artifacts")
     feedback = relationship("AIFeedback", back_populates="artifact", cascade="all, delete-orphan")
 
 
+class AIPayloadBlob(Base):
+    """
+    A long artifact payload string (e.g. a base64 image), stored once.
+
+    Keyed by the SHA-256 of the string; refs counts the artifacts referencing
+    it (see payload_blobs.py).
+    """
+    __tablename__ = "ai_payload_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String(8), nullable=False)  # "base64" (decoded bytes), "zlib" or "zstd"
+    size = Column(Integer, nullable=False)  # length of the string
+    data = Column(LargeBinary, nullable=False)
+    refs = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class AIFeedback(Base):
     """
     User feedback on AI outputs for evaluation and improvement.
@@ -166,8 +389,24 @@ class AIFeedback(Base):
 
 
 def init_db():
-    """Create all database tables."""
-    Base.metadata.create_all(bind=get_engine())
+    """
+    Bring the database schema up to date.
+
+    Applies pending migrations (see migrations.py), or with
+    DB_MIGRATE_ON_STARTUP=false only warns about them.
+    """
+    from migrations import pending_migrations, upgrade
+
+    engine = get_engine()
+    if settings.DB_MIGRATE_ON_STARTUP:
+        upgrade(engine)
+        return
+    pending = pending_migrations(engine)
+    if pending:
+        logger.warning(
+            f"{len(pending)} pending schema migration(s) "
+            f"({', '.join(str(m.version) for m in pending)}); run `python migrations.py upgrade`"
+        )
 
 
 def get_db():
@@ -178,3 +417,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for getting asyncio database sessions."""
+    async with get_async_session_local()() as db:
+        yield db
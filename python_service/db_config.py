@@ -0,0 +1,202 @@
+"""
+Database engine configuration.
+
+SQLite defaults (rollback journal, synchronous=FULL, 2 MB page cache) make
+the API, embedded job worker and artifact writer serialize on every commit.
+Each new SQLite connection is configured in an engine "connect" event with:
+
+- journal_mode=WAL: readers no longer block the writer or each other
+- synchronous=NORMAL: fsync at checkpoints instead of every commit (durable
+  across application crashes; the last commits may roll back on power loss)
+- cache_size, mmap_size: larger page cache and memory-mapped reads
+- busy_timeout: writers wait for the lock instead of failing
+- auto_vacuum=INCREMENTAL (new databases only): space freed by deleted rows
+  can be returned to the OS in small steps (see artifact_retention.py)
+
+File databases use a QueuePool of DB_POOL_SIZE connections; in-memory
+databases use a StaticPool so every session sees the same database. All
+values come from the SQLITE_* and DB_POOL_* settings.
+
+PostgreSQL (several service instances sharing one database) uses psycopg 3
+with a pool of DB_POOL_SIZE + DB_MAX_OVERFLOW connections that are checked
+with a ping before use and replaced after DB_POOL_RECYCLE seconds, so
+connections dropped by the server or a proxy are never handed out.
+postgres:// URLs (as set by Fly) are accepted.
+
+create_async_db_engine builds the asyncio engine used by the API endpoints
+(aiosqlite for SQLite, asyncpg for PostgreSQL) with the same pragmas and
+pool settings. An in-memory SQLite database is private to its engine, so the
+sync and async engines only share file databases.
+"""
+
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from config import settings
+
+logger = logging.getLogger("grocery-planner-ai.db_config")
+
+# SQLite defaults, for comparison (see benchmark_db.py); the 5 s lock wait is
+# the sqlite3 module's default timeout
+SQLITE_DEFAULT_PRAGMAS = {
+    "auto_vacuum": "NONE",
+    "journal_mode": "DELETE",
+    "synchronous": "FULL",
+    "cache_size": -2000,
+    "mmap_size": 0,
+    "busy_timeout": 5000,
+}
+
+
+def sqlite_pragmas() -> dict[str, Any]:
+    """PRAGMAs applied to new SQLite connections (empty settings are skipped)."""
+    pragmas = {
+        # Only takes effect before the first table is created
+        "auto_vacuum": settings.SQLITE_AUTO_VACUUM,
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        # Negative cache_size is in KiB rather than pages
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB if settings.SQLITE_CACHE_SIZE_KB else None,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+    }
+    return {name: value for name, value in pragmas.items() if value not in ("", None)}
+
+
+def is_sqlite_memory(database_url: str) -> bool:
+    """Whether the URL is an in-memory SQLite database."""
+    return database_url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in database_url
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: dict[str, Any]) -> None:
+    """Run the PRAGMAs on every new connection of a SQLite engine."""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def normalize_database_url(database_url: str) -> str:
+    """Rewrite postgres:// and driverless postgresql:// URLs to use psycopg 3."""
+    for scheme in ("postgres://", "postgresql://"):
+        if database_url.startswith(scheme):
+            return "postgresql+psycopg://" + database_url[len(scheme):]
+    return database_url
+
+
+def _server_pool_options() -> dict[str, Any]:
+    """Pool options for client/server databases."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def create_db_engine(database_url: str, pragmas: Optional[dict[str, Any]] = None) -> Engine:
+    """
+    Create the engine for a database URL.
+
+    Args:
+        database_url: SQLAlchemy database URL
+        pragmas: SQLite PRAGMAs to apply (default: sqlite_pragmas())
+
+    Returns:
+        Configured engine
+    """
+    if not database_url.startswith("sqlite"):
+        return create_engine(normalize_database_url(database_url), **_server_pool_options())
+
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    if is_sqlite_memory(database_url):
+        engine = create_engine(
+            database_url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+    else:
+        engine = create_engine(
+            database_url,
+            connect_args={
+                "check_same_thread": False,
+                # sqlite3's own lock wait, in seconds
+                "timeout": pragmas.get("busy_timeout", 5000) / 1000,
+            },
+            poolclass=QueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    apply_sqlite_pragmas(engine, pragmas)
+    logger.debug(f"SQLite engine for {database_url} with pragmas {pragmas}")
+    return engine
+
+
+# Async DBAPI driver per database backend
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# Drivers create_async_engine accepts as they are
+_ASYNC_CAPABLE_DRIVERS = {"aiosqlite", "asyncpg", "psycopg"}
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    Rewrite a database URL to use the backend's asyncio driver.
+
+    URLs that already name an asyncio-capable driver are kept as they are.
+
+    Raises:
+        ValueError: If the backend has no known asyncio driver
+    """
+    if database_url.startswith("postgres://"):
+        database_url = "postgresql://" + database_url[len("postgres://"):]
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend} databases")
+    if "+" in url.drivername and url.get_driver_name() in _ASYNC_CAPABLE_DRIVERS:
+        return database_url
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+
+def create_async_db_engine(database_url: str, pragmas: Optional[dict[str, Any]] = None) -> AsyncEngine:
+    """
+    Create the asyncio engine for a database URL.
+
+    Args:
+        database_url: SQLAlchemy database URL (sync drivers are swapped for async ones)
+        pragmas: SQLite PRAGMAs to apply (default: sqlite_pragmas())
+
+    Returns:
+        Configured async engine
+    """
+    url = async_database_url(database_url)
+    if not url.startswith("sqlite"):
+        return create_async_engine(url, **_server_pool_options())
+
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    if is_sqlite_memory(database_url):
+        engine = create_async_engine(url, poolclass=StaticPool)
+    else:
+        engine = create_async_engine(
+            url,
+            connect_args={"timeout": pragmas.get("busy_timeout", 5000) / 1000},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    # Connect events are dispatched by the sync facade of the engine
+    apply_sqlite_pragmas(engine.sync_engine, pragmas)
+    return engine
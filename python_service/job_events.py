@@ -0,0 +1,181 @@
+"""
+Job status notifications.
+
+An in-process pub/sub fed by job state changes (jobs.update_job_status,
+claims and the lease sweep) lets the SSE and long-poll endpoints hold a
+connection until a job changes state instead of clients polling. Jobs can
+also carry a webhook URL that is notified (with the status_event, not the
+payloads) once the job succeeds, fails or is cancelled; receivers fetch the
+result from /api/v1/jobs/{job_id}/output.
+
+Webhook URLs must name a host in JOB_WEBHOOK_ALLOWED_HOSTS or, without an
+allowlist, a host resolving only to public addresses, so tenants cannot
+make the service call loopback, link-local or private-network endpoints.
+The URL is checked when the job is submitted and again before each
+delivery. Deliveries run on a pool of JOB_WEBHOOK_WORKERS threads.
+
+Jobs executed by dedicated worker processes publish in that process, so
+waiters also re-read the job status every JOB_EVENTS_RECHECK_INTERVAL seconds.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger("grocery-planner-ai.job_events")
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Webhook retry delays in seconds (one attempt per entry, plus the first)
+WEBHOOK_RETRY_DELAYS = (1, 4)
+
+
+class JobEventBus:
+    """
+    Thread-safe fan-out of job events to asyncio subscribers.
+
+    Subscribers get an asyncio.Queue bound to their own event loop; publish
+    may be called from any thread.
+    """
+
+    def __init__(self):
+        self._subscribers: dict[str, set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Subscribe the running event loop to events for a job."""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue) -> None:
+        """Remove a subscription created with subscribe."""
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, set())
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, job_id: str, event: dict[str, Any]) -> None:
+        """Deliver an event to every subscriber of the job."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(job_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # Subscriber's loop already closed
+                self.unsubscribe(job_id, queue)
+
+    def subscriber_count(self) -> int:
+        """Number of active subscriptions (for metrics)."""
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+
+job_events = JobEventBus()
+
+
+def status_event(job) -> dict[str, Any]:
+    """Lightweight event for a job state change (payloads are not decoded)."""
+    status = job.status.value if hasattr(job.status, "value") else job.status
+    return {
+        "job_id": job.id,
+        "tenant_id": job.tenant_id,
+        "feature": job.feature,
+        "status": status,
+        "error_message": job.error_message,
+        "attempts": job.attempts,
+        "progress": job.progress,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _signature(body: bytes) -> Optional[str]:
+    if not settings.JOB_WEBHOOK_SECRET:
+        return None
+    digest = hmac.new(settings.JOB_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+class WebhookURLError(ValueError):
+    """A webhook URL is not allowed."""
+
+
+def validate_webhook_url(url: str) -> None:
+    """
+    Check that a webhook URL may be called (resolves the host, so call it off the event loop).
+
+    Raises:
+        WebhookURLError: If the URL is not http(s), its host is not in
+            JOB_WEBHOOK_ALLOWED_HOSTS, or (without an allowlist) it resolves
+            to a loopback, link-local, private or otherwise non-public address
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise WebhookURLError("Webhook URL must be an http(s) URL with a host")
+    if settings.JOB_WEBHOOK_ALLOWED_HOSTS:
+        if host not in settings.JOB_WEBHOOK_ALLOWED_HOSTS:
+            raise WebhookURLError(f"Webhook host {host} is not allowed")
+        return
+
+    try:
+        infos = socket.getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise WebhookURLError(f"Webhook host {host} cannot be resolved")
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            raise WebhookURLError(f"Webhook host {host} resolves to a non-public address")
+
+
+def _post_webhook(url: str, event: dict[str, Any]) -> bool:
+    """POST a job event to a webhook URL, retrying on failure."""
+    try:
+        validate_webhook_url(url)
+    except WebhookURLError as e:
+        logger.warning(f"Webhook for job {event['job_id']} not sent: {e}")
+        return False
+
+    body = json.dumps(event).encode()
+    headers = {"Content-Type": "application/json", "X-Job-ID": event["job_id"]}
+    if signature := _signature(body):
+        headers["X-Signature"] = signature
+
+    with httpx.Client(timeout=settings.JOB_WEBHOOK_TIMEOUT) as client:
+        for attempt, delay in enumerate((0, *WEBHOOK_RETRY_DELAYS), start=1):
+            time.sleep(delay)
+            try:
+                response = client.post(url, content=body, headers=headers)
+                if response.status_code < 400:
+                    return True
+                logger.warning(f"Webhook for job {event['job_id']} returned {response.status_code} (attempt {attempt})")
+            except httpx.HTTPError as e:
+                logger.warning(f"Webhook for job {event['job_id']} failed (attempt {attempt}): {e}")
+    return False
+
+
+# Bounded pool for webhook deliveries (retries sleep on these threads)
+_webhook_pool = ThreadPoolExecutor(max_workers=settings.JOB_WEBHOOK_WORKERS, thread_name_prefix="job-webhook")
+
+
+def dispatch_webhook(url: str, event: dict[str, Any]) -> None:
+    """Deliver a webhook in the background; callable from any thread."""
+    _webhook_pool.submit(_post_webhook, url, event)
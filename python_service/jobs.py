@@ -2,37 +2,274 @@
 Job service for managing background AI tasks.
 
 Provides job submission, status tracking, and execution management.
+
+The ai_jobs table is the queue: submit_job only inserts a queued row, and
+workers (worker.py) claim rows atomically by taking a time-limited lease that
+they renew with heartbeats. Leases that expire (crashed or killed worker) are
+re-queued by recover_expired_leases.
+
+Outputs larger than JOB_OUTPUT_INLINE_MAX_BYTES are stored in the blob store
+(blob_store.py) and the row keeps only the reference and size.
+
+Failed jobs are retried per feature (RetryPolicy) with exponential backoff
+and jitter; queued jobs past their deadline expire unrun (expire_overdue_jobs);
+cancel_job stops queued jobs and interrupts running handlers.
+
+The *_async functions are the AsyncSession versions used by the API
+endpoints. Reads are native async queries; submission and cancellation run
+the sync implementation on the session's async connection (run_sync), so
+neither blocks the event loop. Workers use the sync functions.
 """
 
 import json
 import uuid
 import asyncio
-from datetime import datetime
-from typing import Optional, Callable, Awaitable
+import functools
+import hashlib
+import inspect
+import random
+from datetime import datetime, timedelta
+from typing import Optional, Callable, Awaitable, Union
 from concurrent.futures import ThreadPoolExecutor
 
+import httpx
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import AIJob, JobStatus, SessionLocal
+from blob_store import put_blob, read_blob
+from database import AIJob, AIJobChunk, JobStatus, get_session_local
+from job_events import dispatch_webhook, job_events, status_event
+from pagination import APPROXIMATE_COUNT_CAP, keyset_page
+from scheduler import FairScheduler, job_scheduler
+from config import settings
 import logging
 
 logger = logging.getLogger("grocery-planner-ai.jobs")
 
-# Thread pool for background job execution
+# Thread pool for synchronous job handlers
 _executor = ThreadPoolExecutor(max_workers=4)
 
+JobHandler = Callable[..., Union[Awaitable[dict], dict]]
+
+# Statuses a job never leaves
+FINISHED_STATUSES = (JobStatus.SUCCEEDED, JobStatus.FAILED, JobStatus.CANCELLED)
+
 # Registry of job handlers by feature name
-_job_handlers: dict[str, Callable[[dict], Awaitable[dict]]] = {}
+_job_handlers: dict[str, JobHandler] = {}
+
+# Default per-worker concurrency declared by handlers
+_handler_concurrency: dict[str, int] = {}
+
+# Retry policies declared by handlers
+_retry_policies: dict[str, "RetryPolicy"] = {}
+
+# Callbacks notified with the feature name whenever a job is queued
+_queued_listeners: list[Callable[[str], None]] = []
+
+# Handler tasks running in this process, by job ID (interrupted by cancel_job)
+_running_handlers: dict[str, asyncio.Task] = {}
+
+
+class RetryableJobError(Exception):
+    """Raised by handlers for transient failures that should be retried."""
+
+
+# Errors retried by default; anything else (e.g. ValueError for bad input)
+# fails the job on the first attempt
+DEFAULT_RETRYABLE_ERRORS = (RetryableJobError, TimeoutError, ConnectionError, httpx.TransportError)
+
+
+class RetryPolicy:
+    """
+    Whether and when a failed job is retried.
+
+    The delay before retry n is base_delay * 2 ** (n - 1), capped at
+    max_delay, with equal jitter (a random value between half and all of it)
+    so jobs that failed together do not retry in lockstep.
+
+    Args:
+        max_attempts: Total attempts including the first (default: JOB_MAX_ATTEMPTS)
+        base_delay: Seconds before the first retry (default: JOB_RETRY_BASE_DELAY)
+        max_delay: Maximum seconds between attempts (default: JOB_RETRY_MAX_DELAY)
+        retry_on: Exception classes that are retried
+    """
+
+    def __init__(
+        self,
+        max_attempts: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        retry_on: tuple[type[BaseException], ...] = DEFAULT_RETRYABLE_ERRORS,
+    ):
+        self.max_attempts = max_attempts or settings.JOB_MAX_ATTEMPTS
+        self.base_delay = settings.JOB_RETRY_BASE_DELAY if base_delay is None else base_delay
+        self.max_delay = settings.JOB_RETRY_MAX_DELAY if max_delay is None else max_delay
+        self.retry_on = retry_on
 
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """Whether a job that failed on `attempt` with `error` gets another attempt."""
+        return attempt < self.max_attempts and isinstance(error, self.retry_on)
 
-def register_job_handler(feature: str):
-    """Decorator to register a job handler for a specific feature."""
-    def decorator(func: Callable[[dict], Awaitable[dict]]):
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retrying a job that failed on `attempt`."""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+def register_job_handler(
+    feature: str,
+    concurrency: Optional[int] = None,
+    retry: Optional[RetryPolicy] = None,
+):
+    """
+    Decorator to register a job handler for a specific feature.
+
+    Handlers take the input payload, and optionally a JobContext as a second
+    argument for progress reporting and resumable chunks. Async handlers run
+    on the worker's event loop; plain functions run on the job thread pool.
+
+    Args:
+        feature: Feature name the handler executes
+        concurrency: Default concurrent jobs per worker for this feature
+            (JOB_FEATURE_CONCURRENCY overrides it)
+        retry: Retry policy for failed jobs (default: RetryPolicy())
+    """
+    def decorator(func: JobHandler):
         _job_handlers[feature] = func
+        if concurrency is not None:
+            _handler_concurrency[feature] = concurrency
+        if retry is not None:
+            _retry_policies[feature] = retry
         return func
     return decorator
 
 
+def get_job_handler(feature: str) -> Optional[JobHandler]:
+    """Return the handler registered for a feature, if any."""
+    return _job_handlers.get(feature)
+
+
+def get_handler_concurrency(feature: str) -> Optional[int]:
+    """Default per-worker concurrency declared by the feature's handler, if any."""
+    return _handler_concurrency.get(feature)
+
+
+def get_retry_policy(feature: str) -> RetryPolicy:
+    """Retry policy for a feature (the default policy if none was registered)."""
+    return _retry_policies.get(feature) or RetryPolicy()
+
+
+def registered_features() -> list[str]:
+    """Features that have a registered handler."""
+    return list(_job_handlers)
+
+
+def add_queued_listener(callback: Callable[[str], None]) -> None:
+    """Register a callback invoked after a job is queued (e.g. to wake a worker)."""
+    _queued_listeners.append(callback)
+
+
+def remove_queued_listener(callback: Callable[[str], None]) -> None:
+    """Unregister a callback added with add_queued_listener."""
+    if callback in _queued_listeners:
+        _queued_listeners.remove(callback)
+
+
+class LeaseLostError(RuntimeError):
+    """The worker no longer holds the job's lease."""
+
+
+class JobContext:
+    """
+    Execution context for handlers that accept a second argument.
+
+    Long-running handlers split their work into chunks and call save_chunk
+    (asave_chunk from async handlers, which runs it off the event loop)
+    after each one; the result and progress are persisted together, and a job
+    re-claimed after a crash or restart sees the saved results in `chunks`
+    and resumes after them.
+
+    Async handlers are interrupted with CancelledError when the job is
+    cancelled; handlers on the thread pool cannot be, but save_chunk raises
+    LeaseLostError once the job is cancelled, so chunked handlers stop at the
+    next chunk.
+
+    Args:
+        job_id: Job being executed
+        worker_id: Worker holding the lease
+        attempt: Claim attempt number (1 on the first run)
+        chunks: Results of chunks completed by earlier attempts, by index
+    """
+
+    def __init__(self, job_id: str, worker_id: str, attempt: int, chunks: Optional[dict[int, dict]] = None):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.chunks = chunks or {}
+
+    def save_chunk(self, index: int, result: dict, progress: float) -> None:
+        """
+        Persist a completed chunk and the job's progress percentage.
+
+        Raises:
+            LeaseLostError: If the lease expired and the job belongs to
+                another attempt; the handler should stop
+        """
+        db = get_session_local()()
+        try:
+            updated = db.query(AIJob).filter(
+                AIJob.id == self.job_id,
+                AIJob.lease_owner == self.worker_id,
+                AIJob.status == JobStatus.RUNNING,
+            ).update({AIJob.progress: round(progress, 2)}, synchronize_session=False)
+            if not updated:
+                db.rollback()
+                raise LeaseLostError(f"Job {self.job_id} lease lost by {self.worker_id} or cancelled")
+            db.add(AIJobChunk(job_id=self.job_id, chunk_index=index, output_payload=json.dumps(result)))
+            db.commit()
+            _publish_change(db.get(AIJob, self.job_id))
+        finally:
+            db.close()
+        self.chunks[index] = result
+
+    async def asave_chunk(self, index: int, result: dict, progress: float) -> None:
+        """Async version of save_chunk, run on a thread so the event loop is not blocked."""
+        await asyncio.to_thread(self.save_chunk, index, result, progress)
+
+
+def _accepts_context(handler: JobHandler) -> bool:
+    return len(inspect.signature(handler).parameters) >= 2
+
+
+class IdempotencyConflictError(ValueError):
+    """An idempotency key was reused with a different job input."""
+
+
+def job_fingerprint(
+    tenant_id: str,
+    feature: str,
+    input_payload: dict,
+    model_id: Optional[str] = None,
+    model_version: Optional[str] = None,
+) -> str:
+    """SHA-256 of the tenant, feature, canonical input and model of a job."""
+    canonical = json.dumps(
+        {
+            "tenant_id": tenant_id,
+            "feature": feature,
+            "input": input_payload,
+            "model_id": model_id,
+            "model_version": model_version,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
 def generate_job_id() -> str:
     """Generate a unique job ID."""
     return f"job_{uuid.uuid4().hex[:16]}"
@@ -47,6 +284,10 @@ def create_job(
     input_payload: dict,
     model_id: Optional[str] = None,
     model_version: Optional[str] = None,
+    priority: int = 0,
+    webhook_url: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    deadline_at: Optional[datetime] = None,
 ) -> AIJob:
     """
     Create a new job record in queued status.
@@ -60,6 +301,10 @@ def create_job(
         input_payload: Input data for the job
         model_id: Optional model identifier
         model_version: Optional model version
+        priority: Scheduling priority (higher runs first)
+        webhook_url: Optional URL notified when the job finishes
+        idempotency_key: Optional client key, unique per tenant
+        deadline_at: Optional time after which the job expires if not yet run
 
     Returns:
         Created AIJob instance
@@ -70,9 +315,14 @@ def create_job(
         user_id=user_id,
         feature=feature,
         status=JobStatus.QUEUED,
+        priority=priority,
         input_payload=json.dumps(input_payload),
         model_id=model_id,
         model_version=model_version,
+        webhook_url=webhook_url,
+        fingerprint=job_fingerprint(tenant_id, feature, input_payload, model_id, model_version),
+        idempotency_key=idempotency_key,
+        deadline_at=deadline_at,
         created_at=datetime.utcnow(),
     )
     db.add(job)
@@ -92,6 +342,63 @@ def create_job(
     return job
 
 
+def create_jobs(db: Session, tenant_id: str, user_id: str, jobs: list[dict]) -> list[dict]:
+    """
+    Create many queued jobs in one transaction with a single executemany.
+
+    Args:
+        db: Database session
+        tenant_id: Tenant (account) ID for scoping
+        user_id: User who submitted the jobs
+        jobs: Job specs with feature, payload and optional model_id,
+            model_version, priority, webhook_url and deadline_seconds
+
+    Returns:
+        The inserted rows (including generated job IDs), in input order
+    """
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": generate_job_id(),
+            "tenant_id": tenant_id,
+            "user_id": user_id,
+            "feature": spec["feature"],
+            "status": JobStatus.QUEUED,
+            "priority": spec.get("priority", 0),
+            "input_payload": json.dumps(spec.get("payload", {})),
+            "model_id": spec.get("model_id"),
+            "model_version": spec.get("model_version"),
+            "webhook_url": spec.get("webhook_url"),
+            "fingerprint": job_fingerprint(
+                tenant_id, spec["feature"], spec.get("payload", {}),
+                spec.get("model_id"), spec.get("model_version"),
+            ),
+            "attempts": 0,
+            "deadline_at": _deadline(now, spec.get("deadline_seconds")),
+            "created_at": now,
+        }
+        for spec in jobs
+    ]
+    if rows:
+        db.execute(insert(AIJob), rows)
+        db.commit()
+
+    logger.info(
+        "Jobs created",
+        extra={
+            "tenant_id": tenant_id,
+            "count": len(rows),
+            "status": JobStatus.QUEUED.value,
+        }
+    )
+
+    return rows
+
+
+def _deadline(now: datetime, deadline_seconds: Optional[float]) -> Optional[datetime]:
+    return now + timedelta(seconds=deadline_seconds) if deadline_seconds else None
+
+
 def get_job(db: Session, job_id: str, tenant_id: str) -> Optional[AIJob]:
     """
     Get a job by ID, scoped to tenant.
@@ -110,6 +417,75 @@ def get_job(db: Session, job_id: str, tenant_id: str) -> Optional[AIJob]:
     ).first()
 
 
+def find_duplicate_job(
+    db: Session,
+    tenant_id: str,
+    fingerprint: str,
+    idempotency_key: Optional[str] = None,
+    match_fingerprint: bool = True,
+) -> Optional[AIJob]:
+    """
+    Find an existing job that a new submission should attach to.
+
+    A job with the same idempotency key always matches (and must have the same
+    fingerprint). Otherwise, if match_fingerprint, a job with the same
+    fingerprint matches while it is queued or running, or for
+    JOB_DEDUP_WINDOW seconds after it succeeded.
+
+    Raises:
+        IdempotencyConflictError: If the idempotency key belongs to a job
+            with a different input
+    """
+    if idempotency_key:
+        job = db.query(AIJob).filter(
+            AIJob.tenant_id == tenant_id,
+            AIJob.idempotency_key == idempotency_key,
+        ).first()
+        if job is not None:
+            if job.fingerprint != fingerprint:
+                raise IdempotencyConflictError(
+                    f"Idempotency key {idempotency_key!r} was used for a different job"
+                )
+            return job
+
+    if not match_fingerprint:
+        return None
+
+    reusable = [AIJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])]
+    if settings.JOB_DEDUP_WINDOW > 0:
+        since = datetime.utcnow() - timedelta(seconds=settings.JOB_DEDUP_WINDOW)
+        reusable.append((AIJob.status == JobStatus.SUCCEEDED) & (AIJob.finished_at >= since))
+
+    return db.query(AIJob).filter(
+        AIJob.tenant_id == tenant_id,
+        AIJob.fingerprint == fingerprint,
+        or_(*reusable),
+    ).order_by(AIJob.created_at.desc()).first()
+
+
+def get_job_statuses(db: Session, tenant_id: str, job_ids: list[str]) -> list[dict]:
+    """
+    Get compact status records for many jobs, scoped to tenant.
+
+    Only status columns are selected; payloads are neither loaded nor decoded.
+
+    Args:
+        db: Database session
+        tenant_id: Tenant ID for access control
+        job_ids: Job identifiers
+
+    Returns:
+        Status records for the jobs that exist and belong to the tenant
+    """
+    if not job_ids:
+        return []
+    rows = db.query(*JOB_STATUS_COLUMNS).filter(
+        AIJob.tenant_id == tenant_id,
+        AIJob.id.in_(job_ids),
+    ).all()
+    return [job_status_to_dict(row) for row in rows]
+
+
 def list_jobs(
     db: Session,
     tenant_id: str,
@@ -117,9 +493,10 @@ def list_jobs(
     status: Optional[JobStatus] = None,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> list[AIJob]:
     """
-    List jobs for a tenant with optional filtering.
+    List jobs for a tenant with optional filtering, newest first.
 
     Args:
         db: Database session
@@ -128,18 +505,105 @@ def list_jobs(
         status: Optional status filter
         limit: Maximum results
         offset: Pagination offset
+        cursor: Start after this cursor (pagination.next_cursor of the previous page)
 
     Returns:
         List of matching AIJob records
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    query = _filter_jobs(db.query(AIJob), tenant_id, feature, status, cursor)
+    return query.offset(offset).limit(limit).all()
+
+
+def list_job_summaries(
+    db: Session,
+    tenant_id: str,
+    fields: Optional[tuple[str, ...]] = None,
+    feature: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> list[dict]:
+    """
+    List jobs for a tenant, selecting only the given columns.
+
+    Unlike list_jobs, no ORM rows are built and no payloads are read, so the
+    cost does not depend on payload size.
+
+    Args:
+        db: Database session
+        tenant_id: Tenant ID for scoping
+        fields: Names from JOB_LIST_FIELDS (default: JOB_SUMMARY_FIELDS)
+        feature: Optional feature filter
+        status: Optional status filter
+        limit: Maximum results
+        offset: Pagination offset
+        cursor: Start after this cursor (pagination.next_cursor of the previous page)
+
+    Returns:
+        One dict per job with the requested fields
+
+    Raises:
+        ValueError: If a field is not in JOB_LIST_FIELDS or the cursor is invalid
+    """
+    fields, columns = _job_list_columns(fields)
+    rows = _filter_jobs(db.query(*columns), tenant_id, feature, status, cursor).offset(offset).limit(limit)
+    return [{name: _summary_value(getattr(row, name)) for name in fields} for row in rows]
+
+
+def _job_list_columns(fields: Optional[tuple[str, ...]]) -> tuple[tuple[str, ...], list]:
+    fields = fields or JOB_SUMMARY_FIELDS
+    unknown = [name for name in fields if name not in JOB_LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown job fields: {', '.join(unknown)}")
+    return fields, [JOB_LIST_FIELDS[name].label(name) for name in fields]
+
+
+def count_jobs(
+    db: Session,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    cap: int = APPROXIMATE_COUNT_CAP,
+) -> int:
     """
-    query = db.query(AIJob).filter(AIJob.tenant_id == tenant_id)
+    Count a tenant's matching jobs, reading at most cap index entries.
+
+    Returns:
+        The count, or cap if there are at least that many
+    """
+    return db.scalar(_count_jobs_query(tenant_id, feature, status, cap))
+
 
+def _count_jobs_query(tenant_id: str, feature: Optional[str], status: Optional[JobStatus], cap: int):
+    matching = _filter_jobs(select(AIJob.id), tenant_id, feature, status).limit(cap).subquery()
+    return select(func.count()).select_from(matching)
+
+
+def _filter_jobs(
+    query,
+    tenant_id: str,
+    feature: Optional[str],
+    status: Optional[JobStatus],
+    cursor: Optional[str] = None,
+):
+    query = query.filter(AIJob.tenant_id == tenant_id)
     if feature:
         query = query.filter(AIJob.feature == feature)
     if status:
         query = query.filter(AIJob.status == status)
+    return keyset_page(query, AIJob.created_at, AIJob.id, cursor)
 
-    return query.order_by(AIJob.created_at.desc()).offset(offset).limit(limit).all()
+
+def _summary_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, JobStatus):
+        return value.value
+    return value
 
 
 def update_job_status(
@@ -170,11 +634,18 @@ def update_job_status(
 
     if status == JobStatus.RUNNING:
         job.started_at = datetime.utcnow()
-    elif status in (JobStatus.SUCCEEDED, JobStatus.FAILED):
+    elif status in FINISHED_STATUSES:
         job.finished_at = datetime.utcnow()
+        job.lease_owner = None
+        job.lease_expires_at = None
+
+    if status == JobStatus.SUCCEEDED:
+        job.progress = 100.0
+        job.error_message = None  # from an earlier, retried attempt
+        db.query(AIJobChunk).filter(AIJobChunk.job_id == job.id).delete(synchronize_session=False)
 
     if output_payload is not None:
-        job.output_payload = json.dumps(output_payload)
+        _store_output(job, output_payload)
     if error_message is not None:
         job.error_message = error_message
     if latency_ms is not None:
@@ -184,6 +655,7 @@ def update_job_status(
 
     db.commit()
     db.refresh(job)
+    _publish_change(job)
 
     logger.info(
         "Job status updated",
@@ -199,65 +671,405 @@ def update_job_status(
     return job
 
 
-async def execute_job(job_id: str, tenant_id: str) -> None:
+def _store_output(job: AIJob, output_payload: dict) -> None:
+    """Set the job output inline, or in the blob store if it is large."""
+    encoded = json.dumps(output_payload).encode()
+    job.output_size = len(encoded)
+    if 0 < settings.JOB_OUTPUT_INLINE_MAX_BYTES < len(encoded):
+        job.output_ref = put_blob(encoded)
+        job.output_payload = None
+    else:
+        job.output_ref = None
+        job.output_payload = encoded.decode()
+
+
+def get_job_output(job: AIJob) -> Optional[dict]:
+    """Load a job's output, from the row or the blob store."""
+    if job.output_ref:
+        return json.loads(read_blob(job.output_ref))
+    return json.loads(job.output_payload) if job.output_payload else None
+
+
+def _publish_change(job: AIJob) -> None:
+    """Notify waiters of a job state change, and the webhook once it finishes."""
+    event = status_event(job)
+    job_events.publish(job.id, event)
+    if job.webhook_url and job.status in FINISHED_STATUSES:
+        dispatch_webhook(job.webhook_url, event)
+
+
+def claim_next_job(
+    db: Session,
+    worker_id: str,
+    features: Optional[list[str]] = None,
+    lease_seconds: int = 30,
+    scheduler: Optional[FairScheduler] = None,
+) -> Optional[AIJob]:
     """
-    Execute a job asynchronously.
+    Atomically claim the next scheduled job and lease it to a worker.
 
-    This function runs the appropriate handler for the job's feature
-    and updates the job status accordingly.
+    The scheduler picks candidates (priority, tenant caps, fair share); the
+    claim is a conditional UPDATE (status still queued), so concurrent
+    workers in other processes can never claim the same job. On PostgreSQL
+    the candidate is first locked with SELECT ... FOR UPDATE SKIP LOCKED, so
+    concurrent workers claim different jobs without contending.
 
     Args:
-        job_id: Job identifier
-        tenant_id: Tenant ID for scoping
+        db: Database session
+        worker_id: Identifier of the claiming worker
+        features: Only claim jobs for these features (None for any)
+        lease_seconds: Lease duration before the job is considered abandoned
+        scheduler: Scheduler to order candidates (default: job_scheduler)
+
+    Returns:
+        The claimed AIJob in running status, or None if nothing is claimable
+    """
+    if features is not None and not features:
+        return None
+
+    skip_locked = db.get_bind().dialect.name == "postgresql"
+    candidates = (scheduler or job_scheduler).candidates(
+        db, features, limit=1 if skip_locked else 10, skip_locked=skip_locked
+    )
+
+    for job_id in candidates:
+        now = datetime.utcnow()
+        claimed = db.query(AIJob).filter(
+            AIJob.id == job_id,
+            AIJob.status == JobStatus.QUEUED,
+        ).update({
+            AIJob.status: JobStatus.RUNNING,
+            AIJob.started_at: now,
+            AIJob.heartbeat_at: now,
+            AIJob.lease_owner: worker_id,
+            AIJob.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            AIJob.attempts: AIJob.attempts + 1,
+        }, synchronize_session=False)
+        db.commit()
+
+        if claimed:
+            job = db.query(AIJob).filter(AIJob.id == job_id).first()
+            _publish_change(job)
+            logger.info(
+                "Job claimed",
+                extra={
+                    "job_id": job.id,
+                    "tenant_id": job.tenant_id,
+                    "feature": job.feature,
+                    "worker_id": worker_id,
+                    "attempt": job.attempts,
+                }
+            )
+            return job
+
+    return None
+
+
+def renew_lease(db: Session, job_id: str, worker_id: str, lease_seconds: int = 30) -> bool:
+    """
+    Heartbeat: extend a running job's lease.
+
+    Returns:
+        False if the worker no longer owns the job (lease expired and the
+        job was re-queued or claimed by another worker)
+    """
+    now = datetime.utcnow()
+    renewed = db.query(AIJob).filter(
+        AIJob.id == job_id,
+        AIJob.lease_owner == worker_id,
+        AIJob.status == JobStatus.RUNNING,
+    ).update({
+        AIJob.heartbeat_at: now,
+        AIJob.lease_expires_at: now + timedelta(seconds=lease_seconds),
+    }, synchronize_session=False)
+    db.commit()
+    return bool(renewed)
+
+
+def recover_expired_leases(db: Session) -> dict[str, int]:
+    """
+    Crash-recovery sweep for running jobs whose lease has expired.
+
+    Jobs are re-queued, or failed once they have used the max_attempts of
+    their feature's RetryPolicy. Running jobs without a lease (started before
+    leases existed) count as expired.
+
+    Returns:
+        Counts of re-queued and failed jobs
+    """
+    now = datetime.utcnow()
+    expired = db.query(AIJob).filter(
+        AIJob.status == JobStatus.RUNNING,
+        or_(AIJob.lease_expires_at.is_(None), AIJob.lease_expires_at < now),
+    ).all()
+
+    counts = {"requeued": 0, "failed": 0}
+    for job in expired:
+        if job.attempts >= get_retry_policy(job.feature).max_attempts:
+            job.status = JobStatus.FAILED
+            job.finished_at = now
+            job.error_message = f"Job lease expired after {job.attempts} attempts"
+            counts["failed"] += 1
+        else:
+            job.status = JobStatus.QUEUED
+            job.started_at = None
+            counts["requeued"] += 1
+        logger.warning(
+            "Job lease expired",
+            extra={
+                "job_id": job.id,
+                "tenant_id": job.tenant_id,
+                "feature": job.feature,
+                "worker_id": job.lease_owner,
+                "status": job.status.value,
+            }
+        )
+        job.lease_owner = None
+        job.lease_expires_at = None
+    db.commit()
+
+    for job in expired:
+        _publish_change(job)
+    return counts
+
+
+def fail_unhandled_jobs(db: Session, features: list[str]) -> int:
+    """Fail queued jobs whose feature has no registered handler."""
+    jobs = db.query(AIJob).filter(
+        AIJob.status == JobStatus.QUEUED,
+        AIJob.feature.notin_(features),
+    ).all()
+    for job in jobs:
+        update_job_status(
+            db, job, JobStatus.FAILED,
+            error_message=f"No handler registered for feature: {job.feature}"
+        )
+    return len(jobs)
+
+
+def expire_overdue_jobs(db: Session) -> int:
+    """Fail queued jobs whose deadline passed before a worker ran them."""
+    jobs = db.query(AIJob).filter(
+        AIJob.status == JobStatus.QUEUED,
+        AIJob.deadline_at < datetime.utcnow(),
+    ).all()
+    for job in jobs:
+        message = "Job deadline exceeded before it ran"
+        if job.error_message:
+            message += f" (last error: {job.error_message})"
+        update_job_status(db, job, JobStatus.FAILED, error_message=message)
+    return len(jobs)
+
+
+def cancel_job(db: Session, job: AIJob) -> bool:
+    """
+    Cancel a queued or running job.
+
+    A queued job is never claimed. A running handler in this process is
+    interrupted immediately; one in another worker process is interrupted by
+    that worker's next heartbeat, which finds the lease gone. Any result it
+    still produces is discarded.
+
+    Args:
+        db: Database session
+        job: Job to cancel
+
+    Returns:
+        False if the job had already finished
     """
-    db = SessionLocal()
+    now = datetime.utcnow()
+    cancelled = db.query(AIJob).filter(
+        AIJob.id == job.id,
+        AIJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]),
+    ).update({
+        AIJob.status: JobStatus.CANCELLED,
+        AIJob.finished_at: now,
+        AIJob.error_message: "Job cancelled",
+        AIJob.lease_owner: None,
+        AIJob.lease_expires_at: None,
+    }, synchronize_session=False)
+    db.commit()
+    db.refresh(job)
+    if not cancelled:
+        return False
+
+    task = _running_handlers.get(job.id)
+    if task is not None:
+        task.get_loop().call_soon_threadsafe(task.cancel)
+
+    _publish_change(job)
+    logger.info(
+        "Job cancelled",
+        extra={
+            "job_id": job.id,
+            "tenant_id": job.tenant_id,
+            "feature": job.feature,
+            "status": job.status.value,
+        }
+    )
+    return True
+
+
+def _schedule_retry(db: Session, job: AIJob, error_message: str, retry_at: datetime) -> None:
+    """Put a failed job back in the queue, claimable from retry_at."""
+    job.status = JobStatus.QUEUED
+    job.started_at = None
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.next_attempt_at = retry_at
+    job.error_message = error_message
+    db.commit()
+    db.refresh(job)
+    _publish_change(job)
+
+    logger.warning(
+        "Job retry scheduled",
+        extra={
+            "job_id": job.id,
+            "tenant_id": job.tenant_id,
+            "feature": job.feature,
+            "attempt": job.attempts,
+            "retry_at": retry_at.isoformat(),
+        }
+    )
+
+
+async def execute_job(job_id: str, worker_id: str, lease_seconds: int = 30) -> None:
+    """
+    Execute a job claimed by this worker.
+
+    Runs the handler for the job's feature while a heartbeat renews the
+    lease. The result is only recorded if the worker still owns the job; the
+    handler is interrupted if the lease is lost or the job is cancelled.
+    Failures are retried according to the feature's RetryPolicy, unless the
+    retry would start after the job's deadline. Database work runs on a
+    thread, so the embedded worker never blocks the API event loop.
+
+    Args:
+        job_id: Identifier of a job claimed via claim_next_job
+        worker_id: Worker holding the lease
+        lease_seconds: Lease duration renewed on each heartbeat
+    """
+    loaded = await asyncio.to_thread(_load_claimed_job, job_id, worker_id)
+    if loaded is None:
+        return
+    handler, args = loaded
+
+    async def run_handler():
+        if asyncio.iscoroutinefunction(handler):
+            return await handler(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            _executor, functools.partial(handler, *args)
+        )
+
+    start_time = datetime.utcnow()
+    handler_task = asyncio.ensure_future(run_handler())
+    _running_handlers[job_id] = handler_task
+    heartbeat = asyncio.create_task(_heartbeat(job_id, worker_id, lease_seconds, handler_task))
     try:
-        job = get_job(db, job_id, tenant_id)
-        if not job:
-            logger.error(f"Job not found: {job_id}")
-            return
+        await asyncio.wait({handler_task})
+    finally:
+        heartbeat.cancel()
+        handler_task.cancel()
+        _running_handlers.pop(job_id, None)
 
-        if job.status != JobStatus.QUEUED:
-            logger.warning(f"Job {job_id} is not in queued status: {job.status}")
-            return
+    if handler_task.cancelled():
+        logger.info(f"Job {job_id} interrupted on {worker_id} (cancelled or lease lost)")
+        return
+
+    error = handler_task.exception()
+    if error is not None:
+        logger.error(f"Job {job_id} failed: {error}", exc_info=error)
+    latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
+    result = handler_task.result() if error is None else None
+    await asyncio.to_thread(_record_outcome, job_id, worker_id, result, error, latency_ms)
+
+
+def _load_claimed_job(job_id: str, worker_id: str) -> Optional[tuple[JobHandler, list]]:
+    """Handler and arguments of a job leased to worker_id (None if it cannot run)."""
+    db = get_session_local()()
+    try:
+        job = db.query(AIJob).filter(AIJob.id == job_id, AIJob.lease_owner == worker_id).first()
+        if not job:
+            logger.error(f"Job not found or not leased to {worker_id}: {job_id}")
+            return None
 
-        # Get the handler for this feature
         handler = _job_handlers.get(job.feature)
         if not handler:
             update_job_status(
                 db, job, JobStatus.FAILED,
                 error_message=f"No handler registered for feature: {job.feature}"
             )
-            return
+            return None
 
-        # Mark as running
-        update_job_status(db, job, JobStatus.RUNNING)
-        start_time = datetime.utcnow()
+        args = [json.loads(job.input_payload) if job.input_payload else {}]
+        if _accepts_context(handler):
+            chunks = {
+                chunk.chunk_index: json.loads(chunk.output_payload)
+                for chunk in db.query(AIJobChunk).filter(AIJobChunk.job_id == job_id)
+            }
+            args.append(JobContext(job_id, worker_id, job.attempts, chunks))
+        return handler, args
+    finally:
+        db.close()
 
-        try:
-            # Parse input and execute handler
-            input_payload = json.loads(job.input_payload) if job.input_payload else {}
-            result = await handler(input_payload)
 
-            # Calculate latency
-            latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
+def _record_outcome(
+    job_id: str, worker_id: str, result: Optional[dict], error: Optional[BaseException], latency_ms: float
+) -> None:
+    """Record a handler's result, or retry or fail the job, if worker_id still holds the lease."""
+    db = get_session_local()()
+    try:
+        job = db.query(AIJob).filter(
+            AIJob.id == job_id,
+            AIJob.lease_owner == worker_id,
+            AIJob.status == JobStatus.RUNNING,
+        ).first()
+        if not job:
+            logger.warning(f"Job {job_id} lease lost by {worker_id}; discarding result")
+            return
 
-            # Mark as succeeded
+        if error is None:
             update_job_status(
                 db, job, JobStatus.SUCCEEDED,
                 output_payload=result,
                 latency_ms=latency_ms,
             )
+            return
 
-        except Exception as e:
-            latency_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
-            logger.exception(f"Job {job_id} failed: {e}")
+        policy = get_retry_policy(job.feature)
+        retry_at = datetime.utcnow() + timedelta(seconds=policy.delay(job.attempts))
+        if policy.should_retry(error, job.attempts) and (job.deadline_at is None or retry_at < job.deadline_at):
+            _schedule_retry(db, job, str(error), retry_at)
+        else:
             update_job_status(
                 db, job, JobStatus.FAILED,
-                error_message=str(e),
+                error_message=str(error),
                 latency_ms=latency_ms,
             )
+    finally:
+        db.close()
+
+
+async def _heartbeat(job_id: str, worker_id: str, lease_seconds: int, handler_task: asyncio.Task) -> None:
+    """
+    Renew a job lease every third of its duration until cancelled.
 
+    Interrupts the handler once the lease is lost (expired, or the job was
+    cancelled from another process), since its result would be discarded.
+    """
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        if not await asyncio.to_thread(_renew_lease_once, job_id, worker_id, lease_seconds):
+            logger.warning(f"Job {job_id} lease lost by {worker_id}")
+            handler_task.cancel()
+            return
+
+
+def _renew_lease_once(job_id: str, worker_id: str, lease_seconds: int) -> bool:
+    db = get_session_local()()
+    try:
+        return renew_lease(db, job_id, worker_id, lease_seconds)
     finally:
         db.close()
 
@@ -270,11 +1082,19 @@ def submit_job(
     input_payload: dict,
     model_id: Optional[str] = None,
     model_version: Optional[str] = None,
-) -> AIJob:
+    priority: int = 0,
+    webhook_url: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+    dedupe: bool = True,
+    deadline_seconds: Optional[float] = None,
+) -> tuple[AIJob, bool]:
     """
     Submit a new job for background execution.
 
-    Creates the job record and schedules it for execution.
+    Creates the queued job record; a worker claims and executes it. If an
+    identical job (same tenant, feature, canonical input and model) is
+    queued, running or recently succeeded, or the idempotency key was
+    already used, the existing job is returned instead of creating new work.
 
     Args:
         db: Database session
@@ -284,30 +1104,222 @@ def submit_job(
         input_payload: Input data
         model_id: Optional model identifier
         model_version: Optional model version
+        priority: Scheduling priority (higher runs first)
+        webhook_url: Optional URL notified when the job finishes
+        idempotency_key: Optional client key; resubmissions return the same job
+        dedupe: Attach to an identical existing job (default True)
+        deadline_seconds: Expire the job if it has not run within this many seconds
 
     Returns:
-        Created AIJob instance
+        The created or existing AIJob, and whether it was created by this call
+
+    Raises:
+        IdempotencyConflictError: If the idempotency key belongs to a job
+            with a different input
+        IntegrityError: If the insert failed and no job won an idempotency
+            key race
     """
+    fingerprint = job_fingerprint(tenant_id, feature, input_payload, model_id, model_version)
+    existing = find_duplicate_job(db, tenant_id, fingerprint, idempotency_key, match_fingerprint=dedupe)
+    if existing is not None:
+        logger.info(
+            "Job deduplicated",
+            extra={
+                "job_id": existing.id,
+                "tenant_id": tenant_id,
+                "feature": feature,
+                "status": existing.status.value,
+            }
+        )
+        return existing, False
+
     job_id = generate_job_id()
-    job = create_job(
-        db=db,
-        job_id=job_id,
-        tenant_id=tenant_id,
-        user_id=user_id,
-        feature=feature,
-        input_payload=input_payload,
-        model_id=model_id,
-        model_version=model_version,
+    try:
+        job = create_job(
+            db=db,
+            job_id=job_id,
+            tenant_id=tenant_id,
+            user_id=user_id,
+            feature=feature,
+            input_payload=input_payload,
+            model_id=model_id,
+            model_version=model_version,
+            priority=priority,
+            webhook_url=webhook_url,
+            idempotency_key=idempotency_key,
+            deadline_at=_deadline(datetime.utcnow(), deadline_seconds),
+        )
+    except IntegrityError:
+        # A concurrent submission with the same idempotency key won the race
+        db.rollback()
+        existing = find_duplicate_job(db, tenant_id, fingerprint, idempotency_key, match_fingerprint=False)
+        if existing is None:
+            # Another constraint failed, or the winning job is already gone
+            raise
+        return existing, False
+
+    for callback in _queued_listeners:
+        callback(feature)
+
+    return job, True
+
+
+def submit_jobs(db: Session, tenant_id: str, user_id: str, jobs: list[dict]) -> list[dict]:
+    """
+    Submit many jobs for background execution in one transaction.
+
+    Args:
+        db: Database session
+        tenant_id: Tenant ID
+        user_id: User ID
+        jobs: Job specs (see create_jobs)
+
+    Returns:
+        The inserted rows, in input order
+    """
+    rows = create_jobs(db, tenant_id, user_id, jobs)
+
+    for feature in {row["feature"] for row in rows}:
+        for callback in _queued_listeners:
+            callback(feature)
+
+    return rows
+
+
+async def get_job_async(db: AsyncSession, job_id: str, tenant_id: str) -> Optional[AIJob]:
+    """Async version of get_job."""
+    return await db.scalar(select(AIJob).where(AIJob.id == job_id, AIJob.tenant_id == tenant_id))
+
+
+async def get_job_statuses_async(db: AsyncSession, tenant_id: str, job_ids: list[str]) -> list[dict]:
+    """Async version of get_job_statuses."""
+    if not job_ids:
+        return []
+    result = await db.execute(
+        select(*JOB_STATUS_COLUMNS).where(AIJob.tenant_id == tenant_id, AIJob.id.in_(job_ids))
     )
+    return [job_status_to_dict(row) for row in result]
 
-    # Schedule job execution
-    asyncio.create_task(execute_job(job_id, tenant_id))
 
-    return job
+async def list_jobs_async(
+    db: AsyncSession,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> list[AIJob]:
+    """
+    Async version of list_jobs.
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    query = _filter_jobs(select(AIJob), tenant_id, feature, status, cursor).offset(offset).limit(limit)
+    return list(await db.scalars(query))
+
+
+async def list_job_summaries_async(
+    db: AsyncSession,
+    tenant_id: str,
+    fields: Optional[tuple[str, ...]] = None,
+    feature: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> list[dict]:
+    """
+    Async version of list_job_summaries.
+
+    Raises:
+        ValueError: If a field is not in JOB_LIST_FIELDS or the cursor is invalid
+    """
+    fields, columns = _job_list_columns(fields)
+    query = _filter_jobs(select(*columns), tenant_id, feature, status, cursor).offset(offset).limit(limit)
+    return [{name: _summary_value(getattr(row, name)) for name in fields} for row in await db.execute(query)]
+
+
+async def count_jobs_async(
+    db: AsyncSession,
+    tenant_id: str,
+    feature: Optional[str] = None,
+    status: Optional[JobStatus] = None,
+    cap: int = APPROXIMATE_COUNT_CAP,
+) -> int:
+    """Async version of count_jobs."""
+    return await db.scalar(_count_jobs_query(tenant_id, feature, status, cap))
+
+
+async def submit_job_async(db: AsyncSession, **fields) -> tuple[AIJob, bool]:
+    """
+    Async version of submit_job.
+
+    Raises:
+        IdempotencyConflictError: If the idempotency key belongs to a job
+            with a different input
+    """
+    return await db.run_sync(functools.partial(submit_job, **fields))
+
+
+async def submit_jobs_async(db: AsyncSession, tenant_id: str, user_id: str, jobs: list[dict]) -> list[dict]:
+    """Async version of submit_jobs."""
+    return await db.run_sync(submit_jobs, tenant_id, user_id, jobs)
+
+
+async def cancel_job_async(db: AsyncSession, job: AIJob) -> bool:
+    """Async version of cancel_job."""
+    return await db.run_sync(cancel_job, job)
+
+
+# Columns selectable in job list projections (payloads only on the detail endpoint)
+JOB_LIST_FIELDS = {
+    column.name: column
+    for column in (
+        AIJob.id, AIJob.tenant_id, AIJob.user_id, AIJob.feature, AIJob.status, AIJob.priority,
+        AIJob.attempts, AIJob.progress, AIJob.error_message, AIJob.model_id, AIJob.model_version,
+        AIJob.created_at, AIJob.started_at, AIJob.finished_at, AIJob.latency_ms, AIJob.cost,
+        AIJob.output_size, AIJob.next_attempt_at, AIJob.deadline_at,
+    )
+}
+
+# Fields of the summary list view
+JOB_SUMMARY_FIELDS = (
+    "id", "feature", "status", "priority", "attempts", "progress", "error_message",
+    "created_at", "started_at", "finished_at",
+)
+
+# Columns needed for status-only responses (no payloads)
+JOB_STATUS_COLUMNS = (
+    AIJob.id, AIJob.feature, AIJob.status, AIJob.priority, AIJob.attempts, AIJob.progress, AIJob.error_message,
+    AIJob.created_at, AIJob.started_at, AIJob.finished_at,
+)
+
+
+def job_status_to_dict(job) -> dict:
+    """Convert a job (or a JOB_STATUS_COLUMNS row) to a compact status record."""
+    return {
+        "job_id": job.id,
+        "feature": job.feature,
+        "status": job.status.value if isinstance(job.status, JobStatus) else job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "progress": job.progress,
+        "error_message": job.error_message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
 
 
 def job_to_dict(job: AIJob) -> dict:
-    """Convert a job to a dictionary for API responses."""
+    """
+    Convert a job to a dictionary for API responses.
+
+    Offloaded outputs are not loaded (output_payload is None and
+    output_offloaded True); fetch them from the job output endpoint.
+    """
     return {
         "id": job.id,
         "tenant_id": job.tenant_id,
@@ -324,4 +1336,11 @@ def job_to_dict(job: AIJob) -> dict:
         "finished_at": job.finished_at.isoformat() if job.finished_at else None,
         "latency_ms": job.latency_ms,
         "cost": job.cost,
+        "attempts": job.attempts,
+        "priority": job.priority,
+        "progress": job.progress,
+        "output_size": job.output_size,
+        "output_offloaded": bool(job.output_ref),
+        "next_attempt_at": job.next_attempt_at.isoformat() if job.next_attempt_at else None,
+        "deadline_at": job.deadline_at.isoformat() if job.deadline_at else None,
     }
@@ -5,12 +5,19 @@ FastAPI application providing AI capabilities for the GroceryPlanner application
 Features include categorization, receipt extraction, embeddings, and more.
 """
 
+import asyncio
+import functools
+import json
+import math
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Optional
 
-from fastapi import FastAPI, Depends, HTTPException, Query
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from schemas import (
@@ -20,36 +27,60 @@ from schemas import (
     BatchPrediction, ExtractionRequestPayload, ExtractionResponsePayload, ExtractedItem,
     EmbedRequest, EmbedResponse, EmbedBatchRequest, EmbeddingResult,
     JobSubmitRequest, JobStatusResponse, JobListResponse,
+    BulkJobSubmitRequest, BulkJobSubmitResponse, BulkJobStatusRequest, BulkJobStatusResponse, JobStatusSummary,
     ArtifactResponse, ArtifactListResponse,
     FeedbackRequest, FeedbackResponse,
     ReceiptExtractRequest, ReceiptExtractResponse,
-    MealOptimizationRequestPayload,
+    MealOptimizationRequestPayload, BatchMealOptimizationRequestPayload,
     QuickSuggestionRequestPayload,
 )
-from database import init_db, get_db, JobStatus
-from jobs import submit_job, get_job, list_jobs, job_to_dict, register_job_handler
+from database import init_db, get_db, get_async_db, get_async_session_local, dispose_async_engine, JobStatus
+from jobs import (
+    submit_job_async, submit_jobs_async, get_job_async, get_job_statuses_async, list_jobs_async,
+    list_job_summaries_async, count_jobs_async, job_to_dict, register_job_handler, JOB_SUMMARY_FIELDS,
+    cancel_job_async, IdempotencyConflictError, JobContext,
+)
 from artifacts import (
-    create_artifact, get_artifact, list_artifacts, artifact_to_dict,
-    add_feedback, feedback_to_dict
+    get_artifact_async, list_artifacts_async, list_artifact_summaries_async, count_artifacts_async,
+    artifact_to_dict,
+    ARTIFACT_SUMMARY_FIELDS,
+    add_feedback_async, feedback_to_dict
 )
 from middleware import (
     setup_structured_logging,
     RequestTracingMiddleware,
     TenantValidationMiddleware,
 )
+from solution_cache import meal_plan_cache, recipe_library_hash
+from scheduler import job_scheduler
+from blob_store import blob_codec, blob_path, iter_blob
+from pagination import KEY_FIELDS, next_cursor
+from ocr_pool import extract_receipt_in_pool, shutdown_ocr_pool
+from job_events import TERMINAL_STATUSES, WebhookURLError, job_events, status_event, validate_webhook_url
+from worker import JobWorker
+from artifact_writer import artifact_writer, record_artifact
+from artifact_retention import artifact_compactor, restore_archived_payloads, retention_enabled
+from payload_blobs import blob_hashes, load_blobs_async, restore_blobs
 from config import settings
 import logging
 
 # Optional Tesseract OCR import (graceful fallback if not installed)
 try:
     from receipt_ocr import process_receipt as _tesseract_process_receipt
+    from receipt_ocr import flatten_extraction_result
 except ImportError:
     _tesseract_process_receipt = None
+    flatten_extraction_result = None
 
 # Optional meal optimizer import (graceful fallback if not installed)
 try:
-    from meal_optimizer import optimize_meal_plan, quick_suggestions
+    from meal_optimizer import (
+        RecipeLibrary, get_recipe_matrix, lookup_recipe_matrix, optimize_meal_plan, quick_suggestions,
+    )
 except ImportError:
+    RecipeLibrary = None
+    get_recipe_matrix = None
+    lookup_recipe_matrix = None
     optimize_meal_plan = None
     quick_suggestions = None
 
@@ -63,12 +94,23 @@ classifier = None
 # Global embedding model instance (lazy-loaded on first use)
 _embedding_model = None
 
+# Shared thread pool for blocking meal plan solves (batch runs, refinement jobs)
+_solver_pool = ThreadPoolExecutor(
+    max_workers=settings.MEAL_PLAN_SOLVER_WORKERS,
+    thread_name_prefix="meal-solver",
+)
+
+
+def get_embedding_model_name() -> str:
+    """Embedding model configured via EMBEDDING_MODEL."""
+    return os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
 
 def get_embedding_model():
     """Lazy-load the sentence transformer model for embeddings."""
     global _embedding_model
     if _embedding_model is None:
-        model_name = os.environ.get("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+        model_name = get_embedding_model_name()
         logger.info(f"Loading embedding model: {model_name}...")
         try:
             from sentence_transformers import SentenceTransformer
@@ -123,11 +165,32 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("Real classification disabled, using mock implementation")
 
+    # Write artifacts in batches off the request path
+    if settings.ARTIFACT_WRITER_ENABLED:
+        artifact_writer.start()
+
+    # Archive or delete artifacts past their retention, if one is configured
+    if retention_enabled():
+        artifact_compactor.start()
+
+    # Run a job worker in-process unless dedicated workers (worker.py) are used
+    job_worker, job_worker_task = None, None
+    if settings.JOB_EMBEDDED_WORKER:
+        job_worker = JobWorker()
+        job_worker_task = asyncio.create_task(job_worker.run())
+
     logger.info("AI Service starting up...")
 
     yield
 
     # Cleanup
+    if job_worker is not None:
+        job_worker.stop()
+        await job_worker_task
+    await artifact_writer.stop()
+    await artifact_compactor.stop()
+    await dispose_async_engine()
+    shutdown_ocr_pool()
     classifier = None
     logger.info("AI Service shutting down...")
 
@@ -215,12 +278,24 @@ def liveness_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def service_metrics(db: Session = Depends(get_db)):
+    """Service metrics (cache hit rates, job queue depth and wait times, etc.)."""
+    return {
+        "meal_plan_cache": meal_plan_cache.stats(),
+        "job_scheduler": job_scheduler.snapshot(db),
+        "job_event_subscribers": job_events.subscriber_count(),
+        "artifact_writer": artifact_writer.stats(),
+        "artifact_compactor": artifact_compactor.stats(),
+    }
+
+
 # =============================================================================
 # Synchronous AI Endpoints (with artifact storage)
 # =============================================================================
 
 @app.post("/api/v1/categorize", response_model=BaseResponse)
-async def categorize_item(request: BaseRequest, db: Session = Depends(get_db)):
+async def categorize_item(request: BaseRequest):
     """
     Predicts the category for a given grocery item name.
 
@@ -289,8 +364,7 @@ async def categorize_item(request: BaseRequest, db: Session = Depends(get_db)):
         latency_ms = (time.time() - start_time) * 1000
 
         # Store artifact
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -323,8 +397,7 @@ async def categorize_item(request: BaseRequest, db: Session = Depends(get_db)):
         logger.error(f"Error processing request {request.request_id}: {str(e)}")
 
         # Store error artifact
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -346,7 +419,7 @@ async def categorize_item(request: BaseRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/api/v1/categorize-batch", response_model=BaseResponse)
-async def categorize_batch(request: BaseRequest, db: Session = Depends(get_db)):
+async def categorize_batch(request: BaseRequest):
     """
     Predicts categories for a batch of grocery items.
 
@@ -419,8 +492,7 @@ async def categorize_batch(request: BaseRequest, db: Session = Depends(get_db)):
         )
 
         # Store artifact
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -442,8 +514,7 @@ async def categorize_batch(request: BaseRequest, db: Session = Depends(get_db)):
         processing_time_ms = (time.time() - start_time) * 1000
         logger.error(f"Error processing batch request {request.request_id}: {str(e)}")
 
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -465,7 +536,7 @@ async def categorize_batch(request: BaseRequest, db: Session = Depends(get_db)):
 
 
 @app.post("/api/v1/extract-receipt", response_model=BaseResponse)
-async def extract_receipt_endpoint(request: BaseRequest, db: Session = Depends(get_db)):
+async def extract_receipt_endpoint(request: BaseRequest):
     """
     Extracts items from a receipt image.
 
@@ -529,44 +600,7 @@ async def extract_receipt_endpoint(request: BaseRequest, db: Session = Depends(g
                     result = _tesseract_process_receipt(tmp_path)
 
                     # Transform ExtractionResult -> ExtractionResponsePayload (flat format)
-                    flat_items = []
-                    for li in result.line_items:
-                        price_val = None
-                        if li.total_price and li.total_price.amount:
-                            try:
-                                price_val = float(li.total_price.amount)
-                            except (ValueError, TypeError):
-                                pass
-                        elif li.unit_price and li.unit_price.amount:
-                            try:
-                                price_val = float(li.unit_price.amount)
-                            except (ValueError, TypeError):
-                                pass
-
-                        flat_items.append(ExtractedItem(
-                            name=li.parsed_name or li.raw_text,
-                            quantity=li.quantity or 1.0,
-                            unit=li.unit,
-                            price=price_val,
-                            confidence=li.confidence,
-                        ))
-
-                    total_val = None
-                    if result.total and result.total.amount:
-                        try:
-                            total_val = float(result.total.amount)
-                        except (ValueError, TypeError):
-                            pass
-
-                    merchant_val = result.merchant.name if result.merchant else None
-                    date_val = result.date.value if result.date else None
-
-                    response_payload = ExtractionResponsePayload(
-                        items=flat_items,
-                        total=total_val,
-                        merchant=merchant_val,
-                        date=date_val,
-                    )
+                    response_payload = ExtractionResponsePayload(**flatten_extraction_result(result))
 
                     model_id = "tesseract-ocr"
                     try:
@@ -609,8 +643,7 @@ async def extract_receipt_endpoint(request: BaseRequest, db: Session = Depends(g
         latency_ms = (time.time() - start_time) * 1000
 
         # Store artifact
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -632,8 +665,7 @@ async def extract_receipt_endpoint(request: BaseRequest, db: Session = Depends(g
         latency_ms = (time.time() - start_time) * 1000
         logger.error(f"Error extracting receipt {request.request_id}: {str(e)}")
 
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
@@ -769,9 +801,50 @@ async def generate_embeddings_batch(request: EmbedBatchRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _solver_timeout_ms(solver: str) -> int:
+    """Time limit per solver mode: the heuristic is interactive, Z3 is not."""
+    return 50 if solver == "heuristic" else 5000
+
+
+def _meal_plan_response_payload(result: dict) -> dict:
+    """Flatten an optimizer result into the meal plan response payload."""
+    if "solution" in result:
+        return {
+            "status": result["status"],
+            "solve_time_ms": result.get("solve_time_ms", 0),
+            "objective_value": result.get("objective_value"),
+            "objective_bound": result.get("objective_bound"),
+            "cached": result.get("cached", False),
+            "portfolio": result.get("portfolio"),
+            **result["solution"],
+        }
+    return {
+        "status": result.get("status", "no_solution"),
+        "solve_time_ms": result.get("solve_time_ms", 0),
+        "objective_value": None,
+        "objective_bound": None,
+        "cached": False,
+        "portfolio": result.get("portfolio"),
+        "meal_plan": [],
+        "shopping_list": [],
+        "metrics": {},
+        "explanation": [],
+    }
+
+
 @app.post("/api/v1/optimize/meal-plan", response_model=BaseResponse)
-async def optimize_meal_plan_endpoint(request: BaseRequest, db: Session = Depends(get_db)):
-    """Generate an optimized meal plan using Z3 SMT solver."""
+async def optimize_meal_plan_endpoint(request: BaseRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Generate an optimized meal plan.
+
+    solver="z3" (default) waits, on the solver pool, until the SMT solver proves
+    optimality or times out.
+    solver="heuristic" returns a feasible greedy/local-search plan in milliseconds;
+    with refine=true a background Z3 job keeps improving it and publishes the
+    result via the jobs API (see refinement_job_id).
+    solver="portfolio" races several Z3 encodings/seeds and the heuristic in
+    parallel processes and returns the first optimal (or best) answer.
+    """
     start_time = time.time()
     try:
         payload = MealOptimizationRequestPayload(**request.payload)
@@ -784,34 +857,43 @@ async def optimize_meal_plan_endpoint(request: BaseRequest, db: Session = Depend
             "weights": payload.weights.model_dump(),
         }
 
-        result = optimize_meal_plan(problem, timeout_ms=5000)
+        solve = functools.partial(
+            optimize_meal_plan, problem, timeout_ms=_solver_timeout_ms(payload.solver), solver=payload.solver
+        )
+        if payload.solver == "heuristic":
+            # Milliseconds; not worth a solver pool slot
+            result = solve()
+        else:
+            # Z3 and portfolio solves block for up to their timeout
+            result = await asyncio.get_running_loop().run_in_executor(_solver_pool, solve)
         latency_ms = (time.time() - start_time) * 1000
 
-        if result.get("status") == "optimal":
-            response_payload = {
-                "status": result["status"],
-                "solve_time_ms": result.get("solve_time_ms", 0),
-                **result.get("solution", {}),
-            }
-        else:
-            response_payload = {
-                "status": result.get("status", "no_solution"),
-                "solve_time_ms": result.get("solve_time_ms", 0),
-                "meal_plan": [],
-                "shopping_list": [],
-                "metrics": {},
-                "explanation": [],
-            }
+        response_payload = _meal_plan_response_payload(result)
+
+        if payload.solver == "heuristic" and payload.refine and "solution" in result:
+            job, _ = await submit_job_async(
+                db,
+                tenant_id=request.tenant_id,
+                user_id=request.user_id or "system",
+                feature="meal_optimization",
+                input_payload={
+                    "problem": problem,
+                    "timeout_ms": 5000,
+                    "baseline_objective": result.get("objective_value"),
+                },
+                model_id="z3",
+            )
+            response_payload["refinement_job_id"] = job.id
 
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
             feature="meal_optimization",
-            status="success" if result.get("status") == "optimal" else "no_solution",
-            input_data=request.payload,
-            output_data=response_payload,
+            status="success" if "solution" in result else "no_solution",
+            input_payload=request.payload,
+            output_payload=response_payload,
+            model_id=payload.solver,
             latency_ms=latency_ms,
         )
 
@@ -823,15 +905,13 @@ async def optimize_meal_plan_endpoint(request: BaseRequest, db: Session = Depend
     except Exception as e:
         logger.error(f"Meal optimization error: {e}")
         latency_ms = (time.time() - start_time) * 1000
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
             feature="meal_optimization",
             status="error",
-            input_data=request.payload,
-            output_data={},
+            input_payload=request.payload,
             latency_ms=latency_ms,
             error_message=str(e),
         )
@@ -843,35 +923,146 @@ async def optimize_meal_plan_endpoint(request: BaseRequest, db: Session = Depend
         )
 
 
+@app.post("/api/v1/optimize/meal-plan/batch")
+async def optimize_meal_plan_batch_endpoint(request: BaseRequest):
+    """
+    Generate meal plans for many households in one request.
+
+    Problems are solved on the shared solver pool with at most max_concurrency
+    in flight, and results are streamed back as NDJSON, one line per household
+    in completion order. Problems using the same recipe library (by content
+    hash) share one RecipeLibrary, so recipe preprocessing runs once per library.
+    Requests with more than MEAL_PLAN_BATCH_MAX_PROBLEMS problems are rejected
+    with 422 before any is parsed or queued.
+    """
+    start_time = time.time()
+    problems = request.payload.get("problems")
+    if isinstance(problems, list) and len(problems) > settings.MEAL_PLAN_BATCH_MAX_PROBLEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.MEAL_PLAN_BATCH_MAX_PROBLEMS} problems per batch, got {len(problems)}",
+        )
+    try:
+        payload = BatchMealOptimizationRequestPayload(**request.payload)
+    except Exception as e:
+        logger.error(f"Batch meal optimization error: {e}")
+        return BaseResponse(
+            request_id=request.request_id,
+            status="error",
+            error=str(e),
+            payload={},
+        )
+
+    shared_recipes = [recipe.model_dump() for recipe in payload.recipes]
+    libraries: dict[str, RecipeLibrary] = {}
+    work = []
+    for item in payload.problems:
+        recipes = [recipe.model_dump() for recipe in item.recipes] or shared_recipes
+        library_key = recipe_library_hash(recipes)
+        if library_key not in libraries:
+            libraries[library_key] = RecipeLibrary(recipes)
+
+        problem = {
+            "planning_horizon": item.planning_horizon.model_dump(),
+            "inventory": [inv.model_dump() for inv in item.inventory],
+            "recipes": recipes,
+            "constraints": item.constraints.model_dump(),
+            "weights": item.weights.model_dump(),
+        }
+        work.append((item.household_id, item.solver, problem, libraries[library_key]))
+
+    async def solve(semaphore, household_id, solver, problem, library) -> dict:
+        async with semaphore:
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    _solver_pool,
+                    functools.partial(
+                        optimize_meal_plan,
+                        problem,
+                        timeout_ms=_solver_timeout_ms(solver),
+                        solver=solver,
+                        library=library,
+                    ),
+                )
+                return {
+                    "household_id": household_id,
+                    "status": "success",
+                    "payload": _meal_plan_response_payload(result),
+                }
+            except Exception as e:
+                logger.error(f"Batch meal optimization failed for {household_id}: {e}")
+                return {"household_id": household_id, "status": "error", "payload": {}, "error": str(e)}
+
+    async def stream_results():
+        semaphore = asyncio.Semaphore(payload.max_concurrency)
+        tasks = [asyncio.create_task(solve(semaphore, *args)) for args in work]
+        statuses = {}
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                line = await next_result
+                statuses[line["household_id"]] = line["payload"].get("status", line["status"])
+                yield json.dumps(line) + "\n"
+        finally:
+            # Stop queued solves if the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
+
+        latency_ms = (time.time() - start_time) * 1000
+        await record_artifact(
+            request_id=request.request_id,
+            tenant_id=request.tenant_id,
+            user_id=request.user_id,
+            feature="meal_optimization_batch",
+            input_payload=request.payload,
+            output_payload={"statuses": statuses, "recipe_libraries": len(libraries)},
+            latency_ms=latency_ms,
+        )
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 @app.post("/api/v1/optimize/suggestions", response_model=BaseResponse)
-async def optimize_suggestions_endpoint(request: BaseRequest, db: Session = Depends(get_db)):
-    """Get quick recipe suggestions based on inventory and preferences."""
+async def optimize_suggestions_endpoint(request: BaseRequest):
+    """
+    Get quick recipe suggestions based on inventory and preferences.
+
+    The response carries recipe_library_hash; later requests may send it (with
+    or instead of the recipes) to score against the cached recipe matrix
+    without hashing the library again.
+    """
     start_time = time.time()
     try:
         payload = QuickSuggestionRequestPayload(**request.payload)
 
         inventory = [item.model_dump() for item in payload.inventory]
-        recipes = [recipe.model_dump() for recipe in payload.recipes]
+
+        if payload.recipes:
+            recipes = [recipe.model_dump() for recipe in payload.recipes]
+            matrix = get_recipe_matrix(recipes, payload.recipe_library_hash)
+        else:
+            matrix = lookup_recipe_matrix(payload.recipe_library_hash or "")
+            if matrix is None:
+                raise ValueError("Unknown recipe_library_hash; resend recipes")
 
         suggestions = quick_suggestions(
             inventory=inventory,
-            recipes=recipes,
+            recipes=matrix.recipes,
             mode=payload.mode,
             limit=payload.limit,
+            matrix=matrix,
         )
 
         latency_ms = (time.time() - start_time) * 1000
-        response_payload = {"suggestions": suggestions}
+        response_payload = {"suggestions": suggestions, "recipe_library_hash": matrix.key}
 
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
             feature="meal_suggestions",
             status="success",
-            input_data=request.payload,
-            output_data=response_payload,
+            input_payload=request.payload,
+            output_payload=response_payload,
             latency_ms=latency_ms,
         )
 
@@ -883,15 +1074,13 @@ async def optimize_suggestions_endpoint(request: BaseRequest, db: Session = Depe
     except Exception as e:
         logger.error(f"Meal suggestion error: {e}")
         latency_ms = (time.time() - start_time) * 1000
-        create_artifact(
-            db=db,
+        await record_artifact(
             request_id=request.request_id,
             tenant_id=request.tenant_id,
             user_id=request.user_id,
             feature="meal_suggestions",
             status="error",
-            input_data=request.payload,
-            output_data={},
+            input_payload=request.payload,
             latency_ms=latency_ms,
             error_message=str(e),
         )
@@ -985,28 +1174,99 @@ async def extract_receipt_ocr(request: ReceiptExtractRequest):
 # Job Management Endpoints
 # =============================================================================
 
+async def _check_webhook_urls(urls: list[Optional[str]]) -> None:
+    """Reject webhook URLs the service may not call (422)."""
+    for url in {url for url in urls if url}:
+        try:
+            await asyncio.to_thread(validate_webhook_url, url)
+        except WebhookURLError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+
 @app.post("/api/v1/jobs", response_model=JobStatusResponse)
-async def submit_async_job(request: JobSubmitRequest, db: Session = Depends(get_db)):
+async def submit_async_job(
+    request: JobSubmitRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=128),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
     Submit a job for background processing.
 
-    Returns immediately with a job ID that can be polled for status.
+    Returns immediately with a job ID. Follow progress via the events (SSE)
+    or wait (long-poll) endpoints, or pass webhook_url to be notified when it
+finishes (webhook hosts must be public or allowlisted).
+    Identical submissions (or a reused idempotency key, in the body or the
+    Idempotency-Key header) return the existing job with deduplicated=true.
     """
-    job = submit_job(
-        db=db,
-        tenant_id=request.tenant_id,
-        user_id=request.user_id,
-        feature=request.feature,
-        input_payload=request.payload,
-        model_id=request.model_id,
-        model_version=request.model_version,
-    )
+    await _check_webhook_urls([request.webhook_url])
+    try:
+        job, created = await submit_job_async(
+            db,
+            tenant_id=request.tenant_id,
+            user_id=request.user_id,
+            feature=request.feature,
+            input_payload=request.payload,
+            model_id=request.model_id,
+            model_version=request.model_version,
+            priority=request.priority,
+            webhook_url=request.webhook_url,
+            idempotency_key=request.idempotency_key or idempotency_key,
+            dedupe=request.dedupe,
+            deadline_seconds=request.deadline_seconds,
+        )
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
     return JobStatusResponse(
         job_id=job.id,
         status=job.status.value,
         feature=job.feature,
         created_at=job.created_at.isoformat(),
+        deduplicated=not created,
+    )
+
+
+@app.post("/api/v1/jobs/bulk", response_model=BulkJobSubmitResponse)
+async def submit_bulk_jobs(request: BulkJobSubmitRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Submit many jobs for background processing in one transaction.
+
+    Returns compact status records in request order.
+    """
+    await _check_webhook_urls([job.webhook_url for job in request.jobs])
+    rows = await submit_jobs_async(
+        db,
+        tenant_id=request.tenant_id,
+        user_id=request.user_id,
+        jobs=[job.model_dump() for job in request.jobs],
+    )
+
+    return BulkJobSubmitResponse(
+        jobs=[
+            JobStatusSummary(
+                job_id=row["id"],
+                feature=row["feature"],
+                status=row["status"].value,
+                priority=row["priority"],
+                attempts=row["attempts"],
+                created_at=row["created_at"].isoformat(),
+            )
+            for row in rows
+        ],
+    )
+
+
+@app.post("/api/v1/jobs/status", response_model=BulkJobStatusResponse)
+async def get_bulk_job_status(request: BulkJobStatusRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Get compact status records for many jobs (payloads are not returned).
+    """
+    statuses = await get_job_statuses_async(db, request.tenant_id, request.job_ids)
+    found = {status["job_id"] for status in statuses}
+
+    return BulkJobStatusResponse(
+        jobs=statuses,
+        missing=[job_id for job_id in request.job_ids if job_id not in found],
     )
 
 
@@ -1014,20 +1274,198 @@ async def submit_async_job(request: JobSubmitRequest, db: Session = Depends(get_
 async def get_job_status(
     job_id: str,
     tenant_id: str = Query(..., description="Tenant ID for access control"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get the status of a background job.
 
     Returns full job details including output if completed.
     """
-    job = get_job(db, job_id, tenant_id)
+    job = await get_job_async(db, job_id, tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JobStatusResponse(**job_to_dict(job))
+
+
+@app.get("/api/v1/jobs/{job_id}/output")
+async def get_job_output_payload(
+    job_id: str,
+    request: Request,
+    tenant_id: str = Query(..., description="Tenant ID for access control"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a job's output JSON, including outputs offloaded to the blob store.
+
+    Offloaded outputs are streamed from disk; gzip blobs are sent as-is with
+    Content-Encoding: gzip when the client accepts it.
+    """
+    job = await get_job_async(db, job_id, tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if not job.output_ref:
+        if job.output_payload is None:
+            raise HTTPException(status_code=404, detail="Job has no output")
+        return Response(content=job.output_payload, media_type="application/json")
+
+    if not os.path.exists(blob_path(job.output_ref)):
+        logger.error(f"Output blob {job.output_ref} of job {job_id} is missing")
+        raise HTTPException(status_code=404, detail="Job output not found")
+
+    if blob_codec(job.output_ref) == "gzip" and "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(
+            blob_path(job.output_ref),
+            media_type="application/json",
+            headers={"Content-Encoding": "gzip"},
+        )
+    return StreamingResponse(iter_blob(job.output_ref), media_type="application/json")
+
+
+@app.delete("/api/v1/jobs/{job_id}", response_model=JobStatusResponse)
+async def cancel_async_job(
+    job_id: str,
+    tenant_id: str = Query(..., description="Tenant ID for access control"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Cancel a queued or running job.
+
+    Queued jobs are never run; running handlers are interrupted and their
+    result discarded. Returns 409 if the job already finished.
+    """
+    job = await get_job_async(db, job_id, tenant_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
 
+    if not await cancel_job_async(db, job):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status.value}")
+
     return JobStatusResponse(**job_to_dict(job))
 
 
+async def _read_job_event(job_id: str, tenant_id: str) -> Optional[dict]:
+    """Current status event for a job, read with a short-lived session."""
+    async with get_async_session_local()() as db:
+        job = await get_job_async(db, job_id, tenant_id)
+        return status_event(job) if job else None
+
+
+async def _job_event_stream(job_id: str, tenant_id: str, timeout: float):
+    """
+    Yield the job's current status event, then each change until it finishes.
+
+    Yields None on idle ticks (every JOB_EVENTS_RECHECK_INTERVAL seconds, when
+    the status is also re-read to catch changes made by other processes).
+    Stops when the job finishes, disappears or the timeout elapses.
+    """
+    queue = job_events.subscribe(job_id)
+    try:
+        last = await _read_job_event(job_id, tenant_id)
+        if last is None:
+            return
+        yield last
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while last["status"] not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), timeout=min(remaining, settings.JOB_EVENTS_RECHECK_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                event = await _read_job_event(job_id, tenant_id)
+                if event is None:
+                    return
+            if event == last:
+                yield None
+                continue
+            last = event
+            yield event
+    finally:
+        job_events.unsubscribe(job_id, queue)
+
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    tenant_id: str = Query(..., description="Tenant ID for access control"),
+    timeout: float = Query(300, gt=0, le=3600, description="Maximum stream duration in seconds"),
+):
+    """
+    Server-Sent Events stream of job status changes.
+
+    Sends the current status immediately, then one `status` event per change,
+    and closes once the job succeeds, fails or is cancelled.
+    """
+    if await _read_job_event(job_id, tenant_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for event in _job_event_stream(job_id, tenant_id, timeout):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: status\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/v1/jobs/{job_id}/wait", response_model=JobStatusResponse)
+async def wait_for_job(
+    job_id: str,
+    tenant_id: str = Query(..., description="Tenant ID for access control"),
+    status: Optional[str] = Query(None, description="Return once the job leaves this status (default: once it finishes)"),
+    timeout: float = Query(30, gt=0, le=120, description="Maximum wait in seconds"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Long-poll for a job status change.
+
+    Holds the request until the job leaves `status` (or finishes, if no status
+    is given) or the timeout elapses, then returns the full job details.
+    """
+    async for event in _job_event_stream(job_id, tenant_id, timeout):
+        if event is None:
+            continue
+        if event["status"] in TERMINAL_STATUSES or (status and event["status"] != status):
+            break
+
+    job = await get_job_async(db, job_id, tenant_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return JobStatusResponse(**job_to_dict(job))
+
+
+def _list_fields(view: str, fields: Optional[str], summary_fields: tuple[str, ...]) -> Optional[tuple[str, ...]]:
+    """Columns for a list projection, or None for full records."""
+    if fields:
+        return tuple(name.strip() for name in fields.split(",") if name.strip())
+    return summary_fields if view == "summary" else None
+
+
+def _with_key_fields(projection: tuple[str, ...]) -> tuple[str, ...]:
+    """Projection plus the fields needed for next_cursor."""
+    return projection + tuple(name for name in KEY_FIELDS if name not in projection)
+
+
+def _paged(records: list[dict], limit: int, projection: Optional[tuple[str, ...]]) -> tuple[list[dict], Optional[str]]:
+    """Records restricted to the requested projection, and the cursor for the next page."""
+    cursor = next_cursor(records, limit)
+    if projection is not None and len(projection) < len(_with_key_fields(projection)):
+        records = [{name: record[name] for name in projection} for record in records]
+    return records, cursor
+
+
 @app.get("/api/v1/jobs", response_model=JobListResponse)
 async def list_tenant_jobs(
     tenant_id: str = Query(..., description="Tenant ID for access control"),
@@ -1035,21 +1473,44 @@ async def list_tenant_jobs(
     status: Optional[str] = Query(None, description="Filter by status"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    count: bool = Query(False, description="Include approximate_total"),
+    view: str = Query("full", pattern="^(full|summary)$", description="full records, or summary columns without payloads"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (no payloads)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    List jobs for a tenant.
+    List jobs for a tenant, newest first.
 
-    Supports filtering by feature and status with pagination.
+    Supports filtering by feature and status. Page with cursor=next_cursor
+    (every page costs the same; offset gets slower the deeper it goes).
+    With view=summary or fields, only those columns are selected and
+    payloads are not read; use the job detail endpoint for payloads.
     """
     status_enum = JobStatus(status) if status else None
-    jobs = list_jobs(db, tenant_id, feature=feature, status=status_enum, limit=limit, offset=offset)
+    projection = _list_fields(view, fields, JOB_SUMMARY_FIELDS)
+    try:
+        if projection is not None:
+            records = await list_job_summaries_async(
+                db, tenant_id, _with_key_fields(projection), feature=feature, status=status_enum,
+                limit=limit, offset=offset, cursor=cursor,
+            )
+        else:
+            jobs = await list_jobs_async(
+                db, tenant_id, feature=feature, status=status_enum, limit=limit, offset=offset, cursor=cursor
+            )
+            records = [job_to_dict(job) for job in jobs]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    records, page_cursor = _paged(records, limit, projection)
 
     return JobListResponse(
-        jobs=[job_to_dict(job) for job in jobs],
-        total=len(jobs),
+        jobs=records,
+        total=len(records),
         limit=limit,
         offset=offset,
+        next_cursor=page_cursor,
+        approximate_total=await count_jobs_async(db, tenant_id, feature, status_enum) if count else None,
     )
 
 
@@ -1061,18 +1522,25 @@ async def list_tenant_jobs(
 async def get_artifact_details(
     artifact_id: str,
     tenant_id: str = Query(..., description="Tenant ID for access control"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get details of an AI artifact.
 
-    Returns full artifact including input/output payloads.
+    Returns full artifact including input/output payloads, with payload
+    blobs (e.g. receipt images) filled in, read back from the artifact
+    archive for compacted artifacts.
     """
-    artifact = get_artifact(db, artifact_id, tenant_id)
+    artifact = await get_artifact_async(db, artifact_id, tenant_id)
     if not artifact:
         raise HTTPException(status_code=404, detail="Artifact not found")
 
-    return ArtifactResponse(**artifact_to_dict(artifact))
+    record = artifact_to_dict(artifact)
+    if artifact.blob_hashes:
+        record = restore_blobs(record, await load_blobs_async(db, blob_hashes(artifact.blob_hashes)))
+    if artifact.archive_ref:
+        record = await asyncio.to_thread(restore_archived_payloads, record, artifact.archive_ref)
+    return ArtifactResponse(**record)
 
 
 @app.get("/api/v1/artifacts", response_model=ArtifactListResponse)
@@ -1080,22 +1548,53 @@ async def list_tenant_artifacts(
     tenant_id: str = Query(..., description="Tenant ID for access control"),
     feature: Optional[str] = Query(None, description="Filter by feature"),
     status: Optional[str] = Query(None, description="Filter by status"),
+    input_hash: Optional[str] = Query(None, description="Filter by input hash (calls with the same input)"),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    count: bool = Query(False, description="Include approximate_total"),
+    view: str = Query("full", pattern="^(full|summary)$", description="full records, or summary columns without payloads"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return (no payloads)"),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    List artifacts for a tenant.
-
-    Supports filtering by feature and status with pagination.
+    List artifacts for a tenant, newest first.
+
+    Supports filtering by feature, status and input hash (every call records
+    its input hash, including those whose payloads the capture policy did
+    not store). Page with cursor=next_cursor
+    (every page costs the same; offset gets slower the deeper it goes).
+    Long payload strings such as receipt images are listed as
+    {"$blob": "<sha256>"} references; the detail endpoint fills them in.
+    With view=summary or fields, only those columns are selected and
+    payloads are not read; use the artifact detail endpoint for payloads.
     """
-    artifacts = list_artifacts(db, tenant_id, feature=feature, status=status, limit=limit, offset=offset)
+    projection = _list_fields(view, fields, ARTIFACT_SUMMARY_FIELDS)
+    try:
+        if projection is not None:
+            records = await list_artifact_summaries_async(
+                db, tenant_id, _with_key_fields(projection), feature=feature, status=status,
+                limit=limit, offset=offset, cursor=cursor, input_hash=input_hash,
+            )
+        else:
+            artifacts = await list_artifacts_async(
+                db, tenant_id, feature=feature, status=status, limit=limit, offset=offset, cursor=cursor,
+                input_hash=input_hash,
+            )
+            records = [artifact_to_dict(a) for a in artifacts]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    records, page_cursor = _paged(records, limit, projection)
 
     return ArtifactListResponse(
-        artifacts=[artifact_to_dict(a) for a in artifacts],
-        total=len(artifacts),
+        artifacts=records,
+        total=len(records),
         limit=limit,
         offset=offset,
+        next_cursor=page_cursor,
+        approximate_total=(
+            await count_artifacts_async(db, tenant_id, feature, status, input_hash=input_hash) if count else None
+        ),
     )
 
 
@@ -1104,14 +1603,14 @@ async def list_tenant_artifacts(
 # =============================================================================
 
 @app.post("/api/v1/feedback", response_model=FeedbackResponse)
-async def submit_feedback(request: FeedbackRequest, db: Session = Depends(get_db)):
+async def submit_feedback(request: FeedbackRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Submit feedback for an AI operation.
 
     Accepts thumbs up/down ratings with optional notes.
     """
-    feedback = add_feedback(
-        db=db,
+    feedback = await add_feedback_async(
+        db,
         tenant_id=request.tenant_id,
         user_id=request.user_id,
         rating=request.rating,
@@ -1127,9 +1626,15 @@ async def submit_feedback(request: FeedbackRequest, db: Session = Depends(get_db
 # Register Job Handlers
 # =============================================================================
 
-@register_job_handler("receipt_extraction")
+@register_job_handler("receipt_extraction", concurrency=settings.OCR_PROCESS_WORKERS)
 async def handle_receipt_extraction(input_payload: dict) -> dict:
-    """Background handler for receipt extraction jobs."""
+    """
+    Background handler for receipt extraction jobs.
+
+    Uses vLLM when USE_VLLM_OCR=true; otherwise Tesseract (image_base64, or
+    image_path inside RECEIPT_UPLOAD_DIR) in the OCR process pool, one
+    receipt per pool process.
+    """
     if settings.USE_VLLM_OCR:
         from ocr_service import extract_receipt
 
@@ -1138,6 +1643,11 @@ async def handle_receipt_extraction(input_payload: dict) -> dict:
             raise ValueError("image_base64 required in payload")
 
         return await extract_receipt(image_b64)
+    elif settings.USE_TESSERACT_OCR and _tesseract_process_receipt is not None:
+        return await extract_receipt_in_pool(
+            image_base64=input_payload.get("image_base64"),
+            image_path=input_payload.get("image_path"),
+        )
     else:
         # MOCK IMPLEMENTATION for development
         return {
@@ -1152,11 +1662,57 @@ async def handle_receipt_extraction(input_payload: dict) -> dict:
 
 
 @register_job_handler("embedding_batch")
-async def handle_embedding_batch(input_payload: dict) -> dict:
-    """Background handler for batch embedding jobs."""
+async def handle_embedding_batch(input_payload: dict, context: JobContext) -> dict:
+    """
+    Background handler for batch embedding jobs.
+
+    Texts are encoded in chunks of chunk_size (default EMBEDDING_JOB_CHUNK_SIZE).
+    Each chunk's vectors are saved with the job's progress, so a job resumed
+    after a crash or restart only encodes the remaining chunks.
+    """
     texts = input_payload.get("texts", [])
-    # MOCK IMPLEMENTATION
+    chunk_size = int(input_payload.get("chunk_size") or settings.EMBEDDING_JOB_CHUNK_SIZE)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+
+    chunk_count = math.ceil(len(texts) / chunk_size)
+    resumed_chunks = len(context.chunks)
+    model = None
+    for index in range(chunk_count):
+        if index in context.chunks:
+            continue
+        if model is None:
+            model = await asyncio.to_thread(get_embedding_model)
+        batch = texts[index * chunk_size:(index + 1) * chunk_size]
+        vectors = await asyncio.to_thread(model.encode, batch, normalize_embeddings=True)
+        await context.asave_chunk(index, {"vectors": vectors.tolist()}, progress=100 * (index + 1) / chunk_count)
+
+    vectors = [vector for index in range(chunk_count) for vector in context.chunks[index]["vectors"]]
     return {
-        "vectors": [[0.1] * 384 for _ in texts],
-        "count": len(texts)
+        "vectors": vectors,
+        "count": len(vectors),
+        "dimension": len(vectors[0]) if vectors else 0,
+        "model": get_embedding_model_name(),
+        "resumed_chunks": resumed_chunks,
     }
+
+
+@register_job_handler("meal_optimization")
+async def handle_meal_optimization(input_payload: dict) -> dict:
+    """Background handler for Z3 meal plan optimization (e.g. heuristic refinement)."""
+    problem = input_payload.get("problem")
+    if not problem:
+        raise ValueError("problem required in payload")
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        _solver_pool, optimize_meal_plan, problem, input_payload.get("timeout_ms", 5000)
+    )
+
+    response_payload = _meal_plan_response_payload(result)
+    baseline = input_payload.get("baseline_objective")
+    objective = response_payload.get("objective_value")
+    response_payload["improved"] = (
+        objective is not None and (baseline is None or objective > baseline)
+    )
+    return response_payload
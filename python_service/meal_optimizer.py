@@ -1,12 +1,112 @@
 """Meal plan optimization using Z3 SMT solver."""
 import logging
+import multiprocessing
+import os
+import queue
+import threading
 import time
-from typing import Any
+from collections import OrderedDict
+from datetime import date as dt_date, timedelta
+from typing import Any, Optional
 
-from z3 import Bool, If, Int, Optimize, Or, Sum, sat
+import numpy as np
+from z3 import AtMost, Bool, If, Int, Optimize, Or, Sum, sat
+
+from config import settings
+from solution_cache import meal_plan_cache, problem_hash, recipe_library_hash
 
 logger = logging.getLogger("grocery-planner-ai.meal_optimizer")
 
+# Solver configurations raced by solve_portfolio, cheapest first so that
+# CPU-limited hosts still run the heuristic and the default Z3 encoding.
+PORTFOLIO_CONFIGS: list[dict[str, Any]] = [
+    {"name": "heuristic", "solver": "heuristic"},
+    {"name": "z3_arith", "solver": "z3", "encoding": "arith"},
+    {"name": "z3_pb", "solver": "z3", "encoding": "pb"},
+    {"name": "z3_pb_seed7", "solver": "z3", "encoding": "pb", "random_seed": 7},
+    {"name": "z3_arith_seed7", "solver": "z3", "encoding": "arith", "random_seed": 7},
+]
+
+# Extra wall-clock allowance for spawning portfolio worker processes
+PORTFOLIO_STARTUP_GRACE_MS = 1000
+
+
+def _day_index(start_date: str, date_str: str) -> Optional[int]:
+    """Return the 0-based day offset of date_str from start_date, or None."""
+    if not start_date or not date_str:
+        return None
+    try:
+        return (dt_date.fromisoformat(date_str) - dt_date.fromisoformat(start_date)).days
+    except (ValueError, TypeError):
+        return None
+
+
+def _objective_weights(problem: dict[str, Any]) -> tuple[int, int, int]:
+    """Integer-scaled (expiring, shopping, variety) objective weights."""
+    weights = problem.get("weights", {})
+    return (
+        int(weights.get("expiring_priority", 0.4) * 100),
+        int(weights.get("shopping_minimization", 0.3) * 100),
+        int(weights.get("variety", 0.2) * 100),
+    )
+
+
+def _inventory_totals(inventory: list[dict]) -> dict[str, float]:
+    """Total available quantity per ingredient."""
+    inv_map: dict[str, float] = {}
+    for item in inventory:
+        iid = item["ingredient_id"]
+        inv_map[iid] = inv_map.get(iid, 0) + item.get("quantity", 0)
+    return inv_map
+
+
+def _expiry_scores(inventory: list[dict]) -> dict[str, int]:
+    """Integer urgency score per ingredient: higher for sooner expiry."""
+    expiry_map: dict[str, int] = {}
+    for item in inventory:
+        iid = item["ingredient_id"]
+        dte = item.get("days_until_expiry")
+        if dte is not None and dte > 0:
+            score = max(1, int(100 / dte))
+            expiry_map[iid] = max(expiry_map.get(iid, 0), score)
+    return expiry_map
+
+
+class RecipeLibrary:
+    """Inventory-independent preprocessing of a recipe list.
+
+    Built once per recipe library and shared by every problem planned from it
+    (e.g. all households of a tenant in a batch run), so per-recipe usage,
+    timing and the ingredient -> recipe index are not rebuilt per problem.
+    """
+
+    def __init__(self, recipes: list[dict]):
+        self.recipes = recipes
+        self.recipe_map = {r["id"]: r for r in recipes}
+        self.ingredient_ids: dict[str, list[str]] = {}   # recipe_id -> ingredient ids
+        self.usage: dict[str, dict[str, int]] = {}       # recipe_id -> ingredient_id -> qty
+        self.consumers: dict[str, dict[str, int]] = {}   # ingredient_id -> recipe_id -> qty
+        self.total_time: dict[str, int] = {}             # recipe_id -> prep + cook minutes
+        self.ingredient_names: dict[str, str] = {}
+
+        for recipe in recipes:
+            rid = recipe["id"]
+            self.total_time[rid] = recipe.get("prep_time", 0) + recipe.get("cook_time", 0)
+            ingredient_ids = self.ingredient_ids.setdefault(rid, [])
+            usage = self.usage.setdefault(rid, {})
+            for ing in recipe.get("ingredients", []):
+                iid = ing["ingredient_id"]
+                qty = int(ing.get("quantity", 1))
+                ingredient_ids.append(iid)
+                usage[iid] = usage.get(iid, 0) + qty
+                consumers = self.consumers.setdefault(iid, {})
+                consumers[rid] = consumers.get(rid, 0) + qty
+                self.ingredient_names.setdefault(iid, ing.get("name", "Unknown"))
+
+    def expiry_score(self, rid: str, expiry_map: dict[str, int]) -> int:
+        """Sum of ingredient expiry scores for a recipe."""
+        return sum(expiry_map.get(iid, 0) for iid in self.ingredient_ids[rid])
+
 
 class MealPlanOptimizer:
     """Z3-based meal plan optimizer.
@@ -26,18 +126,34 @@ class MealPlanOptimizer:
 
     Objective (maximize):
     w1 * expiring_score - w2 * shopping_penalty + w3 * variety_bonus
+
+    Encodings:
+    - "arith": cardinality constraints as Sum(If(b, 1, 0)) <= 1
+    - "pb": cardinality constraints as pseudo-boolean AtMost(..., 1)
     """
 
-    def __init__(self, problem: dict[str, Any]):
+    def __init__(
+        self,
+        problem: dict[str, Any],
+        encoding: str = "arith",
+        random_seed: Optional[int] = None,
+        library: Optional[RecipeLibrary] = None,
+    ):
+        if encoding not in ("arith", "pb"):
+            raise ValueError(f"Unknown encoding: {encoding}")
         self.problem = problem
+        self.library = library or RecipeLibrary(problem.get("recipes", []))
+        self.encoding = encoding
+        self.random_seed = random_seed
         self.optimizer = Optimize()
         self.recipe_vars: dict[str, Any] = {}      # recipe_id -> Bool
         self.assign_vars: dict[tuple[str, int], Any] = {}  # (recipe_id, day) -> Bool
         self.buy_vars: dict[str, Any] = {}          # ingredient_id -> Int
+        self.objective = None
 
     def build_model(self) -> None:
         """Build the Z3 optimization model from the problem definition."""
-        recipes = self.problem.get("recipes", [])
+        recipes = self.library.recipes
         days = self.problem.get("planning_horizon", {}).get("days", 7)
 
         # Create decision variables
@@ -48,14 +164,9 @@ class MealPlanOptimizer:
                 self.assign_vars[(rid, day)] = Bool(f"assign_{rid[:8]}_d{day}")
 
         # Create buy variables for each unique ingredient
-        ingredient_ids = set()
-        for recipe in recipes:
-            for ing in recipe.get("ingredients", []):
-                iid = ing["ingredient_id"]
-                if iid not in ingredient_ids:
-                    ingredient_ids.add(iid)
-                    self.buy_vars[iid] = Int(f"buy_{iid[:8]}")
-                    self.optimizer.add(self.buy_vars[iid] >= 0)
+        for iid in self.library.consumers:
+            self.buy_vars[iid] = Int(f"buy_{iid[:8]}")
+            self.optimizer.add(self.buy_vars[iid] >= 0)
 
         self._add_selection_constraints(recipes, days)
         self._add_one_per_slot_constraints(days)
@@ -72,18 +183,24 @@ class MealPlanOptimizer:
             assigned_any = Or([self.assign_vars[(rid, d)] for d in range(days)])
             self.optimizer.add(self.recipe_vars[rid] == assigned_any)
 
+    def _add_at_most_one(self, bool_vars: list) -> None:
+        """Constrain at most one of bool_vars to be true, per the encoding."""
+        if self.encoding == "pb":
+            if len(bool_vars) > 1:
+                self.optimizer.add(AtMost(*bool_vars, 1))
+        else:
+            # Sum of booleans <= 1
+            self.optimizer.add(Sum([If(v, 1, 0) for v in bool_vars]) <= 1)
+
     def _add_one_per_slot_constraints(self, days: int) -> None:
         """At most one recipe per day."""
         for day in range(days):
-            day_vars = [self.assign_vars[(rid, day)] for rid in self.recipe_vars]
-            # Sum of booleans <= 1
-            self.optimizer.add(Sum([If(v, 1, 0) for v in day_vars]) <= 1)
+            self._add_at_most_one([self.assign_vars[(rid, day)] for rid in self.recipe_vars])
 
     def _add_no_repetition_constraints(self, days: int) -> None:
         """Each recipe assigned to at most one day."""
         for rid in self.recipe_vars:
-            assigned_days = [self.assign_vars[(rid, d)] for d in range(days)]
-            self.optimizer.add(Sum([If(v, 1, 0) for v in assigned_days]) <= 1)
+            self._add_at_most_one([self.assign_vars[(rid, d)] for d in range(days)])
 
     def _add_locked_meal_constraints(self, recipes: list, days: int) -> None:
         """Preserve locked meals - force assignment."""
@@ -91,19 +208,9 @@ class MealPlanOptimizer:
         start_date = self.problem.get("planning_horizon", {}).get("start_date", "")
 
         for lock in locked:
-            lock_date = lock.get("date", "")
             lock_recipe_id = lock.get("recipe_id", "")
-
-            # Calculate day index from date
-            if start_date and lock_date:
-                try:
-                    from datetime import date as dt_date
-                    start = dt_date.fromisoformat(start_date)
-                    lock_d = dt_date.fromisoformat(lock_date)
-                    day_idx = (lock_d - start).days
-                except (ValueError, TypeError):
-                    continue
-            else:
+            day_idx = _day_index(start_date, lock.get("date", ""))
+            if day_idx is None:
                 continue
 
             if 0 <= day_idx < days and lock_recipe_id in self.recipe_vars:
@@ -124,24 +231,13 @@ class MealPlanOptimizer:
         if not time_budgets or not start_date:
             return
 
-        try:
-            from datetime import date as dt_date
-            start = dt_date.fromisoformat(start_date)
-        except (ValueError, TypeError):
-            return
-
-        recipe_map = {r["id"]: r for r in recipes}
-
         for date_str, budget_minutes in time_budgets.items():
-            try:
-                budget_date = dt_date.fromisoformat(date_str)
-                day_idx = (budget_date - start).days
-            except (ValueError, TypeError):
+            day_idx = _day_index(start_date, date_str)
+            if day_idx is None:
                 continue
 
             if 0 <= day_idx < days:
-                for rid, recipe in recipe_map.items():
-                    total_time = recipe.get("prep_time", 0) + recipe.get("cook_time", 0)
+                for rid, total_time in self.library.total_time.items():
                     if total_time > budget_minutes:
                         # Recipe too slow for this day
                         self.optimizer.add(
@@ -150,21 +246,14 @@ class MealPlanOptimizer:
 
     def _add_inventory_constraints(self, recipes: list) -> None:
         """Ensure used ingredients <= available + buy."""
-        inventory = self.problem.get("inventory", [])
-        inv_map: dict[str, float] = {}
-        for item in inventory:
-            iid = item["ingredient_id"]
-            inv_map[iid] = inv_map.get(iid, 0) + item.get("quantity", 0)
+        inv_map = _inventory_totals(self.problem.get("inventory", []))
 
         # Build usage per ingredient
         for iid in self.buy_vars:
-            usage_terms = []
-            for recipe in recipes:
-                rid = recipe["id"]
-                for ing in recipe.get("ingredients", []):
-                    if ing["ingredient_id"] == iid:
-                        qty = int(ing.get("quantity", 1))
-                        usage_terms.append(If(self.recipe_vars[rid], qty, 0))
+            usage_terms = [
+                If(self.recipe_vars[rid], qty, 0)
+                for rid, qty in self.library.consumers[iid].items()
+            ]
 
             if usage_terms:
                 total_used = Sum(usage_terms)
@@ -173,27 +262,14 @@ class MealPlanOptimizer:
 
     def _add_objective(self, recipes: list, days: int) -> None:
         """Multi-objective: maximize expiring usage - shopping + variety."""
-        weights = self.problem.get("weights", {})
-        w_expiring = int(weights.get("expiring_priority", 0.4) * 100)
-        w_shopping = int(weights.get("shopping_minimization", 0.3) * 100)
-        w_variety = int(weights.get("variety", 0.2) * 100)
+        w_expiring, w_shopping, w_variety = _objective_weights(self.problem)
 
         # Expiring score: sum of (1/days_until_expiry) scaled to int
-        inventory = self.problem.get("inventory", [])
-        expiry_map: dict[str, int] = {}
-        for item in inventory:
-            iid = item["ingredient_id"]
-            dte = item.get("days_until_expiry")
-            if dte is not None and dte > 0:
-                score = max(1, int(100 / dte))  # Higher for sooner expiry
-                expiry_map[iid] = max(expiry_map.get(iid, 0), score)
+        expiry_map = _expiry_scores(self.problem.get("inventory", []))
 
         expiring_terms = []
-        for recipe in recipes:
-            rid = recipe["id"]
-            recipe_expiry = 0
-            for ing in recipe.get("ingredients", []):
-                recipe_expiry += expiry_map.get(ing["ingredient_id"], 0)
+        for rid in self.recipe_vars:
+            recipe_expiry = self.library.expiry_score(rid, expiry_map)
             if recipe_expiry > 0:
                 expiring_terms.append(If(self.recipe_vars[rid], recipe_expiry, 0))
 
@@ -213,11 +289,12 @@ class MealPlanOptimizer:
             self.optimizer.add(variety_score == 0)
 
         # Combined objective (all scaled to integers for Z3)
-        self.optimizer.maximize(
+        self.objective = (
             w_expiring * expiring_score
             - w_shopping * shopping_penalty
             + w_variety * variety_score
         )
+        self.optimizer.maximize(self.objective)
 
     def solve(self, timeout_ms: int = 5000) -> dict[str, Any]:
         """Solve the optimization problem.
@@ -225,6 +302,8 @@ class MealPlanOptimizer:
         Returns dict with status, solve_time_ms, and solution (if found).
         """
         self.optimizer.set("timeout", timeout_ms)
+        if self.random_seed is not None:
+            self.optimizer.set("random_seed", self.random_seed)
         start = time.time()
 
         try:
@@ -237,10 +316,12 @@ class MealPlanOptimizer:
         if result == sat:
             model = self.optimizer.model()
             solution = self._extract_solution(model)
+            objective_value = model.evaluate(self.objective, model_completion=True).as_long()
             logger.info(f"Optimization solved in {solve_time:.0f}ms")
             return {
                 "status": "optimal",
                 "solve_time_ms": round(solve_time),
+                "objective_value": objective_value,
                 "solution": solution,
             }
         else:
@@ -252,116 +333,532 @@ class MealPlanOptimizer:
 
     def _extract_solution(self, model) -> dict[str, Any]:
         """Extract meal plan from Z3 model."""
-        recipes = self.problem.get("recipes", [])
-        recipe_map = {r["id"]: r for r in recipes}
         days = self.problem.get("planning_horizon", {}).get("days", 7)
-        start_date = self.problem.get("planning_horizon", {}).get("start_date", "")
-        meal_types = self.problem.get("planning_horizon", {}).get("meal_types", ["dinner"])
-
-        meal_plan = []
-        selected_recipe_ids = []
-
-        try:
-            from datetime import date as dt_date, timedelta
-            start = dt_date.fromisoformat(start_date) if start_date else None
-        except (ValueError, TypeError):
-            start = None
 
+        assignments: dict[int, str] = {}
         for day in range(days):
             for rid in self.recipe_vars:
                 key = (rid, day)
                 if key in self.assign_vars and model.evaluate(self.assign_vars[key], model_completion=True):
                     if str(model.evaluate(self.assign_vars[key], model_completion=True)) == "True":
-                        date_str = ""
-                        if start:
-                            date_str = (start + timedelta(days=day)).isoformat()
-
-                        recipe_info = recipe_map.get(rid, {})
-                        meal_plan.append({
-                            "date": date_str,
-                            "day_index": day,
-                            "meal_type": meal_types[0] if meal_types else "dinner",
-                            "recipe_id": rid,
-                            "recipe_name": recipe_info.get("name", "Unknown"),
-                        })
-                        selected_recipe_ids.append(rid)
-
-        # Shopping list
-        shopping_list = []
-        inventory = self.problem.get("inventory", [])
-        inv_name_map = {item["ingredient_id"]: item.get("name", "Unknown") for item in inventory}
-
-        # Also build name map from recipe ingredients
-        for recipe in recipes:
-            for ing in recipe.get("ingredients", []):
-                if ing["ingredient_id"] not in inv_name_map:
-                    inv_name_map[ing["ingredient_id"]] = ing.get("name", "Unknown")
+                        assignments[day] = rid
 
+        purchases: dict[str, int] = {}
         for iid, var in self.buy_vars.items():
             buy_qty = model.evaluate(var, model_completion=True)
             try:
                 qty_int = buy_qty.as_long() if hasattr(buy_qty, 'as_long') else int(str(buy_qty))
             except (ValueError, AttributeError):
                 qty_int = 0
-            if qty_int > 0:
-                shopping_list.append({
-                    "ingredient_id": iid,
-                    "name": inv_name_map.get(iid, "Unknown"),
-                    "quantity": qty_int,
-                })
-
-        # Metrics
-        expiring_used = 0
-        total_expiring = 0
-        for item in inventory:
-            dte = item.get("days_until_expiry")
-            if dte is not None and dte <= 7:
-                total_expiring += 1
-                # Check if any selected recipe uses this ingredient
-                for rid in selected_recipe_ids:
-                    recipe_info = recipe_map.get(rid, {})
-                    for ing in recipe_info.get("ingredients", []):
-                        if ing["ingredient_id"] == item["ingredient_id"]:
-                            expiring_used += 1
-                            break
-
-        # Explanations
-        explanations = []
-        for entry in meal_plan:
-            rid = entry["recipe_id"]
-            recipe_info = recipe_map.get(rid, {})
-            uses_expiring = []
-            for ing in recipe_info.get("ingredients", []):
-                for inv_item in inventory:
-                    if inv_item["ingredient_id"] == ing["ingredient_id"]:
-                        dte = inv_item.get("days_until_expiry")
-                        if dte is not None and dte <= 7:
-                            uses_expiring.append(inv_item.get("name", "item"))
-            if uses_expiring:
-                explanations.append(
-                    f"Selected '{entry['recipe_name']}' for day {entry['day_index'] + 1} "
-                    f"to use {', '.join(uses_expiring)} expiring soon"
-                )
+            purchases[iid] = qty_int
+
+        return _build_solution(self.problem, assignments, purchases, self.library)
+
+
+def _build_solution(
+    problem: dict[str, Any],
+    assignments: dict[int, str],
+    purchases: dict[str, int],
+    library: Optional[RecipeLibrary] = None,
+) -> dict[str, Any]:
+    """Build the meal plan response from day -> recipe assignments and purchases."""
+    library = library or RecipeLibrary(problem.get("recipes", []))
+    recipe_map = library.recipe_map
+    days = problem.get("planning_horizon", {}).get("days", 7)
+    start_date = problem.get("planning_horizon", {}).get("start_date", "")
+    meal_types = problem.get("planning_horizon", {}).get("meal_types", ["dinner"])
+
+    meal_plan = []
+    selected_recipe_ids = []
+
+    try:
+        start = dt_date.fromisoformat(start_date) if start_date else None
+    except (ValueError, TypeError):
+        start = None
+
+    for day in range(days):
+        rid = assignments.get(day)
+        if rid is None:
+            continue
+        date_str = ""
+        if start:
+            date_str = (start + timedelta(days=day)).isoformat()
+
+        recipe_info = recipe_map.get(rid, {})
+        meal_plan.append({
+            "date": date_str,
+            "day_index": day,
+            "meal_type": meal_types[0] if meal_types else "dinner",
+            "recipe_id": rid,
+            "recipe_name": recipe_info.get("name", "Unknown"),
+        })
+        selected_recipe_ids.append(rid)
+
+    # Shopping list
+    shopping_list = []
+    inventory = problem.get("inventory", [])
+    inv_name_map = {item["ingredient_id"]: item.get("name", "Unknown") for item in inventory}
+
+    # Also build name map from recipe ingredients
+    for iid, name in library.ingredient_names.items():
+        inv_name_map.setdefault(iid, name)
+
+    for iid, qty_int in purchases.items():
+        if qty_int > 0:
+            shopping_list.append({
+                "ingredient_id": iid,
+                "name": inv_name_map.get(iid, "Unknown"),
+                "quantity": qty_int,
+            })
+
+    # Metrics
+    expiring_used = 0
+    total_expiring = 0
+    for item in inventory:
+        dte = item.get("days_until_expiry")
+        if dte is not None and dte <= 7:
+            total_expiring += 1
+            # Check if any selected recipe uses this ingredient
+            for rid in selected_recipe_ids:
+                recipe_info = recipe_map.get(rid, {})
+                for ing in recipe_info.get("ingredients", []):
+                    if ing["ingredient_id"] == item["ingredient_id"]:
+                        expiring_used += 1
+                        break
+
+    # Explanations
+    explanations = []
+    for entry in meal_plan:
+        rid = entry["recipe_id"]
+        recipe_info = recipe_map.get(rid, {})
+        uses_expiring = []
+        for ing in recipe_info.get("ingredients", []):
+            for inv_item in inventory:
+                if inv_item["ingredient_id"] == ing["ingredient_id"]:
+                    dte = inv_item.get("days_until_expiry")
+                    if dte is not None and dte <= 7:
+                        uses_expiring.append(inv_item.get("name", "item"))
+        if uses_expiring:
+            explanations.append(
+                f"Selected '{entry['recipe_name']}' for day {entry['day_index'] + 1} "
+                f"to use {', '.join(uses_expiring)} expiring soon"
+            )
+
+    return {
+        "meal_plan": meal_plan,
+        "shopping_list": shopping_list,
+        "metrics": {
+            "expiring_ingredients_used": expiring_used,
+            "total_expiring_ingredients": total_expiring,
+            "shopping_items_count": len(shopping_list),
+            "variety_score": len(set(selected_recipe_ids)) / max(days, 1),
+            "recipes_selected": len(selected_recipe_ids),
+        },
+        "explanation": explanations,
+    }
+
+
+def optimize_meal_plan(
+    problem: dict[str, Any],
+    timeout_ms: int = 5000,
+    solver: str = "z3",
+    use_cache: bool = True,
+    library: Optional[RecipeLibrary] = None,
+) -> dict[str, Any]:
+    """Convenience function to build and solve a meal plan optimization problem.
+
+    solver selects the engine: "z3" for the exact SMT model, "heuristic" for the
+    greedy/local-search planner (timeout_ms then bounds the local search), or
+    "portfolio" to race several configurations in parallel processes.
+
+    Solved results are cached by canonical problem hash (see solution_cache);
+    a cache hit skips the solver entirely and is marked with "cached": True.
+    Z3 and portfolio results are cached only when optimal, since a larger
+    budget may improve a feasible one; heuristic results are keyed by their
+    time budget as well.
+    library optionally supplies preprocessing shared across problems that use
+    the same recipes (ignored by the portfolio, whose workers rebuild it).
+    """
+    if solver not in ("z3", "heuristic", "portfolio"):
+        raise ValueError(f"Unknown solver: {solver}")
+
+    use_cache = use_cache and settings.MEAL_PLAN_CACHE_ENABLED
+    if use_cache:
+        cache_key = problem_hash(problem, solver, timeout_ms if solver == "heuristic" else None)
+        cached = meal_plan_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Meal plan cache hit ({cache_key[:12]})")
+            return {**cached, "cached": True}
+
+    if solver == "portfolio":
+        result = solve_portfolio(problem, timeout_ms=timeout_ms)
+    else:
+        result = _solve_with_config(problem, {"solver": solver}, timeout_ms, library)
+
+    # Timeouts and errors may succeed on retry, so only cache solved problems
+    cacheable = ("optimal", "feasible") if solver == "heuristic" else ("optimal",)
+    if use_cache and result.get("status") in cacheable:
+        meal_plan_cache.set(cache_key, result)
+    return result
+
+
+def _solve_with_config(
+    problem: dict[str, Any],
+    config: dict[str, Any],
+    timeout_ms: int,
+    library: Optional[RecipeLibrary] = None,
+) -> dict[str, Any]:
+    """Solve with a single solver configuration (see PORTFOLIO_CONFIGS)."""
+    if config["solver"] == "heuristic":
+        return HeuristicMealPlanner(problem, library).solve(time_limit_ms=timeout_ms)
+    optimizer = MealPlanOptimizer(
+        problem,
+        encoding=config.get("encoding", "arith"),
+        random_seed=config.get("random_seed"),
+        library=library,
+    )
+    optimizer.build_model()
+    return optimizer.solve(timeout_ms=timeout_ms)
+
+
+def _portfolio_worker(config: dict, problem: dict, timeout_ms: int, results) -> None:
+    """Process entry point: solve one configuration and report back."""
+    try:
+        result = _solve_with_config(problem, config, timeout_ms)
+    except Exception as e:
+        result = {"status": "error", "solve_time_ms": 0, "error": str(e)}
+    results.put((config["name"], result))
+
+
+def solve_portfolio(
+    problem: dict[str, Any],
+    timeout_ms: int = 5000,
+    configs: Optional[list[dict[str, Any]]] = None,
+    max_workers: Optional[int] = None,
+) -> dict[str, Any]:
+    """Race solver configurations in parallel processes.
+
+    Returns the first optimal result, or the best feasible result (by objective)
+    once timeout_ms elapses. Losing processes are terminated. The result carries
+    a "portfolio" entry naming the winning configuration.
+    """
+    configs = list(configs or PORTFOLIO_CONFIGS)
+    configs = configs[:max_workers or os.cpu_count() or 1]
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    start = time.time()
+    deadline = start + (timeout_ms + PORTFOLIO_STARTUP_GRACE_MS) / 1000
+
+    processes = []
+    for config in configs:
+        process = ctx.Process(
+            target=_portfolio_worker,
+            args=(config, problem, timeout_ms, results),
+            daemon=True,
+        )
+        process.start()
+        processes.append(process)
+
+    statuses: dict[str, str] = {}
+    best_name, best = None, None
+    try:
+        while len(statuses) < len(processes):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                name, result = results.get(timeout=remaining)
+            except queue.Empty:
+                break
+
+            statuses[name] = result.get("status", "error")
+            if "solution" in result and (
+                best is None or result["objective_value"] > best["objective_value"]
+            ):
+                best_name, best = name, result
+            if result.get("status") == "optimal":
+                best_name, best = name, result
+                break
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=1)
+
+    solve_time = (time.time() - start) * 1000
+    portfolio = {
+        "winner": best_name,
+        "configs": [config["name"] for config in configs],
+        "statuses": statuses,
+    }
+
+    if best is None:
+        logger.warning(f"Portfolio found no solution in {solve_time:.0f}ms: {statuses}")
+        return {"status": "no_solution", "solve_time_ms": round(solve_time), "portfolio": portfolio}
+
+    logger.info(
+        f"Portfolio winner: {best_name} ({best['status']}, "
+        f"objective={best['objective_value']}) in {solve_time:.0f}ms; statuses={statuses}"
+    )
+    return {**best, "solve_time_ms": round(solve_time), "portfolio": portfolio}
+
+
+class HeuristicMealPlanner:
+    """Greedy + local-search meal planner.
+
+    Uses the same constraints and integer objective as MealPlanOptimizer so the
+    two are directly comparable, but returns a feasible plan in milliseconds:
+
+    1. Locked meals are placed first.
+    2. Remaining days (most time-constrained first) greedily take the recipe with
+       the best marginal objective gain, which is dominated by expiry score.
+    3. Local search swaps planned recipes for unplanned ones (or drops them)
+       while that improves the objective and the time limit allows.
+
+    The result also carries an upper bound on the optimal objective (shopping
+    penalty ignored), so callers can judge the optimality gap.
+    """
+
+    def __init__(self, problem: dict[str, Any], library: Optional[RecipeLibrary] = None):
+        self.problem = problem
+        self.library = library or RecipeLibrary(problem.get("recipes", []))
+        self.days = problem.get("planning_horizon", {}).get("days", 7)
+        self.w_expiring, self.w_shopping, self.w_variety = _objective_weights(problem)
+
+        inventory = problem.get("inventory", [])
+        expiry_map = _expiry_scores(inventory)
+        self.available = {iid: int(qty) for iid, qty in _inventory_totals(inventory).items()}
+
+        # Per-recipe ingredient usage and value, as in the Z3 encoding
+        self.usage = self.library.usage
+        self.total_time = self.library.total_time
+        self.recipe_value: dict[str, int] = {
+            rid: self.w_expiring * self.library.expiry_score(rid, expiry_map) + self.w_variety
+            for rid in self.usage
+        }
+
+    def _allowed_recipes(self) -> dict[int, list[str]]:
+        """Recipes permitted on each day by the time budgets."""
+        allowed = {day: list(self.usage) for day in range(self.days)}
+        time_budgets = self.problem.get("constraints", {}).get("time_budgets", {})
+        start_date = self.problem.get("planning_horizon", {}).get("start_date", "")
+        for date_str, budget_minutes in time_budgets.items():
+            day_idx = _day_index(start_date, date_str)
+            if day_idx is not None and 0 <= day_idx < self.days:
+                allowed[day_idx] = [
+                    rid for rid in allowed[day_idx] if self.total_time[rid] <= budget_minutes
+                ]
+        return allowed
+
+    def _locked_meals(self, allowed: dict[int, list[str]]) -> Optional[dict[int, str]]:
+        """Locked day -> recipe assignments, or None if the locks are infeasible."""
+        locked: dict[int, str] = {}
+        start_date = self.problem.get("planning_horizon", {}).get("start_date", "")
+        for lock in self.problem.get("constraints", {}).get("locked_meals", []):
+            rid = lock.get("recipe_id", "")
+            day_idx = _day_index(start_date, lock.get("date", ""))
+            if day_idx is None or not 0 <= day_idx < self.days or rid not in self.usage:
+                continue
+            if locked.get(day_idx, rid) != rid or rid not in allowed[day_idx]:
+                return None
+            locked[day_idx] = rid
+        if len(set(locked.values())) != len(locked):
+            return None
+        return locked
+
+    def _shortfall(self, iid: str, used: int) -> int:
+        return max(0, used - self.available.get(iid, 0))
+
+    def _add_delta(self, used: dict[str, int], rid: str) -> int:
+        """Objective change from adding rid given current ingredient usage."""
+        penalty = 0
+        for iid, qty in self.usage[rid].items():
+            current = used.get(iid, 0)
+            penalty += self._shortfall(iid, current + qty) - self._shortfall(iid, current)
+        return self.recipe_value[rid] - self.w_shopping * penalty
+
+    def _apply(self, used: dict[str, int], rid: str, sign: int) -> None:
+        for iid, qty in self.usage[rid].items():
+            used[iid] = used.get(iid, 0) + sign * qty
+
+    def objective(self, selected: list[str]) -> int:
+        """Objective value of a set of selected recipes (Z3 scale)."""
+        used: dict[str, int] = {}
+        for rid in selected:
+            self._apply(used, rid, 1)
+        purchases = sum(self._shortfall(iid, qty) for iid, qty in used.items())
+        return sum(self.recipe_value[rid] for rid in selected) - self.w_shopping * purchases
+
+    def solve(self, time_limit_ms: int = 50) -> dict[str, Any]:
+        """Build a feasible plan within roughly time_limit_ms.
+
+        Returns dict with status, solve_time_ms, objective_value, objective_bound
+        and solution (if found).
+        """
+        start = time.perf_counter()
+        deadline = start + time_limit_ms / 1000
+
+        allowed = self._allowed_recipes()
+        locked = self._locked_meals(allowed)
+        if locked is None:
+            solve_time = (time.perf_counter() - start) * 1000
+            logger.warning(f"Heuristic planner: locked meals are infeasible ({solve_time:.0f}ms)")
+            return {"status": "no_solution", "solve_time_ms": round(solve_time)}
+
+        assignments: dict[int, str] = dict(locked)
+        used: dict[str, int] = {}
+        for rid in assignments.values():
+            self._apply(used, rid, 1)
+
+        free_days = sorted(
+            (day for day in range(self.days) if day not in locked),
+            key=lambda day: len(allowed[day]),
+        )
+
+        # Greedy construction
+        for day in free_days:
+            selected = set(assignments.values())
+            best_rid, best_delta = None, 0
+            for rid in allowed[day]:
+                if rid in selected:
+                    continue
+                delta = self._add_delta(used, rid)
+                if delta > best_delta:
+                    best_rid, best_delta = rid, delta
+            if best_rid is not None:
+                assignments[day] = best_rid
+                self._apply(used, best_rid, 1)
+
+        # Local search: swap a planned recipe for an unplanned one, or drop it
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for day in free_days:
+                current = assignments.get(day)
+                removal_delta = 0
+                if current is not None:
+                    self._apply(used, current, -1)
+                    removal_delta = -self._add_delta(used, current)
+
+                selected = set(assignments.values())
+                best_rid, best_delta = current, 0
+                if current is not None and removal_delta > 0:
+                    best_rid, best_delta = None, removal_delta
+                for rid in allowed[day]:
+                    if rid in selected:
+                        continue
+                    delta = removal_delta + self._add_delta(used, rid)
+                    if delta > best_delta:
+                        best_rid, best_delta = rid, delta
+
+                if best_rid is None:
+                    assignments.pop(day, None)
+                else:
+                    assignments[day] = best_rid
+                    self._apply(used, best_rid, 1)
+                improved = improved or best_rid != current
+
+        purchases = {iid: self._shortfall(iid, qty) for iid, qty in used.items()}
+        objective_value = self.objective(list(assignments.values()))
+        solve_time = (time.perf_counter() - start) * 1000
+        logger.info(f"Heuristic plan built in {solve_time:.1f}ms (objective={objective_value})")
 
         return {
-            "meal_plan": meal_plan,
-            "shopping_list": shopping_list,
-            "metrics": {
-                "expiring_ingredients_used": expiring_used,
-                "total_expiring_ingredients": total_expiring,
-                "shopping_items_count": len(shopping_list),
-                "variety_score": len(set(selected_recipe_ids)) / max(days, 1),
-                "recipes_selected": len(selected_recipe_ids),
-            },
-            "explanation": explanations,
+            "status": "feasible",
+            "solve_time_ms": round(solve_time),
+            "objective_value": objective_value,
+            "objective_bound": self._upper_bound(locked, free_days, allowed),
+            "solution": _build_solution(self.problem, assignments, purchases, self.library),
         }
 
+    def _upper_bound(
+        self,
+        locked: dict[int, str],
+        free_days: list[int],
+        allowed: dict[int, list[str]],
+    ) -> int:
+        """Relaxation bound: best recipe values per free day, no shopping penalty."""
+        locked_ids = set(locked.values())
+        candidates = {rid for day in free_days for rid in allowed[day]} - locked_ids
+        values = sorted(
+            (self.recipe_value[rid] for rid in candidates if self.recipe_value[rid] > 0),
+            reverse=True,
+        )
+        return sum(self.recipe_value[rid] for rid in locked_ids) + sum(values[:len(free_days)])
 
-def optimize_meal_plan(problem: dict[str, Any], timeout_ms: int = 5000) -> dict[str, Any]:
-    """Convenience function to build and solve a meal plan optimization problem."""
-    optimizer = MealPlanOptimizer(problem)
-    optimizer.build_model()
-    return optimizer.solve(timeout_ms=timeout_ms)
+
+class RecipeMatrix:
+    """Sparse recipe x ingredient matrix for vectorized suggestion scoring.
+
+    Stored in COO form (one entry per recipe ingredient line, in recipe order),
+    so scoring a whole library against an inventory is a few NumPy gathers and
+    np.bincount row reductions instead of a Python loop per ingredient.
+    """
+
+    def __init__(self, recipes: list[dict], key: str = ""):
+        self.recipes = recipes
+        self.key = key
+        self.ingredient_index: dict[str, int] = {}
+        rows: list[int] = []
+        cols: list[int] = []
+        quantities: list[float] = []
+        for r, recipe in enumerate(recipes):
+            for ing in recipe.get("ingredients", []):
+                col = self.ingredient_index.setdefault(ing["ingredient_id"], len(self.ingredient_index))
+                rows.append(r)
+                cols.append(col)
+                quantities.append(ing.get("quantity", 1))
+
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.cols = np.asarray(cols, dtype=np.intp)
+        self.quantities = np.asarray(quantities, dtype=np.float64)
+        self.ingredient_counts = self.row_sum(np.ones(len(rows)))
+
+    def row_sum(self, values: np.ndarray) -> np.ndarray:
+        """Sum per-entry values into one value per recipe."""
+        sums = np.bincount(self.rows, weights=values, minlength=len(self.recipes))
+        return sums.astype(np.float64, copy=False)
+
+
+# Recipe matrices keyed by library hash (most recently used last)
+_recipe_matrices: OrderedDict[str, RecipeMatrix] = OrderedDict()
+_recipe_matrices_lock = threading.Lock()
+RECIPE_MATRIX_CACHE_SIZE = 32
+
+
+def lookup_recipe_matrix(key: str) -> Optional[RecipeMatrix]:
+    """Return a cached RecipeMatrix by library hash, or None if not cached."""
+    with _recipe_matrices_lock:
+        matrix = _recipe_matrices.get(key)
+        if matrix is not None:
+            _recipe_matrices.move_to_end(key)
+        return matrix
+
+
+def get_recipe_matrix(recipes: list[dict], library_hash: Optional[str] = None) -> RecipeMatrix:
+    """Return the cached RecipeMatrix for a recipe library, building it once.
+
+    A library_hash from an earlier response is looked up first, so a cached
+    library is not serialized and hashed again.
+    """
+    if library_hash:
+        matrix = lookup_recipe_matrix(library_hash)
+        if matrix is not None:
+            return matrix
+
+    key = recipe_library_hash(recipes)
+    matrix = lookup_recipe_matrix(key)
+    if matrix is not None:
+        return matrix
+
+    matrix = RecipeMatrix(recipes, key)
+    with _recipe_matrices_lock:
+        _recipe_matrices[key] = matrix
+        while len(_recipe_matrices) > RECIPE_MATRIX_CACHE_SIZE:
+            _recipe_matrices.popitem(last=False)
+    return matrix
 
 
 def quick_suggestions(
@@ -369,57 +866,94 @@ def quick_suggestions(
     recipes: list[dict],
     mode: str = "use_expiring",
     limit: int = 5,
+    matrix: Optional[RecipeMatrix] = None,
+    library_hash: Optional[str] = None,
 ) -> list[dict[str, Any]]:
     """Lighter suggestion endpoint - scoring without full Z3 optimization.
 
-    Scores recipes by expiring ingredient usage and availability.
+    Scores recipes by expiring ingredient usage and availability. All recipes
+    are scored at once over the RecipeMatrix for the library (passed in, looked
+    up by library_hash, or built and cached on first use); only the top
+    `limit` are materialized.
     """
-    # Build expiry urgency map
+    matrix = matrix or get_recipe_matrix(recipes, library_hash)
+    recipes = matrix.recipes
+    if limit <= 0 or not recipes:
+        return []
+
+    # Build expiry urgency map (last expiring entry per ingredient wins)
     expiry_map: dict[str, dict] = {}
     for item in inventory:
-        iid = item["ingredient_id"]
         dte = item.get("days_until_expiry")
         if dte is not None and dte <= 7:
-            expiry_map[iid] = item
+            expiry_map[item["ingredient_id"]] = item
 
     inv_map: dict[str, float] = {}
     for item in inventory:
         iid = item["ingredient_id"]
         inv_map[iid] = inv_map.get(iid, 0) + item.get("quantity", 0)
 
-    suggestions = []
-    for recipe in recipes:
-        rid = recipe["id"]
-        ingredients = recipe.get("ingredients", [])
-        if not ingredients:
-            continue
+    # Per-ingredient vectors over the library's ingredient vocabulary
+    n_ingredients = len(matrix.ingredient_index)
+    expiry_weight = np.zeros(n_ingredients)
+    is_expiring = np.zeros(n_ingredients, dtype=bool)
+    in_inventory = np.zeros(n_ingredients, dtype=bool)
+    available_qty = np.zeros(n_ingredients)
+    for iid, qty in inv_map.items():
+        col = matrix.ingredient_index.get(iid)
+        if col is not None:
+            in_inventory[col] = True
+            available_qty[col] = qty
+    for iid, item in expiry_map.items():
+        col = matrix.ingredient_index.get(iid)
+        if col is not None:
+            is_expiring[col] = True
+            expiry_weight[col] = 1.0 / max(item.get("days_until_expiry", 7), 1)
+
+    # Per-entry flags, reduced per recipe
+    entry_expiring = is_expiring[matrix.cols]
+    entry_in_inventory = in_inventory[matrix.cols]
+    entry_missing = ~entry_expiring & (
+        ~entry_in_inventory | (available_qty[matrix.cols] < matrix.quantities)
+    )
+
+    score = matrix.row_sum(expiry_weight[matrix.cols])
+    expiring_count = matrix.row_sum(entry_expiring.astype(np.float64))
+    missing_count = matrix.row_sum(entry_missing.astype(np.float64))
+    available_count = matrix.row_sum(entry_in_inventory.astype(np.float64))
+
+    counts = matrix.ingredient_counts
+    availability = np.divide(available_count, counts, out=np.zeros_like(counts), where=counts > 0)
+    final_score = score * 0.6 + availability * 0.3 - missing_count * 0.1
+
+    eligible = counts > 0
+    if mode == "use_expiring":
+        eligible &= expiring_count > 0
+    candidates = np.flatnonzero(eligible)
+
+    # Top-k by argpartition; keep near-ties at the boundary for exact ordering
+    if candidates.size > limit:
+        kth = candidates.size - limit
+        threshold = final_score[candidates][np.argpartition(final_score[candidates], kth)[kth]]
+        candidates = candidates[final_score[candidates] >= threshold - 1e-3]
+
+    ranked = sorted(
+        candidates.tolist(),
+        key=lambda r: (-round(float(final_score[r]), 3), missing_count[r], r),
+    )[:limit]
 
+    suggestions = []
+    for r in ranked:
+        recipe = recipes[r]
         expiring_used = []
         missing = []
-        score = 0.0
-
-        for ing in ingredients:
+        for ing in recipe.get("ingredients", []):
             iid = ing["ingredient_id"]
             if iid in expiry_map:
-                exp_item = expiry_map[iid]
-                dte = exp_item.get("days_until_expiry", 7)
-                score += 1.0 / max(dte, 1)
-                expiring_used.append(exp_item.get("name", "Unknown"))
+                expiring_used.append(expiry_map[iid].get("name", "Unknown"))
             elif iid not in inv_map or inv_map[iid] < ing.get("quantity", 1):
                 missing.append(ing.get("name", "Unknown"))
 
-        if mode == "use_expiring" and not expiring_used:
-            continue
-
-        # Availability bonus
-        available_count = sum(
-            1 for ing in ingredients if ing["ingredient_id"] in inv_map
-        )
-        availability = available_count / len(ingredients) if ingredients else 0
-
-        # Combined score
-        final_score = score * 0.6 + availability * 0.3 - len(missing) * 0.1
-
         reason_parts = []
         if expiring_used:
             reason_parts.append(f"Uses {len(expiring_used)} expiring ingredient{'s' if len(expiring_used) != 1 else ''}")
@@ -430,13 +964,12 @@ def quick_suggestions(
         reason = " - ".join(reason_parts)
 
         suggestions.append({
-            "recipe_id": rid,
+            "recipe_id": recipe["id"],
             "recipe_name": recipe.get("name", "Unknown"),
-            "score": round(final_score, 3),
+            "score": round(float(final_score[r]), 3),
             "expiring_used": expiring_used,
             "missing": missing,
             "reason": reason,
         })
 
-    suggestions.sort(key=lambda s: (-s["score"], len(s["missing"])))
-    return suggestions[:limit]
+    return suggestions
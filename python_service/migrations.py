@@ -0,0 +1,438 @@
+"""
+Versioned schema migrations for the AI service database.
+
+Base.metadata.create_all only creates missing tables, so changes to existing
+tables (new columns, indexes, tables for caches or leases) ship as numbered
+migrations. Applied versions are recorded in ai_schema_migrations and
+upgrade() runs the pending ones in order: at startup from init_db (unless
+DB_MIGRATE_ON_STARTUP=false), or from the command line before a deploy:
+
+    python migrations.py status     # applied and pending migrations, schema drift
+    python migrations.py upgrade    # apply pending migrations
+
+Migration 1 is the baseline: it creates the tables as they were when
+migrations were introduced and brings databases created before migrations
+existed up to them (the schema sync init_db used to run on every start).
+Its tables are frozen copies, not the models, so fresh and upgraded
+databases both reach the current schema through the same later migrations.
+Later changes are added to MIGRATIONS with the operations below, each of
+which is idempotent, so a migration interrupted halfway is safely re-run.
+
+Indexes are built online. On PostgreSQL they use CREATE INDEX CONCURRENTLY
+outside a transaction, so writes continue during the build; a changed index
+is built under a temporary name and swapped in. On SQLite the build holds
+the write lock, but WAL readers continue. Concurrent upgrades from several
+instances are serialized with an advisory lock on PostgreSQL; on SQLite the
+idempotent operations make a duplicate run harmless.
+"""
+
+import argparse
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy import (
+    Column, DateTime, Enum as SQLEnum, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    UniqueConstraint, inspect, literal, select, text,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+
+from database import Base, JobStatus, JSONPayload, get_engine
+
+logger = logging.getLogger("grocery-planner-ai.migrations")
+
+schema_migrations = Table(
+    "ai_schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# pg_advisory_lock key held while migrating
+_LOCK_KEY = 0x61695F6D6967  # "ai_mig"
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A numbered schema change applied by upgrade()."""
+    version: int
+    name: str
+    upgrade: Callable[[Engine], None]
+
+
+# Operations
+
+
+def _quote(engine: Engine, name: str) -> str:
+    return engine.dialect.identifier_preparer.quote(name)
+
+
+def _existing_indexes(engine: Engine, table_name: str) -> dict[str, list[str]]:
+    return {index["name"]: index["column_names"] for index in inspect(engine).get_indexes(table_name)}
+
+
+def _drop_invalid_index(engine: Engine, name: str) -> None:
+    """Drop an index left INVALID by an interrupted CREATE INDEX CONCURRENTLY."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.connect() as conn:
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+    if invalid:
+        logger.warning(f"Dropping invalid index {name} left by an interrupted build")
+        drop_index(engine, name)
+
+
+def _build_index(engine: Engine, index: Index, name: str) -> None:
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    unique = "UNIQUE " if index.unique else ""
+    columns = ", ".join(_quote(engine, column.name) for column in index.columns)
+    # CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            f"CREATE {unique}INDEX {concurrently}IF NOT EXISTS {_quote(engine, name)} "
+            f"ON {_quote(engine, index.table.name)} ({columns})"
+        ))
+
+
+def create_index(engine: Engine, index: Index) -> None:
+    """
+    Create an index online, or rebuild it if its columns changed.
+
+    Args:
+        engine: Database engine
+        index: Index declared on a model table
+    """
+    _drop_invalid_index(engine, index.name)
+    columns = [column.name for column in index.columns]
+    existing = _existing_indexes(engine, index.table.name)
+    if existing.get(index.name) == columns:
+        return
+
+    if index.name not in existing:
+        logger.info(f"Creating index {index.name} on {index.table.name} ({', '.join(columns)})")
+        _build_index(engine, index, index.name)
+        return
+
+    logger.info(f"Rebuilding index {index.name} on {index.table.name} ({', '.join(columns)})")
+    if engine.dialect.name == "postgresql":
+        # Build the new index beside the old one; queries keep an index throughout
+        replacement = f"{index.name}_new"
+        _drop_invalid_index(engine, replacement)
+        _build_index(engine, index, replacement)
+        drop_index(engine, index.name)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER INDEX {_quote(engine, replacement)} RENAME TO {_quote(engine, index.name)}"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP INDEX IF EXISTS {_quote(engine, index.name)}"))
+        _build_index(engine, index, index.name)
+
+
+def drop_index(engine: Engine, name: str) -> None:
+    """Drop an index if it exists, without blocking writes on PostgreSQL."""
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP INDEX {concurrently}IF EXISTS {_quote(engine, name)}"))
+
+
+def add_column(engine: Engine, column: Column) -> None:
+    """
+    Add a model column to its existing table if it is missing.
+
+    Scalar Python defaults become the column's server default, rendered as a
+    literal of the column type, so existing rows get the value; the column
+    must otherwise be nullable.
+    """
+    table = column.table
+    if column.name in {c["name"] for c in inspect(engine).get_columns(table.name)}:
+        return
+    column_type = column.type.compile(dialect=engine.dialect)
+    default = ""
+    if column.default is not None and column.default.is_scalar:
+        value = literal(column.default.arg, column.type).compile(
+            dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        default = f" DEFAULT {value}"
+    logger.info(f"Adding column {table.name}.{column.name}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {_quote(engine, table.name)} ADD COLUMN {_quote(engine, column.name)} {column_type}{default}"
+        ))
+
+
+def create_table(engine: Engine, table: Table) -> None:
+    """Create a model table, and its indexes, if it is missing."""
+    table.create(bind=engine, checkfirst=True)
+
+
+# Migrations
+
+
+# The schema of migration 1; do not change it, add a migration instead
+baseline_metadata = MetaData()
+
+Table(
+    "ai_jobs",
+    baseline_metadata,
+    Column("id", String(64), primary_key=True, index=True),
+    Column("tenant_id", String(64), nullable=False),
+    Column("user_id", String(64), nullable=False),
+    Column("feature", String(64), nullable=False, index=True),
+    Column("status", SQLEnum(JobStatus, native_enum=False), default=JobStatus.QUEUED, nullable=False),
+    Column("priority", Integer, default=0, nullable=False),
+    Column("input_payload", JSONPayload, nullable=True),
+    Column("output_payload", JSONPayload, nullable=True),
+    Column("output_ref", String(80), nullable=True),
+    Column("output_size", Integer, nullable=True),
+    Column("error_message", Text, nullable=True),
+    Column("model_id", String(128), nullable=True),
+    Column("model_version", String(32), nullable=True),
+    Column("webhook_url", String(512), nullable=True),
+    Column("fingerprint", String(64), nullable=True, index=True),
+    Column("idempotency_key", String(128), nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("started_at", DateTime, nullable=True),
+    Column("finished_at", DateTime, nullable=True),
+    Column("latency_ms", Float, nullable=True),
+    Column("cost", Float, nullable=True),
+    Column("progress", Float, nullable=True),
+    Column("attempts", Integer, default=0, nullable=False),
+    Column("lease_owner", String(64), nullable=True),
+    Column("lease_expires_at", DateTime, nullable=True, index=True),
+    Column("heartbeat_at", DateTime, nullable=True),
+    Column("next_attempt_at", DateTime, nullable=True),
+    Column("deadline_at", DateTime, nullable=True),
+    UniqueConstraint("tenant_id", "idempotency_key", name="uq_ai_jobs_tenant_idempotency_key"),
+    Index("ix_ai_jobs_tenant_created", "tenant_id", "created_at", "id"),
+    Index("ix_ai_jobs_tenant_feature_created", "tenant_id", "feature", "created_at", "id"),
+    Index("ix_ai_jobs_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+)
+
+Table(
+    "ai_job_chunks",
+    baseline_metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("job_id", String(64), ForeignKey("ai_jobs.id"), nullable=False, index=True),
+    Column("chunk_index", Integer, nullable=False),
+    Column("output_payload", JSONPayload, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    UniqueConstraint("job_id", "chunk_index", name="uq_ai_job_chunks_job_chunk"),
+)
+
+Table(
+    "ai_artifacts",
+    baseline_metadata,
+    Column("id", String(64), primary_key=True, index=True),
+    Column("job_id", String(64), ForeignKey("ai_jobs.id"), nullable=True, index=True),
+    Column("request_id", String(64), nullable=False, index=True),
+    Column("tenant_id", String(64), nullable=False),
+    Column("user_id", String(64), nullable=True),
+    Column("feature", String(64), nullable=False, index=True),
+    Column("input_payload", JSONPayload, nullable=False),
+    Column("output_payload", JSONPayload, nullable=True),
+    Column("status", String(16), default="success", nullable=False),
+    Column("error_message", Text, nullable=True),
+    Column("model_id", String(128), nullable=True),
+    Column("model_version", String(32), nullable=True),
+    Column("created_at", DateTime, nullable=False),
+    Column("latency_ms", Float, nullable=True),
+    Column("cost", Float, nullable=True),
+    Index("ix_ai_artifacts_tenant_created", "tenant_id", "created_at", "id"),
+    Index("ix_ai_artifacts_tenant_feature_created", "tenant_id", "feature", "created_at", "id"),
+    Index("ix_ai_artifacts_tenant_status_created", "tenant_id", "status", "created_at", "id"),
+)
+
+Table(
+    "ai_feedback",
+    baseline_metadata,
+    Column("id", String(64), primary_key=True, index=True),
+    Column("artifact_id", String(64), ForeignKey("ai_artifacts.id"), nullable=True, index=True),
+    Column("job_id", String(64), ForeignKey("ai_jobs.id"), nullable=True, index=True),
+    Column("tenant_id", String(64), nullable=False, index=True),
+    Column("user_id", String(64), nullable=False),
+    Column("rating", String(16), nullable=False),
+    Column("note", Text, nullable=True),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+def _baseline(engine: Engine) -> None:
+    baseline_metadata.create_all(bind=engine)
+    for table in baseline_metadata.sorted_tables:
+        for column in table.columns:
+            add_column(engine, column)
+        for index in table.indexes:
+            create_index(engine, index)
+
+
+def _drop_tenant_id_indexes(engine: Engine) -> None:
+    # Covered by the (tenant_id, ..., created_at, id) indexes; they only slowed writes
+    drop_index(engine, "ix_ai_jobs_tenant_id")
+    drop_index(engine, "ix_ai_artifacts_tenant_id")
+
+
+def _artifact_archive(engine: Engine) -> None:
+    artifacts = Base.metadata.tables["ai_artifacts"]
+    add_column(engine, artifacts.c.archive_ref)
+    create_index(engine, next(i for i in artifacts.indexes if i.name == "ix_ai_artifacts_feature_archive_created"))
+
+
+def _artifact_capture(engine: Engine) -> None:
+    artifacts = Base.metadata.tables["ai_artifacts"]
+    add_column(engine, artifacts.c.input_hash)
+    add_column(engine, artifacts.c.capture)
+    create_index(engine, next(i for i in artifacts.indexes if i.name == "ix_ai_artifacts_tenant_input_hash_created"))
+
+
+def _artifact_payload_blobs(engine: Engine) -> None:
+    create_table(engine, Base.metadata.tables["ai_payload_blobs"])
+    add_column(engine, Base.metadata.tables["ai_artifacts"].c.blob_hashes)
+    if engine.dialect.name == "postgresql":
+        # Blobs are stored compressed (or are images); skip TOAST compression
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE ai_payload_blobs ALTER COLUMN data SET STORAGE EXTERNAL"))
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "drop_tenant_id_indexes", _drop_tenant_id_indexes),
+    Migration(3, "artifact_archive", _artifact_archive),
+    Migration(4, "artifact_capture", _artifact_capture),
+    Migration(5, "artifact_payload_blobs", _artifact_payload_blobs),
+]
+
+
+# Runner
+
+
+@contextmanager
+def _migration_lock(engine: Engine) -> Iterator[None]:
+    """Serialize upgrades from several processes sharing a PostgreSQL database."""
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    """Versions recorded in ai_schema_migrations (empty if the table is missing)."""
+    if not inspect(engine).has_table(schema_migrations.name):
+        return set()
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+def pending_migrations(engine: Engine, target: Optional[int] = None) -> list[Migration]:
+    """Migrations not yet applied, in order, up to the target version if given."""
+    applied = applied_versions(engine)
+    return [
+        migration for migration in sorted(MIGRATIONS, key=lambda m: m.version)
+        if migration.version not in applied and (target is None or migration.version <= target)
+    ]
+
+
+def upgrade(engine: Optional[Engine] = None, target: Optional[int] = None) -> list[int]:
+    """
+    Apply pending migrations in order.
+
+    Args:
+        engine: Database engine (default: the service engine)
+        target: Highest version to apply (default: all)
+
+    Returns:
+        Versions applied by this call
+
+    Raises:
+        Exception: The error of a failing migration; it stays pending and
+            later migrations are not run
+    """
+    engine = engine or get_engine()
+    schema_migrations.create(bind=engine, checkfirst=True)
+    applied = []
+    with _migration_lock(engine):
+        for migration in pending_migrations(engine, target):
+            logger.info(f"Applying migration {migration.version} {migration.name}")
+            try:
+                migration.upgrade(engine)
+            except Exception:
+                logger.exception(f"Migration {migration.version} {migration.name} failed")
+                raise
+            try:
+                with engine.begin() as conn:
+                    conn.execute(schema_migrations.insert().values(
+                        version=migration.version, name=migration.name, applied_at=datetime.utcnow(),
+                    ))
+            except IntegrityError:
+                # Recorded by another process migrating at the same time
+                pass
+            applied.append(migration.version)
+    return applied
+
+
+def schema_drift(engine: Optional[Engine] = None) -> list[str]:
+    """
+    Differences between the database and the models.
+
+    Lists missing tables, columns and indexes and indexes with different
+    columns. Empty once all migrations are applied, unless a model change
+    was made without a migration.
+    """
+    engine = engine or get_engine()
+    inspector = inspect(engine)
+    drift = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            drift.append(f"missing table {table.name}")
+            continue
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        drift.extend(
+            f"missing column {table.name}.{column.name}"
+            for column in table.columns if column.name not in existing_columns
+        )
+        existing_indexes = _existing_indexes(engine, table.name)
+        for index in table.indexes:
+            columns = [column.name for column in index.columns]
+            if index.name not in existing_indexes:
+                drift.append(f"missing index {index.name}")
+            elif existing_indexes[index.name] != columns:
+                drift.append(f"index {index.name} has columns {existing_indexes[index.name]}, expected {columns}")
+    return drift
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate the AI service database schema")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Show applied and pending migrations")
+    upgrade_parser = commands.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--to", type=int, default=None, help="Highest version to apply")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    engine = get_engine()
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        print(f"Applied {len(applied)} migration(s)" + (f": {applied}" if applied else ""))
+        return
+
+    applied = applied_versions(engine)
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        state = "applied" if migration.version in applied else "pending"
+        print(f"{migration.version:>4}  {migration.name:<32} {state}")
+    for difference in schema_drift(engine):
+        print(f"drift: {difference}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Process pool for CPU-bound Tesseract receipt OCR.
+
+OpenCV preprocessing and Tesseract run two full OCR passes per receipt,
+which would block the event loop (and each other under the GIL) if run
+in-process. Receipt jobs are instead executed in a pool of
+OCR_PROCESS_WORKERS spawned processes, so a bulk import is processed in
+parallel across cores. The receipt_extraction job handler registers the same
+number as its per-worker concurrency, so jobs are only claimed when a
+process is free.
+
+Job payloads come from tenants, so an image_path is only read if it
+resolves inside RECEIPT_UPLOAD_DIR; without one, jobs must send
+image_base64.
+"""
+
+import asyncio
+import base64
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from config import settings
+
+logger = logging.getLogger("grocery-planner-ai.ocr_pool")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """Get or create the OCR process pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            logger.info(f"Starting OCR process pool with {settings.OCR_PROCESS_WORKERS} workers")
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.OCR_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_ocr_pool() -> None:
+    """Stop the OCR process pool (it is recreated on next use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def resolve_upload_path(image_path: str) -> str:
+    """
+    Resolve a receipt image path inside RECEIPT_UPLOAD_DIR.
+
+    Relative paths are taken relative to the directory; symlinks and ".."
+    are resolved before the check.
+
+    Raises:
+        ValueError: If no upload directory is configured or the path is outside it
+        FileNotFoundError: If the path is inside it but is not a file
+    """
+    if not settings.RECEIPT_UPLOAD_DIR:
+        raise ValueError("image_path is not accepted for receipt jobs; send image_base64")
+    root = os.path.realpath(settings.RECEIPT_UPLOAD_DIR)
+    path = os.path.realpath(os.path.join(root, image_path))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError("image_path must be inside the receipt upload directory")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Receipt image not found: {image_path}")
+    return path
+
+
+def _extract_receipt(image_path: Optional[str], image_bytes: Optional[bytes]) -> dict[str, Any]:
+    """Run the Tesseract pipeline in a pool process and return the flat result."""
+    from receipt_ocr import flatten_extraction_result, process_receipt
+
+    tmp_path = None
+    if image_bytes is not None:
+        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+            tmp.write(image_bytes)
+            tmp_path = image_path = tmp.name
+    try:
+        result = process_receipt(image_path)
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+
+    return {
+        **flatten_extraction_result(result),
+        "confidence": result.overall_confidence,
+        "engine": "tesseract",
+    }
+
+
+async def extract_receipt_in_pool(
+    image_base64: Optional[str] = None,
+    image_path: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    Extract a receipt with Tesseract in the OCR process pool.
+
+    Args:
+        image_base64: Base64-encoded receipt image
+        image_path: Path of a receipt image in RECEIPT_UPLOAD_DIR (see resolve_upload_path)
+
+    Returns:
+        Flat receipt dict (items, total, merchant, date) plus confidence
+
+    Raises:
+        ValueError: If neither image is given, image_path is outside the
+            upload directory, or the image is invalid
+        FileNotFoundError: If image_path does not exist in the upload directory
+        RuntimeError: If Tesseract fails
+    """
+    if image_base64:
+        image_bytes = base64.b64decode(image_base64)
+    elif image_path:
+        image_path, image_bytes = resolve_upload_path(image_path), None
+    else:
+        raise ValueError("image_base64 or image_path required in payload")
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_ocr_pool(), _extract_receipt, image_path, image_bytes)
@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) pagination for tenant list queries.
+
+Lists are ordered newest first by (created_at, id). A page's next_cursor
+encodes the key of its last record, and the next page continues strictly
+after that key with a row-value comparison that the (tenant_id, ...,
+created_at, id) indexes answer with a range seek. Every page therefore reads
+only its own rows, where OFFSET reads and discards every row before the page.
+
+Cursors are opaque to clients (URL-safe base64 of the key).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Union
+
+from sqlalchemy import tuple_
+
+# Fields a record needs for its cursor
+KEY_FIELDS = ("id", "created_at")
+
+# Upper bound on rows read by approximate counts
+APPROXIMATE_COUNT_CAP = 10000
+
+
+def encode_cursor(created_at: Union[datetime, str], item_id: str) -> str:
+    """Opaque cursor for the position after a record."""
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps([created_at, item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """
+    Key (created_at, id) encoded in a cursor.
+
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, item_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(item_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(query, created_column, id_column, cursor: Optional[str]):
+    """
+    Order a query newest first by (created_at, id), starting after the cursor.
+
+    Works for both Query and select() statements.
+
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        query = query.filter(tuple_(created_column, id_column) < tuple_(created_at, item_id))
+    return query.order_by(created_column.desc(), id_column.desc())
+
+
+def next_cursor(records: list[Any], limit: int) -> Optional[str]:
+    """
+    Cursor for the page after records, or None if this was the last page.
+
+    Records are ORM objects or dicts with the KEY_FIELDS.
+    """
+    if not records or len(records) < limit:
+        return None
+    last = records[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last["created_at"], last["id"])
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,189 @@
+"""
+Deduplicated storage of long artifact payload strings.
+
+Receipt extraction artifacts carry the whole base64 image in their input,
+megabytes per row and the same bytes again for every re-upload. Strings of
+ARTIFACT_BLOB_MIN_BYTES or more in artifact payloads are replaced by
+{"$blob": "<sha256>"} references when the row is built (artifact_row) and
+stored once in ai_payload_blobs, keyed by the SHA-256 of the string:
+
+- base64 strings are stored decoded (a quarter smaller, and images do not
+  compress further)
+- other strings are compressed (zlib, or zstd when
+  ARTIFACT_PAYLOAD_COMPRESSION=zstd and zstandard is installed)
+
+Blobs are reference counted. insert_artifacts adds the references of its
+rows in the same transaction; artifact compaction inlines the blobs into the
+archive and releases them, deleting blobs no artifact references any more.
+The row's blob_hashes column lists its references, so a payload that merely
+looks like a reference is never resolved or counted.
+"""
+
+import base64
+import binascii
+import hashlib
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import AIPayloadBlob, compress_payload, decompress_payload, payload_codec
+
+BLOB_KEY = "$blob"
+
+
+def extract_blobs(payload: Any, blobs: dict[str, str], min_bytes: Optional[int] = None) -> Any:
+    """
+    Replace long strings in a JSON value with blob references.
+
+    Args:
+        payload: JSON value (not modified)
+        blobs: Filled with the extracted strings by hash
+        min_bytes: Minimum string length to extract (default: ARTIFACT_BLOB_MIN_BYTES, 0 disables)
+
+    Returns:
+        The value with references, or payload itself if nothing was extracted
+    """
+    min_bytes = settings.ARTIFACT_BLOB_MIN_BYTES if min_bytes is None else min_bytes
+    if not min_bytes:
+        return payload
+    if isinstance(payload, str):
+        if len(payload) < min_bytes:
+            return payload
+        key = hashlib.sha256(payload.encode()).hexdigest()
+        blobs[key] = payload
+        return {BLOB_KEY: key}
+    if isinstance(payload, dict):
+        items = {key: extract_blobs(value, blobs, min_bytes) for key, value in payload.items()}
+        return payload if all(items[key] is value for key, value in payload.items()) else items
+    if isinstance(payload, list):
+        values = [extract_blobs(value, blobs, min_bytes) for value in payload]
+        return payload if all(new is old for new, old in zip(values, payload)) else values
+    return payload
+
+
+def resolve_blobs(payload: Any, blobs: dict[str, str]) -> Any:
+    """Copy of a JSON value with the references to the given blobs replaced by their strings."""
+    if isinstance(payload, dict):
+        if len(payload) == 1 and payload.get(BLOB_KEY) in blobs:
+            return blobs[payload[BLOB_KEY]]
+        return {key: resolve_blobs(value, blobs) for key, value in payload.items()}
+    if isinstance(payload, list):
+        return [resolve_blobs(value, blobs) for value in payload]
+    return payload
+
+
+def blob_hashes(value: Optional[str]) -> list[str]:
+    """Hashes of an AIArtifact.blob_hashes value."""
+    return value.split() if value else []
+
+
+def encode_blob(value: str) -> tuple[str, bytes]:
+    """Codec and stored bytes of a blob string."""
+    try:
+        decoded = base64.b64decode(value, validate=True)
+        if base64.b64encode(decoded).decode() == value:
+            return "base64", decoded
+    except (binascii.Error, ValueError):
+        pass
+    return payload_codec(), compress_payload(value.encode())
+
+
+def decode_blob(codec: str, data: bytes) -> str:
+    """The string of a stored blob."""
+    if codec == "base64":
+        return base64.b64encode(data).decode()
+    return decompress_payload(data).decode()
+
+
+def store_blobs(db: Session, rows: list[dict]) -> None:
+    """
+    Store the blobs of artifact rows (artifact_row's payload_blobs) and count their references.
+
+    Runs in the caller's transaction, so references are counted exactly when
+    the rows are inserted. Only blobs not stored yet are encoded.
+    """
+    counts, values = Counter(), {}
+    for row in rows:
+        blobs = row.get("payload_blobs") or {}
+        counts.update(blobs.keys())
+        values.update(blobs)
+    if not counts:
+        return
+
+    # Sorted, so concurrent writers lock shared blobs in the same order
+    missing = []
+    for key in sorted(counts):
+        result = db.execute(
+            update(AIPayloadBlob).where(AIPayloadBlob.hash == key).values(refs=AIPayloadBlob.refs + counts[key])
+        )
+        if result.rowcount == 0:
+            missing.append(key)
+    if not missing:
+        return
+
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(AIPayloadBlob)
+    # Another writer may insert the same blob first
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AIPayloadBlob.hash], set_={"refs": AIPayloadBlob.refs + stmt.excluded.refs}
+    )
+    blob_rows = []
+    for key in missing:
+        codec, data = encode_blob(values[key])
+        blob_rows.append({"hash": key, "codec": codec, "size": len(values[key]), "data": data, "refs": counts[key]})
+    db.execute(stmt, blob_rows)
+
+
+def release_blobs(db: Session, hash_lists: Iterable[Optional[str]]) -> int:
+    """
+    Drop references (AIArtifact.blob_hashes values) and delete blobs no longer referenced.
+
+    Runs in the caller's transaction.
+
+    Returns:
+        Number of blobs deleted
+    """
+    counts = Counter(key for value in hash_lists for key in blob_hashes(value))
+    if not counts:
+        return 0
+    for key in sorted(counts):
+        db.execute(
+            update(AIPayloadBlob).where(AIPayloadBlob.hash == key).values(refs=AIPayloadBlob.refs - counts[key])
+        )
+    result = db.execute(
+        delete(AIPayloadBlob).where(AIPayloadBlob.hash.in_(list(counts)), AIPayloadBlob.refs <= 0)
+    )
+    return result.rowcount
+
+
+def _load_query(hashes: list[str]):
+    return select(AIPayloadBlob.hash, AIPayloadBlob.codec, AIPayloadBlob.data).where(AIPayloadBlob.hash.in_(hashes))
+
+
+def load_blobs(db: Session, hashes: Iterable[str]) -> dict[str, str]:
+    """Strings of stored blobs by hash (missing blobs are left out)."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return {}
+    return {key: decode_blob(codec, data) for key, codec, data in db.execute(_load_query(hashes))}
+
+
+async def load_blobs_async(db: AsyncSession, hashes: Iterable[str]) -> dict[str, str]:
+    """Async version of load_blobs."""
+    hashes = list(set(hashes))
+    if not hashes:
+        return {}
+    return {key: decode_blob(codec, data) for key, codec, data in await db.execute(_load_query(hashes))}
+
+
+def restore_blobs(record: dict, blobs: dict[str, str]) -> dict:
+    """Fill an artifact_to_dict record's blob references from loaded blobs."""
+    if blobs:
+        record["input_payload"] = resolve_blobs(record["input_payload"], blobs)
+        record["output_payload"] = resolve_blobs(record["output_payload"], blobs)
+    return record
@@ -488,3 +488,39 @@ def process_receipt(image_path: str, options: Optional[Dict] = None) -> Extracti
     logger.info(f"Receipt processing complete with confidence {result.overall_confidence:.2f}")
 
     return result
+
+
+def _to_float(amount) -> Optional[float]:
+    try:
+        return float(amount) if amount else None
+    except (ValueError, TypeError):
+        return None
+
+
+def flatten_extraction_result(result: ExtractionResult) -> Dict:
+    """
+    Convert an ExtractionResult to the flat receipt format (items, total,
+    merchant, date) used by the extract-receipt endpoint and receipt jobs.
+    """
+    items = []
+    for li in result.line_items:
+        price = None
+        if li.total_price and li.total_price.amount:
+            price = _to_float(li.total_price.amount)
+        elif li.unit_price and li.unit_price.amount:
+            price = _to_float(li.unit_price.amount)
+
+        items.append({
+            "name": li.parsed_name or li.raw_text,
+            "quantity": li.quantity or 1.0,
+            "unit": li.unit,
+            "price": price,
+            "confidence": li.confidence,
+        })
+
+    return {
+        "items": items,
+        "total": _to_float(result.total.amount) if result.total else None,
+        "merchant": result.merchant.name if result.merchant else None,
+        "date": result.date.value if result.date else None,
+    }
@@ -0,0 +1,223 @@
+"""
+Fair scheduling for the ai_jobs queue.
+
+Decides which queued job a worker claims next:
+
+Only queued jobs that are claimable now are considered: jobs waiting out a
+retry backoff (next_attempt_at) or past their deadline (deadline_at) are not.
+
+1. Strict priority: only jobs at the highest queued priority are considered.
+2. Per-tenant concurrency caps: tenants already running JOB_TENANT_CONCURRENCY
+   jobs are skipped until one finishes.
+3. Weighted fair queuing: the tenant with the least recent service relative
+   to its weight goes next, then, within that tenant, the feature with the
+   least service relative to its weight. Service is the number of running
+   jobs plus jobs started within the fairness window, so one tenant's backlog
+   of 500 jobs waits behind other tenants' first jobs.
+
+All state lives in the ai_jobs table, so decisions are consistent across
+worker processes. The cap is checked before the atomic claim rather than
+inside it, so concurrent workers may briefly exceed it by one job each.
+
+On PostgreSQL the candidate rows are locked with FOR UPDATE SKIP LOCKED, so
+concurrent workers pick different jobs instead of racing for the same one.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import AIJob, JobStatus
+
+logger = logging.getLogger("grocery-planner-ai.scheduler")
+
+
+def claimable(now: datetime) -> tuple:
+    """Filters for queued jobs a worker may claim at `now`."""
+    return (
+        AIJob.status == JobStatus.QUEUED,
+        or_(AIJob.next_attempt_at.is_(None), AIJob.next_attempt_at <= now),
+        or_(AIJob.deadline_at.is_(None), AIJob.deadline_at > now),
+    )
+
+
+class FairScheduler:
+    """
+    Orders queued jobs by priority, tenant caps and weighted fair share.
+
+    Args:
+        tenant_concurrency: Maximum running jobs per tenant (0 for no cap)
+        tenant_weights: Relative share per tenant (default 1)
+        feature_weights: Relative share per feature within a tenant (default 1)
+        fairness_window: Seconds of recent job starts counted as service
+    """
+
+    def __init__(
+        self,
+        tenant_concurrency: int = 4,
+        tenant_weights: Optional[dict[str, int]] = None,
+        feature_weights: Optional[dict[str, int]] = None,
+        fairness_window: int = 300,
+    ):
+        self.tenant_concurrency = tenant_concurrency
+        self.tenant_weights = tenant_weights or {}
+        self.feature_weights = feature_weights or {}
+        self.fairness_window = fairness_window
+
+    def _service(self, db: Session, now: datetime) -> tuple[dict[str, int], dict[tuple[str, str], int], dict[str, int]]:
+        """Recent service per tenant and per (tenant, feature), plus running jobs per tenant."""
+        since = now - timedelta(seconds=self.fairness_window)
+        rows = db.query(
+            AIJob.tenant_id, AIJob.feature, AIJob.status, func.count(AIJob.id)
+        ).filter(
+            or_(AIJob.status == JobStatus.RUNNING, AIJob.started_at >= since)
+        ).group_by(AIJob.tenant_id, AIJob.feature, AIJob.status).all()
+
+        tenant_service: dict[str, int] = defaultdict(int)
+        flow_service: dict[tuple[str, str], int] = defaultdict(int)
+        tenant_running: dict[str, int] = defaultdict(int)
+        for tenant_id, feature, status, count in rows:
+            tenant_service[tenant_id] += count
+            flow_service[(tenant_id, feature)] += count
+            if status == JobStatus.RUNNING:
+                tenant_running[tenant_id] += count
+        return tenant_service, flow_service, tenant_running
+
+    def next_flow(self, db: Session, features: Optional[list[str]] = None) -> Optional[tuple[str, str]]:
+        """
+        Choose the (tenant_id, feature) flow to serve next.
+
+        Args:
+            db: Database session
+            features: Only consider these features (None for any)
+
+        Returns:
+            The flow to claim from, or None if nothing is eligible
+        """
+        now = datetime.utcnow()
+        query = db.query(
+            AIJob.tenant_id, AIJob.feature, func.max(AIJob.priority), func.min(AIJob.created_at)
+        ).filter(*claimable(now))
+        if features is not None:
+            query = query.filter(AIJob.feature.in_(features))
+        heads = query.group_by(AIJob.tenant_id, AIJob.feature).all()
+        if not heads:
+            return None
+
+        tenant_service, flow_service, tenant_running = self._service(db, now)
+        if self.tenant_concurrency > 0:
+            heads = [h for h in heads if tenant_running[h[0]] < self.tenant_concurrency]
+        if not heads:
+            return None
+
+        top_priority = max(h[2] or 0 for h in heads)
+        heads = [h for h in heads if (h[2] or 0) == top_priority]
+
+        def tenant_key(head):
+            tenant_id, _, _, oldest = head
+            return (tenant_service[tenant_id] / self.tenant_weights.get(tenant_id, 1), oldest)
+
+        tenant_id = min(heads, key=tenant_key)[0]
+
+        def feature_key(head):
+            _, feature, _, oldest = head
+            return (flow_service[(tenant_id, feature)] / self.feature_weights.get(feature, 1), oldest)
+
+        feature = min((h for h in heads if h[0] == tenant_id), key=feature_key)[1]
+        return tenant_id, feature
+
+    def candidates(
+        self,
+        db: Session,
+        features: Optional[list[str]] = None,
+        limit: int = 10,
+        skip_locked: bool = False,
+    ) -> list[str]:
+        """
+        Queued job IDs to try claiming, best first.
+
+        With skip_locked, the rows are locked until the transaction ends and
+        rows locked by other transactions are skipped (PostgreSQL only).
+        """
+        flow = self.next_flow(db, features)
+        if flow is None:
+            return []
+        tenant_id, feature = flow
+        query = db.query(AIJob.id).filter(
+            *claimable(datetime.utcnow()),
+            AIJob.tenant_id == tenant_id,
+            AIJob.feature == feature,
+        ).order_by(AIJob.priority.desc(), AIJob.created_at).limit(limit)
+        if skip_locked:
+            query = query.with_for_update(skip_locked=True)
+        return [row.id for row in query]
+
+    def snapshot(self, db: Session) -> dict[str, Any]:
+        """
+        Scheduler state for metrics: queue depth, running jobs and wait times.
+
+        Wait times are in seconds; oldest_wait_s is how long the oldest queued
+        job has waited, avg_wait_s the mean queue time of jobs started within
+        the fairness window. retry_backoff counts queued jobs waiting to retry.
+        """
+        now = datetime.utcnow()
+        since = now - timedelta(seconds=self.fairness_window)
+
+        def empty():
+            return {"queued": 0, "running": 0, "oldest_wait_s": 0.0, "avg_wait_s": None}
+
+        tenants: dict[str, dict[str, Any]] = defaultdict(empty)
+        features: dict[str, dict[str, Any]] = defaultdict(empty)
+
+        for tenant_id, feature, status, count, oldest in db.query(
+            AIJob.tenant_id, AIJob.feature, AIJob.status, func.count(AIJob.id), func.min(AIJob.created_at)
+        ).filter(
+            AIJob.status.in_([JobStatus.QUEUED, JobStatus.RUNNING])
+        ).group_by(AIJob.tenant_id, AIJob.feature, AIJob.status):
+            for stats in (tenants[tenant_id], features[feature]):
+                if status == JobStatus.QUEUED:
+                    stats["queued"] += count
+                    wait = round((now - oldest).total_seconds(), 3)
+                    stats["oldest_wait_s"] = max(stats["oldest_wait_s"], wait)
+                else:
+                    stats["running"] += count
+
+        waits: dict[str, list[float]] = defaultdict(list)
+        feature_waits: dict[str, list[float]] = defaultdict(list)
+        for tenant_id, feature, created_at, started_at in db.query(
+            AIJob.tenant_id, AIJob.feature, AIJob.created_at, AIJob.started_at
+        ).filter(AIJob.started_at >= since):
+            wait = (started_at - created_at).total_seconds()
+            waits[tenant_id].append(wait)
+            feature_waits[feature].append(wait)
+        for groups, samples in ((tenants, waits), (features, feature_waits)):
+            for key, values in samples.items():
+                groups[key]["avg_wait_s"] = round(sum(values) / len(values), 3)
+
+        for tenant_id, stats in tenants.items():
+            stats["at_cap"] = 0 < self.tenant_concurrency <= stats["running"]
+
+        return {
+            "queue_depth": sum(t["queued"] for t in tenants.values()),
+            "running": sum(t["running"] for t in tenants.values()),
+            "retry_backoff": db.query(func.count(AIJob.id)).filter(
+                AIJob.status == JobStatus.QUEUED, AIJob.next_attempt_at > now
+            ).scalar(),
+            "tenant_concurrency": self.tenant_concurrency,
+            "fairness_window_s": self.fairness_window,
+            "tenants": dict(tenants),
+            "features": dict(features),
+        }
+
+
+job_scheduler = FairScheduler(
+    tenant_concurrency=settings.JOB_TENANT_CONCURRENCY,
+    tenant_weights=settings.JOB_TENANT_WEIGHTS,
+    feature_weights=settings.JOB_FEATURE_WEIGHTS,
+    fairness_window=settings.JOB_FAIRNESS_WINDOW,
+)
@@ -163,6 +163,11 @@ class JobSubmitRequest(BaseModel):
     payload: Dict[str, Any] = Field(..., description="Job input payload")
     model_id: Optional[str] = Field(default=None, description="Specific model to use")
     model_version: Optional[str] = Field(default=None, description="Specific model version")
+    priority: int = Field(default=0, ge=-10, le=10, description="Scheduling priority (higher runs first)")
+    webhook_url: Optional[str] = Field(default=None, max_length=512, pattern=r"^https?://", description="Public or allowlisted URL notified when the job succeeds, fails or is cancelled")
+    idempotency_key: Optional[str] = Field(default=None, max_length=128, description="Client key; resubmitting with the same key returns the same job")
+    dedupe: bool = Field(default=True, description="Attach to an identical queued, running or recently succeeded job")
+    deadline_seconds: Optional[int] = Field(default=None, ge=1, description="Expire the job unrun if it has not started within this many seconds")
 
 
 class JobStatusResponse(BaseModel):
@@ -172,7 +177,7 @@ class JobStatusResponse(BaseModel):
     tenant_id: Optional[str] = Field(default=None, description="Tenant ID")
     user_id: Optional[str] = Field(default=None, description="User who submitted")
     feature: str = Field(..., description="Feature name")
-    status: str = Field(..., description="Job status: queued, running, succeeded, failed")
+    status: str = Field(..., description="Job status: queued, running, succeeded, failed, cancelled")
     input_payload: Optional[Dict[str, Any]] = Field(default=None, description="Job input")
     output_payload: Optional[Dict[str, Any]] = Field(default=None, description="Job output (if completed)")
     error_message: Optional[str] = Field(default=None, description="Error message (if failed)")
@@ -183,17 +188,78 @@ class JobStatusResponse(BaseModel):
     finished_at: Optional[str] = Field(default=None, description="Completion timestamp")
     latency_ms: Optional[float] = Field(default=None, description="Execution latency in ms")
     cost: Optional[float] = Field(default=None, description="Operation cost")
+    attempts: Optional[int] = Field(default=None, description="Times the job has been claimed by a worker")
+    priority: Optional[int] = Field(default=None, description="Scheduling priority")
+    deduplicated: Optional[bool] = Field(default=None, description="Submission attached to an existing job")
+    progress: Optional[float] = Field(default=None, description="Progress percentage (0-100) for chunked jobs")
+    output_size: Optional[int] = Field(default=None, description="Serialized output size in bytes")
+    output_offloaded: Optional[bool] = Field(default=None, description="Output is too large to inline; fetch it from /api/v1/jobs/{id}/output")
+    next_attempt_at: Optional[str] = Field(default=None, description="Earliest retry time (if waiting to retry)")
+    deadline_at: Optional[str] = Field(default=None, description="Time after which the job expires if not yet run")
 
     class Config:
         populate_by_name = True
 
 
+class BulkJobItem(BaseModel):
+    """A single job in a bulk submission."""
+    feature: str = Field(..., description="Feature name for the job")
+    payload: Dict[str, Any] = Field(..., description="Job input payload")
+    model_id: Optional[str] = Field(default=None, description="Specific model to use")
+    model_version: Optional[str] = Field(default=None, description="Specific model version")
+    priority: int = Field(default=0, ge=-10, le=10, description="Scheduling priority (higher runs first)")
+    webhook_url: Optional[str] = Field(default=None, max_length=512, pattern=r"^https?://", description="Public or allowlisted URL notified when the job succeeds, fails or is cancelled")
+    deadline_seconds: Optional[int] = Field(default=None, ge=1, description="Expire the job unrun if it has not started within this many seconds")
+
+
+class BulkJobSubmitRequest(BaseModel):
+    """Request to submit many background jobs in one transaction."""
+    tenant_id: str = Field(..., description="Tenant ID for multi-tenancy")
+    user_id: str = Field(..., description="User ID who submitted the jobs")
+    jobs: List[BulkJobItem] = Field(..., min_length=1, max_length=500, description="Jobs to submit")
+
+
+class JobStatusSummary(BaseModel):
+    """Compact job status record (no payloads)."""
+    job_id: str = Field(..., description="Job ID")
+    feature: str = Field(..., description="Feature name")
+    status: str = Field(..., description="Job status: queued, running, succeeded, failed, cancelled")
+    priority: Optional[int] = Field(default=None, description="Scheduling priority")
+    attempts: Optional[int] = Field(default=None, description="Times the job has been claimed by a worker")
+    progress: Optional[float] = Field(default=None, description="Progress percentage (0-100) for chunked jobs")
+    error_message: Optional[str] = Field(default=None, description="Error message (if failed)")
+    created_at: Optional[str] = Field(default=None, description="Creation timestamp")
+    started_at: Optional[str] = Field(default=None, description="Start timestamp")
+    finished_at: Optional[str] = Field(default=None, description="Completion timestamp")
+
+
+class BulkJobSubmitResponse(BaseModel):
+    """Response for a bulk job submission, in request order."""
+    jobs: List[JobStatusSummary] = Field(..., description="Submitted jobs")
+
+
+class BulkJobStatusRequest(BaseModel):
+    """Request for the status of many jobs."""
+    tenant_id: str = Field(..., description="Tenant ID for access control")
+    job_ids: List[str] = Field(..., min_length=1, max_length=1000, description="Job IDs to look up")
+
+
+class BulkJobStatusResponse(BaseModel):
+    """Status records for the requested jobs."""
+    jobs: List[JobStatusSummary] = Field(..., description="Status of each job found")
+    missing: List[str] = Field(default_factory=list, description="Requested IDs not found for this tenant")
+
+
 class JobListResponse(BaseModel):
     """Response containing a list of jobs."""
     jobs: List[Dict[str, Any]] = Field(..., description="List of job records")
-    total: int = Field(..., description="Total jobs returned")
+    total: int = Field(..., description="Jobs on this page")
     limit: int = Field(..., description="Limit used")
     offset: int = Field(..., description="Offset used")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page (None on the last page)")
+    approximate_total: Optional[int] = Field(
+        None, description="Matching jobs counted up to 10000 (only with count=true)"
+    )
 
 
 # =============================================================================
@@ -217,14 +283,21 @@ class ArtifactResponse(BaseModel):
     cost: Optional[float] = Field(default=None, description="Cost")
     job_id: Optional[str] = Field(default=None, description="Associated job ID")
     created_at: Optional[str] = Field(default=None, description="Creation timestamp")
+    archived: bool = Field(default=False, description="Payloads were moved to the artifact archive")
+    input_hash: Optional[str] = Field(default=None, description="SHA-256 of the canonical input JSON")
+    capture: Optional[str] = Field(default=None, description="Payload capture: full, truncated or hash (not stored)")
 
 
 class ArtifactListResponse(BaseModel):
     """Response containing a list of artifacts."""
     artifacts: List[Dict[str, Any]] = Field(..., description="List of artifact records")
-    total: int = Field(..., description="Total artifacts returned")
+    total: int = Field(..., description="Artifacts on this page")
     limit: int = Field(..., description="Limit used")
     offset: int = Field(..., description="Offset used")
+    next_cursor: Optional[str] = Field(None, description="Cursor for the next page (None on the last page)")
+    approximate_total: Optional[int] = Field(
+        None, description="Matching artifacts counted up to 10000 (only with count=true)"
+    )
 
 
 # =============================================================================
@@ -366,6 +439,16 @@ class MealOptimizationRequestPayload(BaseModel):
     recipes: list[OptimizationRecipe] = Field(default_factory=list)
     constraints: OptimizationConstraints = Field(default_factory=OptimizationConstraints)
     weights: OptimizationWeights = Field(default_factory=OptimizationWeights)
+    solver: str = Field(default="z3", description="Solver mode: 'z3' (optimal), 'heuristic' (fast, feasible) or 'portfolio' (parallel race)")
+    refine: bool = Field(default=False, description="With the heuristic solver, keep improving the plan with Z3 in a background job")
+
+class MealOptimizationBatchProblem(MealOptimizationRequestPayload):
+    household_id: str = Field(..., description="Household (account) the plan is for")
+
+class BatchMealOptimizationRequestPayload(BaseModel):
+    problems: list[MealOptimizationBatchProblem] = Field(..., description="Problems to solve, one per household (at most MEAL_PLAN_BATCH_MAX_PROBLEMS)")
+    recipes: list[OptimizationRecipe] = Field(default_factory=list, description="Shared recipe library for problems that omit recipes")
+    max_concurrency: int = Field(default=4, ge=1, le=16, description="Maximum problems solved concurrently")
 
 class MealPlanEntry(BaseModel):
     date: str = Field(..., description="ISO date string")
@@ -389,6 +472,11 @@ class OptimizationMetrics(BaseModel):
 class MealOptimizationResponsePayload(BaseModel):
     status: str = Field(...)
     solve_time_ms: int = Field(default=0)
+    objective_value: Optional[int] = Field(default=None, description="Objective value of the returned plan")
+    objective_bound: Optional[int] = Field(default=None, description="Upper bound on the optimal objective (heuristic solver)")
+    refinement_job_id: Optional[str] = Field(default=None, description="Background Z3 refinement job, if requested")
+    cached: bool = Field(default=False, description="Served from the solution cache")
+    portfolio: Optional[dict[str, Any]] = Field(default=None, description="Winning configuration and per-config statuses (portfolio solver)")
     meal_plan: list[MealPlanEntry] = Field(default_factory=list)
     shopping_list: list[ShoppingListItem] = Field(default_factory=list)
     metrics: OptimizationMetrics = Field(default_factory=OptimizationMetrics)
@@ -398,6 +486,7 @@ class QuickSuggestionRequestPayload(BaseModel):
     mode: str = Field(default="use_expiring", description="Suggestion mode")
     inventory: list[InventoryItem] = Field(default_factory=list)
     recipes: list[OptimizationRecipe] = Field(default_factory=list)
+    recipe_library_hash: Optional[str] = Field(default=None, description="Hash from a previous response; reuses the cached recipe library without rehashing, and lets recipes be omitted")
     limit: int = Field(default=5, ge=1, le=20)
 
 class SuggestionItem(BaseModel):
@@ -410,3 +499,4 @@ class SuggestionItem(BaseModel):
 
 class QuickSuggestionResponsePayload(BaseModel):
     suggestions: list[SuggestionItem] = Field(default_factory=list)
+    recipe_library_hash: Optional[str] = Field(default=None, description="Pass back to skip resending recipes")
@@ -0,0 +1,251 @@
+"""
+Solution cache for meal plan optimization.
+
+Households frequently resend byte-identical problems (e.g. reloading the planner
+page). Problems are canonicalized (recipes, inventory and constraints sorted,
+floats normalized) and hashed; the hash keys an in-memory LRU with TTL, optionally
+backed by a directory of JSON files so entries survive restarts. The directory
+is pruned of expired files, and of the oldest beyond MEAL_PLAN_CACHE_DISK_SIZE.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from config import settings
+
+logger = logging.getLogger("grocery-planner-ai.solution_cache")
+
+# Decimal places kept when normalizing floats for hashing
+FLOAT_PRECISION = 6
+
+
+def _normalize(value: Any) -> Any:
+    """Recursively normalize floats so 2, 2.0 and 2.0000000001 hash alike."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        rounded = round(value, FLOAT_PRECISION)
+        return int(rounded) if rounded.is_integer() else rounded
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def _sort_key(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def canonicalize_problem(problem: dict[str, Any]) -> dict[str, Any]:
+    """Return an order-independent, float-normalized copy of a problem."""
+    canonical = _normalize(problem)
+
+    recipes = []
+    for recipe in canonical.get("recipes", []):
+        recipe = dict(recipe)
+        recipe["ingredients"] = sorted(recipe.get("ingredients", []), key=_sort_key)
+        recipe["tags"] = sorted(recipe.get("tags", []))
+        recipes.append(recipe)
+    canonical["recipes"] = sorted(recipes, key=_sort_key)
+    canonical["inventory"] = sorted(canonical.get("inventory", []), key=_sort_key)
+
+    constraints = dict(canonical.get("constraints", {}))
+    for key in ("locked_meals", "excluded_recipes", "dietary"):
+        if key in constraints:
+            constraints[key] = sorted(constraints[key], key=_sort_key)
+    canonical["constraints"] = constraints
+
+    return canonical
+
+
+def problem_hash(problem: dict[str, Any], solver: str = "z3", timeout_ms: Optional[int] = None) -> str:
+    """Stable SHA-256 hash of the canonical problem for the given solver (and time budget, if given)."""
+    canonical = canonicalize_problem(problem)
+    key = {"solver": solver, "problem": canonical}
+    if timeout_ms is not None:
+        key["timeout_ms"] = timeout_ms
+    encoded = _sort_key(key)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def recipe_library_hash(recipes: list[dict[str, Any]]) -> str:
+    """Content hash of a recipe library (order-sensitive: row order breaks suggestion ties).
+
+    Keys shared RecipeLibrary and RecipeMatrix objects, and is returned to
+    suggestion clients so they can skip resending (and rehashing) the library.
+    """
+    return hashlib.blake2b(
+        json.dumps(recipes, separators=(",", ":"), default=str).encode(), digest_size=16
+    ).hexdigest()
+
+
+class SolutionCache:
+    """Thread-safe LRU cache with TTL and optional on-disk persistence.
+
+    Values are stored as JSON strings so every hit returns a fresh copy.
+    """
+
+    def __init__(
+        self, max_entries: int = 1024, ttl_seconds: float = 3600, disk_dir: str = "", max_disk_entries: int = 10000
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_files = 0
+        self._stats = {
+            "hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "disk_pruned": 0,
+        }
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._prune_disk(max_disk_entries)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[tuple[float, str]]:
+        try:
+            with open(self._disk_path(key)) as f:
+                record = json.load(f)
+            return record["stored_at"], record["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key: str, stored_at: float, value: str) -> None:
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            existed = os.path.exists(path)
+            with open(tmp_path, "w") as f:
+                json.dump({"stored_at": stored_at, "value": value}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to persist cache entry {key[:12]}: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_files += 0 if existed else 1
+            full = self._disk_files > self.max_disk_entries
+        if full:
+            # Prune below the cap so the directory is not rescanned on every write
+            self._prune_disk(self.max_disk_entries * 9 // 10)
+
+    def _remove_disk(self, key: str) -> None:
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            return
+        with self._disk_lock:
+            self._disk_files -= 1
+
+    def _prune_disk(self, keep: int) -> None:
+        """Delete expired cache files, then the oldest until at most `keep` remain."""
+        now = time.time()
+        with self._disk_lock:
+            try:
+                with os.scandir(self.disk_dir) as entries:
+                    files = sorted(
+                        (entry.stat().st_mtime, entry.path) for entry in entries if entry.name.endswith(".json")
+                    )
+            except OSError as e:
+                logger.warning(f"Failed to prune cache directory {self.disk_dir}: {e}")
+                return
+
+            excess = len(files) - keep
+            removed = 0
+            # Oldest first: stop at the first file that is neither expired nor over the cap
+            for index, (modified_at, path) in enumerate(files):
+                if index >= excess and now - modified_at <= self.ttl_seconds:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+            self._disk_files = len(files) - removed
+        if removed:
+            with self._lock:
+                self._stats["disk_pruned"] += removed
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """Return the cached value, or None on miss or expiry."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            from_disk = False
+            if entry is None and self.disk_dir:
+                entry = self._read_disk(key)
+                from_disk = entry is not None
+
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                self._entries.pop(key, None)
+                if self.disk_dir:
+                    self._remove_disk(key)
+                self._stats["expirations"] += 1
+                entry = None
+
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            if from_disk:
+                self._stats["disk_hits"] += 1
+                self._store(key, entry)
+            else:
+                self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return json.loads(entry[1])
+
+    def _store(self, key: str, entry: tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def set(self, key: str, value: dict[str, Any]) -> None:
+        """Store a JSON-serializable value."""
+        entry = (time.time(), json.dumps(value))
+        with self._lock:
+            self._store(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, *entry)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries and reset statistics."""
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Cache counters and hit rate for metrics."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "disk_files": self._disk_files if self.disk_dir else 0,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+meal_plan_cache = SolutionCache(
+    max_entries=settings.MEAL_PLAN_CACHE_SIZE,
+    ttl_seconds=settings.MEAL_PLAN_CACHE_TTL,
+    disk_dir=settings.MEAL_PLAN_CACHE_DIR,
+    max_disk_entries=settings.MEAL_PLAN_CACHE_DISK_SIZE,
+)
@@ -0,0 +1,174 @@
+"""
+Tests for artifact retention and archival.
+
+Tests cover:
+- Retention being opt-in
+- Per-feature retention and sampling of expired artifacts
+- Archive files and reading archived payloads back
+- Incremental vacuum of freed SQLite pages
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from artifact_retention import (
+    archive_path, compact_artifacts, incremental_vacuum, is_sampled, load_archived_artifact,
+    restore_archived_payloads, retention_enabled,
+)
+from artifacts import add_feedback, artifact_row, artifact_to_dict, insert_artifacts
+from config import settings
+from database import AIArtifact, Base
+from db_config import create_db_engine
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest.fixture
+def engine():
+    """Engine on a scratch SQLite database file with the current schema."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'retention.db')}")
+        Base.metadata.create_all(bind=engine)
+        yield engine
+        engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARTIFACT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "ARTIFACT_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {})
+    monkeypatch.setattr(settings, "ARTIFACT_ARCHIVE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES", {})
+    return tmp_path / "archive"
+
+
+def _insert(db, count, feature="categorization", age_days=40, status="success", notes=500):
+    rows = [
+        {
+            **artifact_row(
+                request_id=f"req_{feature}_{age_days}_{status}_{i}", tenant_id="tenant_1", feature=feature,
+                input_payload={"item_name": f"item {i}", "notes": "x" * notes},
+                output_payload={"category": "Dairy"}, status=status,
+            ),
+            "created_at": NOW - timedelta(days=age_days, minutes=i),
+        }
+        for i in range(count)
+    ]
+    insert_artifacts(db, rows)
+    return [row["id"] for row in rows]
+
+
+def test_expired_artifacts_are_archived_and_readable(db):
+    """Old artifacts lose their payloads in the database but keep them in the archive."""
+    old = _insert(db, 5)
+    recent = _insert(db, 3, age_days=2)
+
+    assert compact_artifacts(db, now=NOW, batch_size=2) == {"archived": 5, "deleted": 0}
+
+    artifacts = {a.id: a for a in db.query(AIArtifact)}
+    assert len(artifacts) == 8
+    for artifact_id in recent:
+        assert artifacts[artifact_id].archive_ref is None
+        assert json.loads(artifacts[artifact_id].input_payload)["item_name"]
+    for artifact_id in old:
+        artifact = artifacts[artifact_id]
+        assert artifact.archive_ref.startswith(f"{artifact.created_at:%Y/%m/%d}/artifacts-")
+        assert artifact.input_payload == "null" and artifact.output_payload is None
+
+        record = artifact_to_dict(artifact)
+        assert record["archived"] is True and record["input_payload"] is None
+        restored = restore_archived_payloads(record, artifact.archive_ref)
+        assert restored["input_payload"]["item_name"].startswith("item ")
+        assert restored["output_payload"] == {"category": "Dairy"}
+
+    # A second pass finds nothing left to do
+    assert compact_artifacts(db, now=NOW) == {"archived": 0, "deleted": 0}
+
+
+def test_sampling_keeps_errors_and_feedback(db, monkeypatch):
+    """Expired successes are sampled; errors and artifacts with feedback are always archived."""
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES", {"categorization": 0.1})
+    successes = _insert(db, 200)
+    errors = _insert(db, 20, status="error")
+    liked = successes[0] if not is_sampled(successes[0], 0.1) else next(
+        artifact_id for artifact_id in successes if not is_sampled(artifact_id, 0.1)
+    )
+    add_feedback(db, "tenant_1", "user_1", "thumbs_up", artifact_id=liked)
+
+    totals = compact_artifacts(db, now=NOW)
+
+    remaining = {a.id: a for a in db.query(AIArtifact)}
+    kept_successes = [artifact_id for artifact_id in successes if artifact_id in remaining]
+    assert set(errors) <= set(remaining)
+    assert liked in remaining
+    assert 5 <= len(kept_successes) <= 45
+    assert all(a.archive_ref for a in remaining.values())
+    assert totals == {"archived": len(remaining), "deleted": 220 - len(remaining)}
+
+
+def test_retention_is_per_feature(db, monkeypatch):
+    """Features with their own retention are compacted on their own schedule; 0 keeps payloads forever."""
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {"receipt_extraction": 0, "embedding": 7})
+    _insert(db, 2, feature="receipt_extraction", age_days=400)
+    _insert(db, 2, feature="embedding", age_days=10)
+    _insert(db, 2, feature="categorization", age_days=10)
+
+    assert compact_artifacts(db, now=NOW) == {"archived": 2, "deleted": 0}
+    archived = {a.feature for a in db.query(AIArtifact).filter(AIArtifact.archive_ref.isnot(None))}
+    assert archived == {"embedding"}
+
+
+def test_retention_is_opt_in(monkeypatch):
+    """Payloads are kept forever unless a retention period is configured for some feature."""
+    monkeypatch.setattr(settings, "ARTIFACT_RETENTION_DAYS", 0)
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {"receipt_extraction": 0})
+    assert not retention_enabled()
+
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {"receipt_extraction": 0, "embedding": 7})
+    assert retention_enabled()
+
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {})
+    monkeypatch.setattr(settings, "ARTIFACT_RETENTION_DAYS", 30)
+    assert retention_enabled()
+
+
+def test_archive_references_are_validated(archive_dir):
+    """Archive references cannot escape the archive directory; missing files read as None."""
+    with pytest.raises(ValueError):
+        archive_path("../../etc/passwd")
+    assert load_archived_artifact("2024/01/01/artifacts-0123456789abcdef.jsonl.gz", "art_1") is None
+
+
+def test_incremental_vacuum_returns_freed_pages(engine, db, monkeypatch):
+    """Pages of moved-out payloads are released to the OS on databases with incremental auto_vacuum."""
+    # Uncompressed inline payloads, as written before payload blobs
+    monkeypatch.setattr(settings, "ARTIFACT_BLOB_MIN_BYTES", 0)
+    monkeypatch.setattr(settings, "ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES", 0)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA auto_vacuum")).scalar() == 2  # INCREMENTAL
+    _insert(db, 500, notes=5000)  # payloads on overflow pages, as receipt images are
+
+    def page_count():
+        with engine.connect() as conn:
+            return conn.execute(text("PRAGMA page_count")).scalar()
+
+    pages = page_count()
+    compact_artifacts(db, now=NOW)
+    released = incremental_vacuum(engine, pages=0)
+
+    assert released > pages / 2
+    assert page_count() == pages - released
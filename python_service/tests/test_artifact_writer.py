@@ -0,0 +1,182 @@
+"""
+Tests for the batched artifact writer.
+
+Tests cover:
+- Batching by size and by flush interval
+- Back-pressure when the buffer is full
+- Direct writes when the writer is not running
+- Flush on app shutdown
+- Isolation of rows that fail to insert
+"""
+
+import asyncio
+import os
+import tempfile
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from artifact_writer import ArtifactWriter
+from artifacts import artifact_row
+from database import AIArtifact, AIPayloadBlob, Base, get_engine, get_session_local, reset_engine
+from main import app
+
+# Create a temporary database file for tests
+_test_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["AI_DATABASE_URL"] = f"sqlite:///{_test_db_file.name}"
+
+
+@pytest.fixture(scope="function")
+def db():
+    """Create a fresh database and session for each test."""
+    reset_engine()
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = get_session_local()()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def _fields(i=0):
+    return {
+        "request_id": f"req_{i}",
+        "tenant_id": "tenant_artifacts",
+        "user_id": "user_1",
+        "feature": "categorization",
+        "input_payload": {"item_name": f"item {i}"},
+        "output_payload": {"category": "Produce"},
+        "latency_ms": 1.5,
+    }
+
+
+@pytest.mark.asyncio
+async def test_rows_are_written_in_batches(db):
+    """Rows arriving together are inserted with one statement per batch."""
+    inserts = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO ai_artifacts"):
+            inserts.append(len(parameters) if executemany else 1)
+
+    writer = ArtifactWriter(batch_size=10, flush_ms=50, buffer_size=100)
+    event.listen(get_engine(), "before_cursor_execute", record)
+    try:
+        writer.start()
+        ids = await asyncio.gather(*(writer.record_artifact(**_fields(i)) for i in range(25)))
+        await writer.stop()
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record)
+
+    assert inserts == [10, 10, 5]
+    assert db.query(AIArtifact).count() == 25
+    assert {a.id for a in db.query(AIArtifact)} == set(ids)
+    assert writer.stats()["written"] == 25
+    assert writer.stats()["batches"] == 3
+
+
+@pytest.mark.asyncio
+async def test_partial_batch_flushes_after_interval(db):
+    """A lone row is written once the flush interval elapses, without waiting for stop."""
+    writer = ArtifactWriter(batch_size=100, flush_ms=20)
+    writer.start()
+    try:
+        artifact_id = await writer.record_artifact(**_fields())
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if writer.written:
+                break
+        assert db.get(AIArtifact, artifact_id) is not None
+    finally:
+        await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_applies_back_pressure(db):
+    """Recording waits while the buffer is full and resumes once the writer drains it."""
+    release = threading.Event()
+    writer = ArtifactWriter(batch_size=1, flush_ms=10, buffer_size=2)
+    write = writer._write
+
+    def slow_write(rows):
+        release.wait(timeout=5)
+        write(rows)
+
+    writer._write = slow_write
+    writer.start()
+    try:
+        # One row is being written, two fill the buffer
+        for i in range(3):
+            await writer.record_artifact(**_fields(i))
+            await asyncio.sleep(0.01)
+
+        blocked = asyncio.create_task(writer.record_artifact(**_fields(3)))
+        await asyncio.sleep(0.1)
+        assert not blocked.done()
+        assert writer.stats()["buffered"] == 2
+
+        release.set()
+        await asyncio.wait_for(blocked, timeout=5)
+    finally:
+        release.set()
+        await writer.stop()
+
+    assert db.query(AIArtifact).count() == 4
+
+
+@pytest.mark.asyncio
+async def test_writes_directly_when_not_running(db):
+    """Without a running writer, artifacts are written before record_artifact returns."""
+    writer = ArtifactWriter()
+
+    artifact_id = await writer.record_artifact(**_fields())
+
+    assert db.get(AIArtifact, artifact_id).request_id == "req_0"
+
+
+def test_buffered_artifacts_are_flushed_on_shutdown(db):
+    """Artifacts recorded by requests are all written when the app shuts down."""
+    with TestClient(app) as client:
+        for i in range(5):
+            response = client.post("/api/v1/categorize", json={
+                "request_id": f"req_shutdown_{i}",
+                "tenant_id": "tenant_artifacts",
+                "user_id": "user_1",
+                "feature": "categorization",
+                "payload": {"item_name": "Milk", "candidate_labels": ["Dairy", "Produce"]},
+            })
+            assert response.status_code == 200
+
+    db.expire_all()
+    assert db.query(AIArtifact).filter(AIArtifact.tenant_id == "tenant_artifacts").count() == 5
+
+
+def test_failed_batch_is_retried_row_by_row(db):
+    """A bad row does not lose the rest of its batch."""
+    good, bad = artifact_row(**_fields(1)), artifact_row(**_fields(2))
+    duplicate = {**artifact_row(**_fields(3)), "id": good["id"]}
+    bad["request_id"] = None  # NOT NULL
+
+    writer = ArtifactWriter()
+    writer._write([good, bad, duplicate])
+
+    assert [a.id for a in db.query(AIArtifact)] == [good["id"]]
+    assert writer.written == 1
+    assert writer.failed == 2
+
+
+def test_failed_batch_counts_blob_references_once(db):
+    """Blob references of a failed batch are rolled back; each written row counts once."""
+    image = "QUJD" * 2000  # base64, stored as a payload blob
+    good, other = (artifact_row(**{**_fields(i), "input_payload": {"image_base64": image}}) for i in (1, 2))
+    duplicate = {**artifact_row(**{**_fields(3), "input_payload": {"image_base64": image}}), "id": good["id"]}
+
+    writer = ArtifactWriter()
+    writer._write([good, other, duplicate])
+
+    assert writer.written == 2
+    assert writer.failed == 1
+    assert [blob.refs for blob in db.query(AIPayloadBlob)] == [2]
@@ -0,0 +1,120 @@
+"""
+Tests for artifact capture policies.
+
+Tests cover:
+- Policy parsing
+- Full, error-only, sampled and truncated capture of artifact rows
+- Input hashes recorded for every artifact
+"""
+
+import json
+
+import pytest
+
+from artifacts import artifact_row
+from capture_policy import (
+    CAPTURE_FULL, CAPTURE_HASH, CAPTURE_TRUNCATED, CapturePolicy, canonical_json, capture_policy,
+    parse_capture_policy, payload_hash, truncate_strings,
+)
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def policies(monkeypatch):
+    """Capture policies per feature, reset after each test."""
+    configured = {}
+    monkeypatch.setattr(settings, "ARTIFACT_CAPTURE_POLICY", "always")
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_CAPTURE_POLICIES", configured)
+    return configured
+
+
+def _row(feature="categorization", status="success", **fields):
+    return artifact_row(
+        request_id="req_1", tenant_id="tenant_1", feature=feature, status=status,
+        input_payload=fields.pop("input_payload", {"item_name": "Milk", "candidate_labels": ["Dairy"]}),
+        output_payload=fields.pop("output_payload", {"category": "Dairy"}),
+        **fields,
+    )
+
+
+def test_parse_capture_policy():
+    """Policies parse with their arguments; anything else is rejected."""
+    assert parse_capture_policy("always") == CapturePolicy("always")
+    assert parse_capture_policy("errors") == CapturePolicy("errors")
+    assert parse_capture_policy(" sample:0.05 ") == CapturePolicy("sample", rate=0.05)
+    assert parse_capture_policy("truncate:256") == CapturePolicy("truncate", max_chars=256)
+    for value in ("never", "sample:2", "sample:", "truncate:0", "truncate:x"):
+        with pytest.raises(ValueError):
+            parse_capture_policy(value)
+
+
+def test_invalid_configured_policy_captures_everything(policies):
+    """A misconfigured policy never fails the AI call; it falls back to always."""
+    policies["categorization"] = "sometimes"
+    assert capture_policy("categorization") == CapturePolicy()
+    assert _row()["capture"] == CAPTURE_FULL
+
+
+def test_always_captures_payloads_and_hash():
+    """By default payloads are stored, along with the hash of the canonical input."""
+    row = _row(input_payload={"b": 1, "a": [1, 2]})
+
+    assert row["capture"] == CAPTURE_FULL
+    assert json.loads(row["input_payload"]) == {"a": [1, 2], "b": 1}
+    assert json.loads(row["output_payload"]) == {"category": "Dairy"}
+    assert row["input_hash"] == payload_hash(canonical_json({"a": [1, 2], "b": 1}))
+    # Key order does not change the hash
+    assert _row(input_payload={"a": [1, 2], "b": 1})["input_hash"] == row["input_hash"]
+
+
+def test_errors_policy_keeps_only_error_payloads(policies):
+    """With errors, successful calls keep only their metadata and input hash."""
+    policies["categorization"] = "errors"
+
+    success = _row(latency_ms=12.5)
+    assert success["capture"] == CAPTURE_HASH
+    assert success["input_payload"] == "null" and success["output_payload"] is None
+    assert success["input_hash"] and success["latency_ms"] == 12.5
+
+    error = _row(status="error", error_message="boom", output_payload=None)
+    assert error["capture"] == CAPTURE_FULL
+    assert json.loads(error["input_payload"])["item_name"] == "Milk"
+
+    # Other features keep the default
+    assert _row(feature="receipt_extraction")["capture"] == CAPTURE_FULL
+
+
+def test_sample_policy_captures_a_fraction_of_successes(policies):
+    """With sample:<rate>, about that fraction of successes keep their payloads; errors always do."""
+    policies["categorization"] = "sample:0.1"
+
+    captures = [_row()["capture"] for _ in range(2000)]
+    assert 120 <= captures.count(CAPTURE_FULL) <= 280
+    assert set(captures) == {CAPTURE_FULL, CAPTURE_HASH}
+    assert all(_row(status="error")["capture"] == CAPTURE_FULL for _ in range(50))
+
+
+def test_truncate_policy_shortens_long_strings(policies):
+    """With truncate:<chars>, long strings such as base64 images are cut; the structure remains."""
+    policies["receipt_extraction"] = "truncate:16"
+    image = "A" * 100_000
+    row = _row(
+        feature="receipt_extraction",
+        input_payload={"image_base64": image, "store": "Corner Shop"},
+        output_payload={"items": [{"name": "Milk", "note": "n" * 40}]},
+    )
+
+    stored = json.loads(row["input_payload"])
+    assert row["capture"] == CAPTURE_TRUNCATED
+    assert stored["store"] == "Corner Shop"
+    assert stored["image_base64"] == "A" * 16 + "...[truncated 99984 chars]"
+    assert json.loads(row["output_payload"])["items"][0]["name"] == "Milk"
+    # The hash is of the full input
+    assert row["input_hash"] == payload_hash(canonical_json({"image_base64": image, "store": "Corner Shop"}))
+    assert len(row["input_payload"]) < 100
+
+
+def test_truncate_strings_leaves_other_values():
+    """Numbers, booleans, None and short strings are kept as they are."""
+    payload = {"a": [1, 2.5, True, None, "short"], "b": {"c": "x" * 10}}
+    assert truncate_strings(payload, 5) == {"a": [1, 2.5, True, None, "short"], "b": {"c": "xxxxx...[truncated 5 chars]"}}
@@ -0,0 +1,182 @@
+"""
+Tests for the database schema.
+
+Tests cover:
+- Query plans of the tenant list queries
+- Keyset pagination
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.orm import sessionmaker
+
+from artifacts import artifact_row, insert_artifacts, list_artifact_summaries, list_artifacts
+from capture_policy import canonical_json, payload_hash
+from database import AIJob, Base, JobStatus
+from db_config import create_db_engine
+from jobs import count_jobs, list_job_summaries, list_jobs
+from pagination import decode_cursor, encode_cursor, next_cursor
+
+
+@pytest.fixture
+def engine():
+    """Engine on a scratch SQLite database file with the current schema."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'schema.db')}")
+        Base.metadata.create_all(bind=engine)
+        yield engine
+        engine.dispose()
+
+
+def _seed(db, tenants=5, per_tenant=200, same_time=1):
+    """Jobs and artifacts per tenant, same_time of them sharing each created_at."""
+    start = datetime(2024, 1, 1)
+    features = ["categorization", "embedding_batch", "receipt_extraction"]
+    statuses = list(JobStatus)
+    jobs, artifacts = [], []
+    for t in range(tenants):
+        for i in range(per_tenant):
+            created_at = start + timedelta(minutes=t * per_tenant + i // same_time)
+            feature = features[i % len(features)]
+            jobs.append(AIJob(
+                id=f"job_{t}_{i}", tenant_id=f"tenant_{t}", user_id="user_1", feature=feature,
+                status=statuses[i % len(statuses)], input_payload="{}", created_at=created_at,
+            ))
+            artifacts.append({
+                **artifact_row(request_id=f"req_{t}_{i}", tenant_id=f"tenant_{t}", feature=feature, input_payload={}),
+                "status": "error" if i % 10 == 0 else "success",
+                "created_at": created_at,
+            })
+    db.add_all(jobs)
+    db.commit()
+    insert_artifacts(db, artifacts)
+    db.execute(text("ANALYZE"))
+    db.commit()
+
+
+def _query_plans(engine, run) -> list[str]:
+    """EXPLAIN QUERY PLAN of each SELECT issued by run()."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        run()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    with engine.connect() as conn:
+        return [
+            " | ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements
+        ]
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({}, "ix_ai_jobs_tenant_created"),
+    ({"feature": "embedding_batch"}, "ix_ai_jobs_tenant_feature_created"),
+    ({"status": JobStatus.QUEUED}, "ix_ai_jobs_tenant_status_created"),
+])
+def test_job_list_queries_use_composite_indexes(engine, filters, index):
+    """Tenant job lists read the matching index in order instead of sorting the tenant's rows."""
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+
+    plans = _query_plans(engine, lambda: (
+        list_jobs(db, "tenant_2", **filters),
+        list_job_summaries(db, "tenant_2", **filters),
+    ))
+
+    assert len(plans) == 2
+    for plan in plans:
+        assert f"USING INDEX {index}" in plan
+        assert "TEMP B-TREE" not in plan
+    db.close()
+
+
+@pytest.mark.parametrize("filters, index", [
+    ({}, "ix_ai_artifacts_tenant_created"),
+    ({"feature": "categorization"}, "ix_ai_artifacts_tenant_feature_created"),
+    ({"status": "error"}, "ix_ai_artifacts_tenant_status_created"),
+    ({"input_hash": payload_hash(canonical_json({}))}, "ix_ai_artifacts_tenant_input_hash_created"),
+])
+def test_artifact_list_queries_use_composite_indexes(engine, filters, index):
+    """Tenant artifact lists read the matching index in order instead of sorting the tenant's rows."""
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+
+    plans = _query_plans(engine, lambda: (
+        list_artifacts(db, "tenant_2", **filters),
+        list_artifact_summaries(db, "tenant_2", **filters),
+    ))
+
+    assert len(plans) == 2
+    for plan in plans:
+        assert f"USING INDEX {index}" in plan
+        assert "TEMP B-TREE" not in plan
+    db.close()
+
+
+def test_cursor_round_trip():
+    """Cursors encode the (created_at, id) key; anything else is rejected."""
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created_at, "job_1")) == (created_at, "job_1")
+    assert decode_cursor(encode_cursor(created_at.isoformat(), "job_1")) == (created_at, "job_1")
+    for cursor in ("", "not-a-cursor", encode_cursor("yesterday", "job_1")):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_cursor_pages_cover_every_job_once(engine):
+    """Paging by cursor returns each job exactly once, newest first, even with equal created_at."""
+    db = sessionmaker(bind=engine)()
+    _seed(db, tenants=2, per_tenant=90, same_time=7)
+    expected = [job.id for job in list_jobs(db, "tenant_1", limit=1000)]
+
+    seen, cursor = [], None
+    while True:
+        page = list_jobs(db, "tenant_1", limit=20, cursor=cursor)
+        seen.extend(job.id for job in page)
+        cursor = next_cursor(page, 20)
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert len(seen) == 90
+    db.close()
+
+
+def test_deep_cursor_pages_seek_the_index(engine):
+    """A cursor page is a range seek on the composite index, not a scan of the earlier rows."""
+    db = sessionmaker(bind=engine)()
+    _seed(db)
+    deep = list_jobs(db, "tenant_2", limit=150)[-1]
+    cursor = encode_cursor(deep.created_at, deep.id)
+
+    plans = _query_plans(engine, lambda: (
+        list_jobs(db, "tenant_2", limit=20, cursor=cursor),
+        list_job_summaries(db, "tenant_2", status=JobStatus.QUEUED, limit=20, cursor=cursor),
+    ))
+
+    assert "SEARCH ai_jobs USING INDEX ix_ai_jobs_tenant_created (tenant_id=? AND (created_at,id)<(?,?))" in plans[0]
+    assert "USING INDEX ix_ai_jobs_tenant_status_created (tenant_id=? AND status=? AND (created_at,id)<(?,?))" in plans[1]
+    assert all("TEMP B-TREE" not in plan for plan in plans)
+    db.close()
+
+
+def test_approximate_count_is_capped(engine):
+    """count_jobs is exact below the cap and stops reading at the cap."""
+    db = sessionmaker(bind=engine)()
+    _seed(db, tenants=2, per_tenant=100)
+
+    assert count_jobs(db, "tenant_1") == 100
+    assert count_jobs(db, "tenant_1", feature="categorization") == 34
+    assert count_jobs(db, "tenant_1", cap=25) == 25
+    db.close()
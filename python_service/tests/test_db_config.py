@@ -0,0 +1,126 @@
+"""
+Tests for the database engine configuration.
+
+Tests cover:
+- SQLite pragmas applied on every connection
+- Settings overrides
+- Pooling for file and in-memory databases
+- Concurrent writers with WAL
+- The asyncio engine
+"""
+
+import os
+import tempfile
+import threading
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool, StaticPool
+
+from artifacts import artifact_row, insert_artifacts
+from database import AIArtifact, Base
+from db_config import async_database_url, create_async_db_engine, create_db_engine, sqlite_pragmas
+
+
+@pytest.fixture
+def db_url():
+    """URL of a scratch SQLite database file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        yield f"sqlite:///{os.path.join(tmp, 'config.db')}"
+
+
+def _pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+def test_sqlite_pragmas_applied_to_connections(db_url):
+    """File databases get WAL, synchronous=NORMAL, cache, mmap and busy timeout."""
+    engine = create_db_engine(db_url)
+
+    assert isinstance(engine.pool, QueuePool)
+    assert _pragma(engine, "journal_mode") == "wal"
+    assert _pragma(engine, "synchronous") == 1  # NORMAL
+    assert _pragma(engine, "cache_size") == -65536
+    assert _pragma(engine, "mmap_size") == 268435456
+    assert _pragma(engine, "busy_timeout") == 5000
+    engine.dispose()
+
+
+def test_pragmas_follow_settings(db_url):
+    """Settings override the pragmas; empty values keep SQLite's default."""
+    with patch("db_config.settings.SQLITE_JOURNAL_MODE", ""), \
+            patch("db_config.settings.SQLITE_SYNCHRONOUS", "FULL"), \
+            patch("db_config.settings.SQLITE_BUSY_TIMEOUT_MS", 250):
+        assert "journal_mode" not in sqlite_pragmas()
+        engine = create_db_engine(db_url)
+
+    assert _pragma(engine, "journal_mode") == "delete"
+    assert _pragma(engine, "synchronous") == 2  # FULL
+    assert _pragma(engine, "busy_timeout") == 250
+    engine.dispose()
+
+
+def test_memory_database_shares_one_connection():
+    """In-memory databases use a StaticPool so all sessions see the same data."""
+    engine = create_db_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    insert_artifacts(Session(), [artifact_row(request_id="req_1", tenant_id="t", input_payload={})])
+
+    assert isinstance(engine.pool, StaticPool)
+    assert Session().query(AIArtifact).count() == 1
+
+
+def test_concurrent_writers_do_not_fail(db_url):
+    """Threads committing concurrently wait for the lock instead of failing."""
+    engine = create_db_engine(db_url)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    errors = []
+
+    def write(worker):
+        db = Session()
+        try:
+            for i in range(50):
+                insert_artifacts(db, [artifact_row(request_id=f"req_{worker}_{i}", tenant_id="t", input_payload={})])
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert Session().query(AIArtifact).count() == 300
+    engine.dispose()
+
+
+def test_async_database_url_uses_async_drivers():
+    """Sync URLs are rewritten to aiosqlite/asyncpg; async ones are kept."""
+    assert async_database_url("sqlite:///./ai.db") == "sqlite+aiosqlite:///./ai.db"
+    assert async_database_url("postgresql://u:p@db/ai") == "postgresql+asyncpg://u:p@db/ai"
+    assert async_database_url("postgresql+psycopg2://u:p@db/ai") == "postgresql+asyncpg://u:p@db/ai"
+    assert async_database_url("postgresql+asyncpg://u:p@db/ai") == "postgresql+asyncpg://u:p@db/ai"
+    with pytest.raises(ValueError):
+        async_database_url("mysql://u:p@db/ai")
+
+
+@pytest.mark.asyncio
+async def test_async_engine_applies_pragmas(db_url):
+    """The asyncio engine configures its connections like the sync one."""
+    engine = create_async_db_engine(db_url)
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+            assert (await conn.execute(text("PRAGMA synchronous"))).scalar() == 1
+            assert (await conn.execute(text("PRAGMA busy_timeout"))).scalar() == 5000
+    finally:
+        await engine.dispose()
@@ -0,0 +1,1025 @@
+"""
+Tests for the durable job queue and workers.
+
+Tests cover:
+- Atomic job claims with leases
+- Heartbeats and the expired-lease recovery sweep
+- Per-feature worker concurrency
+- End-to-end execution by the embedded worker
+- Fair scheduling: priorities, tenant caps, weighted fair share, metrics
+- Push notifications: SSE stream, long-poll and webhooks
+- Bulk submission and bulk status
+- Deduplication by input fingerprint and idempotency keys
+- Chunked embedding jobs: progress and resume after a crash
+- Receipt extraction jobs in the OCR process pool
+- Retries with backoff, deadlines and cancellation
+- Offloading large outputs to the blob store
+- Summary projection for job lists
+"""
+
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from main import app
+from database import (
+    AIJob, AIJobChunk, Base, JobStatus, get_async_engine, get_async_session_local, get_engine,
+    get_session_local, reset_engine,
+)
+from ocr_pool import extract_receipt_in_pool, shutdown_ocr_pool
+from jobs import (
+    _job_handlers, cancel_job, cancel_job_async, claim_next_job, create_job, execute_job, expire_overdue_jobs,
+    find_duplicate_job, generate_job_id, get_job_async, get_job_output, list_job_summaries_async, list_jobs_async,
+    recover_expired_leases, register_job_handler, renew_lease, submit_job, submit_job_async,
+    update_job_status, JobContext, LeaseLostError, RetryableJobError, RetryPolicy,
+)
+from blob_store import blob_path
+from config import settings
+from job_events import WebhookURLError, _post_webhook, validate_webhook_url
+from scheduler import FairScheduler
+from worker import JobWorker
+
+# Create a temporary database file for tests
+_test_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["AI_DATABASE_URL"] = f"sqlite:///{_test_db_file.name}"
+
+
+@pytest.fixture(scope="function")
+def db():
+    """Create a fresh database and session for each test."""
+    reset_engine()
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = get_session_local()()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def echo_handler():
+    """Register a synchronous test handler for the duration of a test."""
+    @register_job_handler("test_echo")
+    def handle_echo(input_payload: dict) -> dict:
+        if input_payload.get("fail"):
+            raise ValueError("requested failure")
+        return {"echo": input_payload}
+
+    yield handle_echo
+    _job_handlers.pop("test_echo", None)
+
+
+def _queue(db, feature="test_echo", payload=None, tenant_id="tenant_jobs", priority=0):
+    return create_job(db, generate_job_id(), tenant_id, "user_1", feature, payload or {}, priority=priority)
+
+
+def _claim_tenants(db, scheduler, count):
+    claimed = [claim_next_job(db, "worker_a", scheduler=scheduler) for _ in range(count)]
+    return [job.tenant_id if job else None for job in claimed]
+
+
+def test_claim_is_exclusive_and_leased(db):
+    """Each queued job is claimed by exactly one worker, oldest first."""
+    first = _queue(db)
+    second = _queue(db)
+
+    claimed_a = claim_next_job(db, "worker_a", lease_seconds=30)
+    claimed_b = claim_next_job(db, "worker_b", lease_seconds=30)
+
+    assert [claimed_a.id, claimed_b.id] == [first.id, second.id]
+    assert claimed_a.status == JobStatus.RUNNING
+    assert claimed_a.lease_owner == "worker_a"
+    assert claimed_a.attempts == 1
+    assert claimed_a.lease_expires_at > datetime.utcnow()
+    assert claim_next_job(db, "worker_c") is None
+
+
+def test_claim_respects_feature_filter(db):
+    """Workers only claim jobs for features they have capacity for."""
+    _queue(db, feature="embedding_batch")
+
+    assert claim_next_job(db, "worker_a", features=["receipt_extraction"]) is None
+    assert claim_next_job(db, "worker_a", features=[]) is None
+    assert claim_next_job(db, "worker_a", features=["embedding_batch"]) is not None
+
+
+def test_renew_lease_only_for_owner(db):
+    """Heartbeats extend the lease only for the worker holding it."""
+    job = _queue(db)
+    claim_next_job(db, "worker_a", lease_seconds=1)
+
+    assert renew_lease(db, job.id, "worker_a", lease_seconds=60)
+    assert not renew_lease(db, job.id, "worker_b", lease_seconds=60)
+    db.refresh(job)
+    assert job.lease_expires_at > datetime.utcnow() + timedelta(seconds=30)
+
+
+def test_sweep_requeues_expired_leases_and_fails_exhausted(db):
+    """Expired leases are re-queued until max_attempts, then failed."""
+    retried = _queue(db)
+    exhausted = _queue(db)
+    for _ in range(2):
+        claim_next_job(db, "crashed_worker")
+    exhausted.attempts = 3
+    for job in (retried, exhausted):
+        job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    counts = recover_expired_leases(db)
+
+    assert counts == {"requeued": 1, "failed": 1}
+    db.refresh(retried)
+    db.refresh(exhausted)
+    assert retried.status == JobStatus.QUEUED
+    assert retried.lease_owner is None
+    assert exhausted.status == JobStatus.FAILED
+    assert "lease expired" in exhausted.error_message
+
+    reclaimed = claim_next_job(db, "worker_b")
+    assert reclaimed.id == retried.id
+    assert reclaimed.attempts == 2
+
+
+def test_sweep_uses_feature_retry_policy(db):
+    """Abandoned jobs get the attempts of their feature's RetryPolicy, not a worker-wide count."""
+    register_job_handler("test_patient", retry=RetryPolicy(max_attempts=5))(lambda payload: {})
+    register_job_handler("test_once", retry=RetryPolicy(max_attempts=1))(lambda payload: {})
+    try:
+        patient = _queue(db, feature="test_patient")
+        once = _queue(db, feature="test_once")
+        claim_next_job(db, "crashed_worker")
+        claim_next_job(db, "crashed_worker")
+        patient.attempts = 3
+        for job in (patient, once):
+            job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+
+        assert recover_expired_leases(db) == {"requeued": 1, "failed": 1}
+        db.refresh(patient)
+        db.refresh(once)
+        assert patient.status == JobStatus.QUEUED
+        assert once.status == JobStatus.FAILED
+    finally:
+        _job_handlers.pop("test_patient", None)
+        _job_handlers.pop("test_once", None)
+
+
+@pytest.mark.asyncio
+async def test_worker_enforces_feature_concurrency(db, echo_handler):
+    """A worker holds at most its per-feature limit of running jobs."""
+    jobs = [_queue(db, payload={"n": i}) for i in range(3)]
+    worker = JobWorker(worker_id="worker_a", concurrency={"test_echo": 2})
+
+    assert await worker.claim_available() == 2
+    assert "test_echo" not in worker.available_features()
+    await worker.drain()
+    assert await worker.claim_available() == 1
+    await worker.drain()
+
+    db.expire_all()
+    finished = db.query(AIJob).filter(AIJob.id.in_([j.id for j in jobs])).all()
+    assert all(job.status == JobStatus.SUCCEEDED for job in finished)
+    assert all(job.lease_owner is None for job in finished)
+
+
+@pytest.mark.asyncio
+async def test_worker_queries_run_off_the_event_loop(db):
+    """Claims, sweeps, heartbeats and results never block the event loop thread with database calls."""
+    @register_job_handler("test_slow")
+    async def handle_slow(input_payload: dict) -> dict:
+        await asyncio.sleep(0.3)  # long enough for heartbeats
+        return {}
+
+    jobs = [_queue(db, feature="test_slow", payload={"n": i}) for i in range(3)]
+    loop_thread = threading.current_thread()
+    threads = []
+
+    @event.listens_for(get_engine(), "before_cursor_execute")
+    def record_thread(*args):
+        threads.append(threading.current_thread())
+
+    try:
+        worker = JobWorker(worker_id="worker_a", concurrency={"test_slow": 3}, lease_seconds=0.3)
+        await asyncio.to_thread(worker.sweep)
+        assert await worker.claim_available() == 3
+        await worker.drain()
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record_thread)
+        _job_handlers.pop("test_slow", None)
+
+    assert threads and loop_thread not in threads
+    db.expire_all()
+    assert all(db.get(AIJob, job.id).status == JobStatus.SUCCEEDED for job in jobs)
+
+
+@pytest.mark.asyncio
+async def test_worker_records_failure_and_unhandled_features(db, echo_handler):
+    """Handler errors fail the job; jobs for unknown features are failed by the sweep."""
+    failing = _queue(db, payload={"fail": True})
+    unknown = _queue(db, feature="no_such_feature")
+    worker = JobWorker(worker_id="worker_a")
+
+    assert worker.sweep()["unhandled"] == 1
+    await worker.claim_available()
+    await worker.drain()
+
+    db.expire_all()
+    assert db.get(AIJob, failing.id).error_message == "requested failure"
+    assert db.get(AIJob, unknown.id).status == JobStatus.FAILED
+
+
+def test_embedded_worker_executes_submitted_job(db, echo_handler):
+    """With the app lifespan running, submitted jobs are executed by the embedded worker."""
+    with TestClient(app) as client:
+        job_id = client.post("/api/v1/jobs", json={
+            "tenant_id": "tenant_jobs",
+            "user_id": "user_1",
+            "feature": "test_echo",
+            "payload": {"value": 42},
+        }).json()["job_id"]
+
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            data = client.get(
+                f"/api/v1/jobs/{job_id}",
+                params={"tenant_id": "tenant_jobs"},
+                headers={"X-Tenant-ID": "tenant_jobs"},
+            ).json()
+            if data["status"] == "succeeded":
+                break
+            time.sleep(0.05)
+
+    assert data["status"] == "succeeded"
+    assert data["output_payload"] == {"echo": {"value": 42}}
+    assert data["attempts"] == 1
+
+
+# =============================================================================
+# Scheduling
+# =============================================================================
+
+
+def test_backlogged_tenant_does_not_starve_others(db):
+    """A tenant that queued first still alternates with a later tenant."""
+    for _ in range(5):
+        _queue(db, tenant_id="tenant_bulk")
+    _queue(db, tenant_id="tenant_small")
+
+    scheduler = FairScheduler(tenant_concurrency=0)
+    assert _claim_tenants(db, scheduler, 3) == ["tenant_bulk", "tenant_small", "tenant_bulk"]
+
+
+def test_tenant_concurrency_cap(db):
+    """Tenants at their running cap are skipped until a job finishes."""
+    for _ in range(3):
+        _queue(db, tenant_id="tenant_bulk")
+
+    scheduler = FairScheduler(tenant_concurrency=2)
+    assert _claim_tenants(db, scheduler, 3) == ["tenant_bulk", "tenant_bulk", None]
+
+
+def test_priority_and_weights(db):
+    """Higher priority runs first; weights skew the fair share."""
+    for _ in range(3):
+        _queue(db, tenant_id="tenant_gold")
+        _queue(db, tenant_id="tenant_basic")
+    urgent = _queue(db, tenant_id="tenant_basic", priority=5)
+
+    scheduler = FairScheduler(tenant_concurrency=0, tenant_weights={"tenant_gold": 2})
+    assert claim_next_job(db, "worker_a", scheduler=scheduler).id == urgent.id
+    assert _claim_tenants(db, scheduler, 3) == ["tenant_gold", "tenant_gold", "tenant_basic"]
+
+
+def test_metrics_expose_scheduler_state(db):
+    """/metrics reports queue depth, running jobs and waits per tenant and feature."""
+    _queue(db, tenant_id="tenant_a")
+    _queue(db, tenant_id="tenant_a")
+    _queue(db, tenant_id="tenant_b", feature="embedding_batch")
+    claim_next_job(db, "worker_a", features=["test_echo"])
+
+    state = TestClient(app).get("/metrics").json()["job_scheduler"]
+
+    assert state["queue_depth"] == 2
+    assert state["running"] == 1
+    assert state["tenants"]["tenant_a"]["queued"] == 1
+    assert state["tenants"]["tenant_a"]["running"] == 1
+    assert state["tenants"]["tenant_a"]["avg_wait_s"] >= 0
+    assert state["tenants"]["tenant_b"]["oldest_wait_s"] >= 0
+    assert state["features"]["embedding_batch"]["queued"] == 1
+
+
+# =============================================================================
+# Push Notifications
+# =============================================================================
+
+TENANT_HEADERS = {"X-Tenant-ID": "tenant_jobs"}
+
+
+def _submit(client, **extra):
+    return client.post("/api/v1/jobs", json={
+        "tenant_id": "tenant_jobs",
+        "user_id": "user_1",
+        "feature": "test_echo",
+        "payload": {"value": 1},
+        **extra,
+    })
+
+
+def test_sse_streams_status_until_finished(db, echo_handler):
+    """The events endpoint streams status changes and closes after the final one."""
+    with TestClient(app) as client:
+        job_id = _submit(client).json()["job_id"]
+        response = client.get(
+            f"/api/v1/jobs/{job_id}/events",
+            params={"tenant_id": "tenant_jobs", "timeout": 5},
+            headers=TENANT_HEADERS,
+        )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines() if line.startswith("data: ")
+    ]
+    assert events[-1]["status"] == "succeeded"
+    assert events[-1]["job_id"] == job_id
+
+
+def test_long_poll_returns_on_status_change(db):
+    """The wait endpoint returns as soon as update_job_status publishes a change."""
+    job = _queue(db, feature="embedding_batch")
+
+    def finish():
+        time.sleep(0.2)
+        session = get_session_local()()
+        update_job_status(session, session.get(AIJob, job.id), JobStatus.SUCCEEDED, output_payload={"ok": True})
+        session.close()
+
+    threading.Thread(target=finish).start()
+    started = time.time()
+    response = TestClient(app).get(
+        f"/api/v1/jobs/{job.id}/wait",
+        params={"tenant_id": "tenant_jobs", "timeout": 10},
+        headers=TENANT_HEADERS,
+    )
+
+    assert time.time() - started < 5
+    assert response.json()["status"] == "succeeded"
+    assert response.json()["output_payload"] == {"ok": True}
+
+
+def test_long_poll_times_out_and_checks_tenant(db):
+    """Waiting on an unchanged job returns its current status after the timeout."""
+    job = _queue(db)
+    client = TestClient(app)
+
+    response = client.get(
+        f"/api/v1/jobs/{job.id}/wait",
+        params={"tenant_id": "tenant_jobs", "status": "queued", "timeout": 0.2},
+        headers=TENANT_HEADERS,
+    )
+    assert response.json()["status"] == "queued"
+
+    response = client.get(
+        f"/api/v1/jobs/{job.id}/events",
+        params={"tenant_id": "other_tenant"},
+        headers={"X-Tenant-ID": "other_tenant"},
+    )
+    assert response.status_code == 404
+
+
+def test_webhook_called_when_job_finishes(db, echo_handler, monkeypatch):
+    """Jobs submitted with webhook_url are notified with the status event on the webhook pool."""
+    monkeypatch.setattr(settings, "JOB_WEBHOOK_ALLOWED_HOSTS", ["example.com"])
+    delivered = threading.Event()
+    calls = []
+
+    def post(url, event):
+        calls.append((url, event, threading.current_thread().name))
+        delivered.set()
+
+    with patch("job_events._post_webhook", side_effect=post):
+        with TestClient(app) as client:
+            assert _submit(client, webhook_url="ftp://example.com").status_code == 422
+            job_id = _submit(client, webhook_url="https://example.com/hook").json()["job_id"]
+            client.get(
+                f"/api/v1/jobs/{job_id}/wait",
+                params={"tenant_id": "tenant_jobs", "timeout": 5},
+                headers=TENANT_HEADERS,
+            )
+        assert delivered.wait(5)
+
+    url, event, thread_name = calls[0]
+    assert url == "https://example.com/hook"
+    assert event["job_id"] == job_id
+    assert event["status"] == "succeeded"
+    assert "output_payload" not in event and "input_payload" not in event
+    assert thread_name.startswith("job-webhook")
+
+
+def test_webhook_urls_must_be_public_or_allowlisted(db, monkeypatch):
+    """Webhooks to loopback, link-local and private addresses are rejected at submission."""
+    client = TestClient(app)
+    for url in (
+        "http://localhost/hook", "http://127.0.0.1:8000/hook", "http://169.254.169.254/latest/meta-data",
+        "http://10.0.0.5/hook", "http://[::1]/hook", "http://[::ffff:192.168.1.1]/hook",
+    ):
+        response = _submit(client, webhook_url=url)
+        assert response.status_code == 422, url
+    bulk = client.post("/api/v1/jobs/bulk", json={
+        "tenant_id": "tenant_jobs",
+        "user_id": "user_1",
+        "jobs": [{"feature": "test_echo", "payload": {}, "webhook_url": "http://192.168.0.1/hook"}],
+    })
+    assert bulk.status_code == 422
+    assert db.query(AIJob).count() == 0
+
+    # A public name that resolves to a private address is rejected too
+    private = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("192.168.1.20", 443))]
+    with patch("job_events.socket.getaddrinfo", return_value=private):
+        assert _submit(client, webhook_url="https://hooks.example.com/job").status_code == 422
+        with pytest.raises(WebhookURLError):
+            validate_webhook_url("https://hooks.example.com/job")
+    validate_webhook_url("https://93.184.216.34/hook")
+
+    # With an allowlist only the listed hosts are accepted
+    monkeypatch.setattr(settings, "JOB_WEBHOOK_ALLOWED_HOSTS", ["hooks.internal"])
+    assert _submit(client, webhook_url="http://hooks.internal/job").status_code == 200
+    assert _submit(client, webhook_url="https://93.184.216.34/hook").status_code == 422
+
+
+def test_webhook_delivery_rechecks_url(monkeypatch):
+    """A host that resolves to a private address by delivery time is not called."""
+    private = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.1.2.3", 443))]
+    with patch("job_events.socket.getaddrinfo", return_value=private), patch("job_events.httpx.Client") as client:
+        assert _post_webhook("https://hooks.example.com/job", {"job_id": "job_1", "status": "succeeded"}) is False
+    client.assert_not_called()
+
+
+# =============================================================================
+# Bulk Submission and Status
+# =============================================================================
+
+
+def test_bulk_submit_inserts_in_one_executemany(db):
+    """Bulk submission issues a single INSERT for all jobs and keeps request order."""
+    inserts = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO ai_jobs"):
+            inserts.append(executemany)
+
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", record)
+    try:
+        response = TestClient(app).post("/api/v1/jobs/bulk", json={
+            "tenant_id": "tenant_jobs",
+            "user_id": "user_1",
+            "jobs": [
+                {"feature": "embedding_batch", "payload": {"texts": [str(i)]}, "priority": i}
+                for i in range(5)
+            ],
+        })
+    finally:
+        event.remove(get_async_engine().sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    jobs = response.json()["jobs"]
+    assert [job["priority"] for job in jobs] == [0, 1, 2, 3, 4]
+    assert all(job["status"] == "queued" for job in jobs)
+    assert inserts == [True]
+    assert db.query(AIJob).count() == 5
+
+
+def test_bulk_status_returns_compact_records(db):
+    """Bulk status is tenant-scoped, reports missing IDs and omits payloads."""
+    mine = _queue(db, payload={"large": "x" * 1000})
+    theirs = _queue(db, tenant_id="other_tenant")
+    claim_next_job(db, "worker_a")
+
+    response = TestClient(app).post("/api/v1/jobs/status", json={
+        "tenant_id": "tenant_jobs",
+        "job_ids": [mine.id, theirs.id, "job_missing"],
+    })
+
+    data = response.json()
+    assert [job["job_id"] for job in data["jobs"]] == [mine.id]
+    assert data["jobs"][0]["status"] == "running"
+    assert "input_payload" not in data["jobs"][0]
+    assert data["missing"] == [theirs.id, "job_missing"]
+
+
+# =============================================================================
+# Deduplication
+# =============================================================================
+
+
+def test_identical_submissions_attach_to_existing_job(db):
+    """Same tenant, feature and canonical input reuse the queued job."""
+    client = TestClient(app)
+    first = _submit(client, payload={"image_base64": "abc", "hints": {"b": 1, "a": 2}}).json()
+    second = _submit(client, payload={"hints": {"a": 2, "b": 1}, "image_base64": "abc"}).json()
+    other = _submit(client, payload={"image_base64": "xyz"}).json()
+    forced = _submit(client, payload={"image_base64": "abc", "hints": {"b": 1, "a": 2}}, dedupe=False).json()
+
+    assert first["deduplicated"] is False
+    assert second["job_id"] == first["job_id"]
+    assert second["deduplicated"] is True
+    assert other["job_id"] != first["job_id"]
+    assert forced["job_id"] != first["job_id"]
+    assert db.query(AIJob).count() == 3
+
+
+def test_dedup_window_and_failed_jobs(db):
+    """Succeeded jobs are reused within the window; failed jobs are retried."""
+    job, created = submit_job(db, "tenant_jobs", "user_1", "embedding_batch", {"texts": ["a"]})
+    assert created
+    update_job_status(db, job, JobStatus.SUCCEEDED, output_payload={"count": 1})
+    assert submit_job(db, "tenant_jobs", "user_1", "embedding_batch", {"texts": ["a"]}) == (job, False)
+    assert submit_job(db, "other_tenant", "user_1", "embedding_batch", {"texts": ["a"]})[0].id != job.id
+
+    job.finished_at = datetime.utcnow() - timedelta(hours=1)
+    db.commit()
+    assert submit_job(db, "tenant_jobs", "user_1", "embedding_batch", {"texts": ["a"]})[0].id != job.id
+
+    failed, _ = submit_job(db, "tenant_jobs", "user_1", "embedding_batch", {"texts": ["b"]})
+    update_job_status(db, failed, JobStatus.FAILED, error_message="boom")
+    assert submit_job(db, "tenant_jobs", "user_1", "embedding_batch", {"texts": ["b"]})[0].id != failed.id
+
+
+def test_idempotency_key_race(db):
+    """A submission that loses an idempotency key race returns the winner; other insert errors are raised."""
+    winner, _ = submit_job(db, "tenant_jobs", "user_1", "test_echo", {"value": 1}, idempotency_key="key-1")
+    lookups = []
+
+    def find_after_race(*args, **kwargs):
+        # The first lookup runs before the concurrent submission commits
+        lookups.append(kwargs)
+        return None if len(lookups) == 1 else find_duplicate_job(*args, **kwargs)
+
+    with patch("jobs.find_duplicate_job", side_effect=find_after_race):
+        job, created = submit_job(
+            db, "tenant_jobs", "user_1", "test_echo", {"value": 1}, idempotency_key="key-1"
+        )
+    assert (job.id, created) == (winner.id, False)
+    assert len(lookups) == 2
+
+    # A primary key collision is not a deduplication
+    winner_id = winner.id
+    db.expunge_all()
+    with patch("jobs.generate_job_id", return_value=winner_id):
+        with pytest.raises(IntegrityError):
+            submit_job(db, "tenant_jobs", "user_1", "test_echo", {"value": 2})
+    assert db.query(AIJob).count() == 1
+
+
+def test_dedup_is_reported_under_clock_skew(db):
+    """A duplicate created by an instance whose clock runs ahead is still reported as deduplicated."""
+    client = TestClient(app)
+    first = _submit(client).json()
+    job = db.get(AIJob, first["job_id"])
+    job.created_at = datetime.utcnow() + timedelta(minutes=5)
+    db.commit()
+
+    second = _submit(client).json()
+    assert second["job_id"] == first["job_id"]
+    assert second["deduplicated"] is True
+
+
+def test_idempotency_key(db):
+    """A reused idempotency key returns the same job; a different input conflicts."""
+    client = TestClient(app)
+    first = _submit(client, dedupe=False, idempotency_key="key-1").json()
+    again = client.post("/api/v1/jobs", headers={"Idempotency-Key": "key-1"}, json={
+        "tenant_id": "tenant_jobs",
+        "user_id": "user_1",
+        "feature": "test_echo",
+        "payload": {"value": 1},
+        "dedupe": False,
+    }).json()
+    conflict = _submit(client, payload={"value": 2}, idempotency_key="key-1")
+
+    assert again["job_id"] == first["job_id"]
+    assert again["deduplicated"] is True
+    assert conflict.status_code == 409
+
+
+# =============================================================================
+# Chunked Embedding Jobs
+# =============================================================================
+
+
+class FakeEmbeddingModel:
+    """Deterministic stand-in for the sentence transformer."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True):
+        self.encoded.extend(texts)
+        return np.array([[float(len(text)), 1.0] for text in texts])
+
+
+@pytest.mark.asyncio
+async def test_embedding_job_resumes_after_crash(db):
+    """A re-claimed embedding job keeps saved chunks and encodes only the rest."""
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+    job = _queue(db, feature="embedding_batch", payload={"texts": texts, "chunk_size": 2})
+
+    # First attempt saves one chunk, then the worker dies
+    claim_next_job(db, "crashed_worker")
+    JobContext(job.id, "crashed_worker", 1).save_chunk(0, {"vectors": [[1.0, 1.0], [2.0, 1.0]]}, progress=100 / 3)
+    status = TestClient(app).get(
+        f"/api/v1/jobs/{job.id}", params={"tenant_id": "tenant_jobs"}, headers=TENANT_HEADERS
+    ).json()
+    assert status["status"] == "running"
+    assert status["progress"] == pytest.approx(33.33)
+
+    job.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    recover_expired_leases(db)
+
+    model = FakeEmbeddingModel()
+    with patch("main.get_embedding_model", return_value=model):
+        worker = JobWorker(worker_id="worker_b")
+        await worker.claim_available()
+        await worker.drain()
+
+    db.expire_all()
+    finished = db.get(AIJob, job.id)
+    output = json.loads(finished.output_payload)
+    assert model.encoded == ["ccc", "dddd", "eeeee"]
+    assert [vector[0] for vector in output["vectors"]] == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert output["count"] == 5
+    assert output["resumed_chunks"] == 1
+    assert finished.progress == 100.0
+    assert db.query(AIJobChunk).filter(AIJobChunk.job_id == job.id).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_embedding_job_saves_chunks_off_the_event_loop(db):
+    """Chunks of async handlers are written from a thread, not the event loop thread."""
+    job = _queue(db, feature="embedding_batch", payload={"texts": ["a", "bb", "ccc"], "chunk_size": 1})
+    loop_thread = threading.current_thread()
+    threads = []
+
+    @event.listens_for(get_engine(), "before_cursor_execute")
+    def record_thread(conn, cursor, statement, *args):
+        if "ai_job_chunks" in statement and statement.lstrip().upper().startswith("INSERT"):
+            threads.append(threading.current_thread())
+
+    try:
+        with patch("main.get_embedding_model", return_value=FakeEmbeddingModel()):
+            worker = JobWorker(worker_id="worker_a")
+            await worker.claim_available()
+            await worker.drain()
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", record_thread)
+
+    assert len(threads) == 3 and loop_thread not in threads
+    db.expire_all()
+    assert db.get(AIJob, job.id).status == JobStatus.SUCCEEDED
+
+
+def test_save_chunk_requires_lease(db):
+    """A worker that lost its lease cannot write chunks."""
+    job = _queue(db, feature="embedding_batch")
+    claim_next_job(db, "worker_a")
+
+    with pytest.raises(LeaseLostError):
+        JobContext(job.id, "worker_b", 1).save_chunk(0, {"vectors": []}, progress=50)
+    assert db.query(AIJobChunk).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_receipt_extraction_runs_in_process_pool(tmp_path, monkeypatch):
+    """Receipt OCR runs in a separate process and errors propagate back."""
+    monkeypatch.setattr(settings, "RECEIPT_UPLOAD_DIR", str(tmp_path))
+    (tmp_path / "empty.png").write_bytes(b"")
+    try:
+        with pytest.raises(ValueError, match="Cannot load image"):
+            await extract_receipt_in_pool(image_path="empty.png")
+        with pytest.raises(ValueError):
+            await extract_receipt_in_pool()
+    finally:
+        shutdown_ocr_pool()
+
+
+@pytest.mark.asyncio
+async def test_receipt_image_path_must_be_in_upload_dir(tmp_path, monkeypatch):
+    """Receipt jobs only read image_path inside RECEIPT_UPLOAD_DIR, and only if one is configured."""
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (tmp_path / "secret.png").write_bytes(b"not a receipt")
+    (uploads / "link.png").symlink_to(tmp_path / "secret.png")
+
+    monkeypatch.setattr(settings, "RECEIPT_UPLOAD_DIR", "")
+    with pytest.raises(ValueError, match="image_base64"):
+        await extract_receipt_in_pool(image_path=str(uploads / "r1.png"))
+
+    monkeypatch.setattr(settings, "RECEIPT_UPLOAD_DIR", str(uploads))
+    for outside in (str(tmp_path / "secret.png"), "../secret.png", "link.png", str(tmp_path / "uploads-other/r1.png")):
+        with pytest.raises(ValueError, match="upload directory"):
+            await extract_receipt_in_pool(image_path=outside)
+    with pytest.raises(FileNotFoundError):
+        await extract_receipt_in_pool(image_path="missing.png")
+
+
+@pytest.mark.asyncio
+async def test_receipt_job_uses_pool_and_handler_concurrency(db):
+    """Receipt jobs go to the OCR pool, claimed at most one per pool process."""
+    import main
+
+    extracted = {"items": [], "total": 4.2, "merchant": "Shop", "date": None, "confidence": 0.9}
+    pool = AsyncMock(return_value=extracted)
+    with patch.object(main.settings, "USE_VLLM_OCR", False), \
+            patch.object(main.settings, "USE_TESSERACT_OCR", True), \
+            patch.object(main, "_tesseract_process_receipt", object()), \
+            patch.object(main, "extract_receipt_in_pool", pool):
+        result = await _job_handlers["receipt_extraction"]({"image_path": "/data/r1.png"})
+
+    assert result == extracted
+    pool.assert_awaited_once_with(image_base64=None, image_path="/data/r1.png")
+
+    worker = JobWorker(concurrency={}, default_concurrency=2)
+    assert worker.limit("receipt_extraction") == main.settings.OCR_PROCESS_WORKERS
+    assert JobWorker(concurrency={"receipt_extraction": 1}).limit("receipt_extraction") == 1
+
+
+def test_retry_policy_backoff_and_retryable_errors():
+    """Delays double per attempt up to the cap, with jitter; only retryable errors retry."""
+    policy = RetryPolicy(max_attempts=3, base_delay=2, max_delay=5)
+
+    assert 1 <= policy.delay(1) <= 2
+    assert 2 <= policy.delay(2) <= 4
+    assert 2.5 <= policy.delay(10) <= 5
+    assert len({policy.delay(1) for _ in range(10)}) > 1
+    assert policy.should_retry(RetryableJobError("busy"), attempt=1)
+    assert policy.should_retry(TimeoutError(), attempt=2)
+    assert not policy.should_retry(RetryableJobError("busy"), attempt=3)
+    assert not policy.should_retry(ValueError("bad input"), attempt=1)
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried_after_backoff(db):
+    """A retryable failure re-queues the job, claimable only once the backoff elapses."""
+    calls = []
+
+    @register_job_handler("test_flaky", retry=RetryPolicy(max_attempts=2, base_delay=60))
+    async def handle_flaky(input_payload: dict) -> dict:
+        calls.append(1)
+        if len(calls) == 1:
+            raise RetryableJobError("model server busy")
+        return {"ok": True}
+
+    try:
+        job = _queue(db, feature="test_flaky")
+        claim_next_job(db, "worker_a")
+        await execute_job(job.id, "worker_a")
+
+        db.refresh(job)
+        assert job.status == JobStatus.QUEUED
+        assert job.error_message == "model server busy"
+        assert job.lease_owner is None
+        assert datetime.utcnow() + timedelta(seconds=25) < job.next_attempt_at
+        assert claim_next_job(db, "worker_a") is None
+
+        job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.commit()
+        assert claim_next_job(db, "worker_a").id == job.id
+        await execute_job(job.id, "worker_a")
+
+        db.refresh(job)
+        assert job.status == JobStatus.SUCCEEDED
+        assert job.attempts == 2
+        assert job.error_message is None
+    finally:
+        _job_handlers.pop("test_flaky", None)
+
+
+@pytest.mark.asyncio
+async def test_retry_not_scheduled_past_deadline(db):
+    """A job whose retry would start after its deadline fails instead."""
+    @register_job_handler("test_flaky", retry=RetryPolicy(max_attempts=5, base_delay=60))
+    async def handle_flaky(input_payload: dict) -> dict:
+        raise RetryableJobError("model server busy")
+
+    try:
+        job = create_job(
+            db, generate_job_id(), "tenant_jobs", "user_1", "test_flaky", {},
+            deadline_at=datetime.utcnow() + timedelta(seconds=10),
+        )
+        claim_next_job(db, "worker_a")
+        await execute_job(job.id, "worker_a")
+
+        db.refresh(job)
+        assert job.status == JobStatus.FAILED
+        assert job.error_message == "model server busy"
+    finally:
+        _job_handlers.pop("test_flaky", None)
+
+
+def test_overdue_jobs_expire_unrun(db, echo_handler):
+    """Queued jobs past their deadline are never claimed and are failed by the sweep."""
+    client = TestClient(app)
+    response = _submit(client, deadline_seconds=60)
+    job = db.get(AIJob, response.json()["job_id"])
+    assert job.deadline_at > datetime.utcnow() + timedelta(seconds=50)
+
+    job.deadline_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+    assert claim_next_job(db, "worker_a") is None
+    assert JobWorker(worker_id="worker_a").sweep()["expired"] == 1
+    db.refresh(job)
+    assert job.status == JobStatus.FAILED
+    assert "deadline exceeded" in job.error_message
+    assert expire_overdue_jobs(db) == 0
+
+
+def test_cancel_endpoint(db):
+    """DELETE cancels a queued job once; it is never claimed."""
+    job = _queue(db)
+    client = TestClient(app)
+
+    response = client.delete(f"/api/v1/jobs/{job.id}", params={"tenant_id": "tenant_jobs"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert claim_next_job(db, "worker_a") is None
+
+    again = client.delete(f"/api/v1/jobs/{job.id}", params={"tenant_id": "tenant_jobs"})
+    assert again.status_code == 409
+    missing = client.delete(f"/api/v1/jobs/{job.id}", params={"tenant_id": "other_tenant"})
+    assert missing.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_cancel_interrupts_running_handler(db):
+    """Cancelling a running job interrupts its handler and discards the result."""
+    started, interrupted = asyncio.Event(), asyncio.Event()
+
+    @register_job_handler("test_slow")
+    async def handle_slow(input_payload: dict) -> dict:
+        started.set()
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            interrupted.set()
+            raise
+        return {"done": True}
+
+    try:
+        job = _queue(db, feature="test_slow")
+        claim_next_job(db, "worker_a")
+        task = asyncio.create_task(execute_job(job.id, "worker_a"))
+        await asyncio.wait_for(started.wait(), timeout=5)
+
+        assert cancel_job(db, job)
+        await asyncio.wait_for(task, timeout=5)
+
+        assert interrupted.is_set()
+        db.expire_all()
+        assert db.get(AIJob, job.id).status == JobStatus.CANCELLED
+        assert not cancel_job(db, job)
+    finally:
+        _job_handlers.pop("test_slow", None)
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_interrupts_handler_cancelled_elsewhere(db):
+    """A handler is interrupted at the next heartbeat when another process cancels its job."""
+    @register_job_handler("test_slow")
+    async def handle_slow(input_payload: dict) -> dict:
+        await asyncio.sleep(30)
+        return {"done": True}
+
+    try:
+        job = _queue(db, feature="test_slow")
+        claim_next_job(db, "worker_a", lease_seconds=1)
+        task = asyncio.create_task(execute_job(job.id, "worker_a", lease_seconds=1))
+        await asyncio.sleep(0.05)
+
+        # Simulate another process: no in-process task to cancel
+        job.status = JobStatus.CANCELLED
+        job.lease_owner = None
+        db.commit()
+        await asyncio.wait_for(task, timeout=5)
+
+        db.expire_all()
+        assert db.get(AIJob, job.id).status == JobStatus.CANCELLED
+    finally:
+        _job_handlers.pop("test_slow", None)
+
+
+def test_large_output_is_offloaded_to_blob_store(db, tmp_path):
+    """Large outputs are stored compressed by content hash and streamed by the output endpoint."""
+    output = {"vectors": [[float(i)] * 16 for i in range(50)]}
+    with patch("jobs.settings.JOB_OUTPUT_INLINE_MAX_BYTES", 1024), \
+            patch("blob_store.settings.JOB_BLOB_DIR", str(tmp_path)):
+        first, second, small = _queue(db), _queue(db), _queue(db)
+        update_job_status(db, first, JobStatus.SUCCEEDED, output_payload=output)
+        update_job_status(db, second, JobStatus.SUCCEEDED, output_payload=output)
+        update_job_status(db, small, JobStatus.SUCCEEDED, output_payload={"ok": True})
+
+        assert first.output_payload is None
+        assert first.output_ref == second.output_ref
+        assert first.output_ref.endswith(".gz")
+        assert first.output_size == len(json.dumps(output))
+        assert len(list(tmp_path.rglob("*.gz"))) == 1
+        assert os.path.getsize(blob_path(first.output_ref)) < first.output_size
+        assert get_job_output(first) == output
+        assert small.output_ref is None and get_job_output(small) == {"ok": True}
+
+        client = TestClient(app)
+        params = {"tenant_id": "tenant_jobs"}
+        status = client.get(f"/api/v1/jobs/{first.id}", params=params, headers=TENANT_HEADERS).json()
+        assert status["output_payload"] is None
+        assert status["output_offloaded"] is True
+        assert status["output_size"] == first.output_size
+
+        for encoding in ("gzip", "identity"):
+            response = client.get(
+                f"/api/v1/jobs/{first.id}/output", params=params,
+                headers={**TENANT_HEADERS, "Accept-Encoding": encoding},
+            )
+            assert response.status_code == 200
+            assert response.json() == output
+        inline = client.get(f"/api/v1/jobs/{small.id}/output", params=params, headers=TENANT_HEADERS)
+        assert inline.json() == {"ok": True}
+
+    with pytest.raises(ValueError):
+        blob_path("../../etc/passwd")
+
+
+def test_job_list_summary_selects_only_requested_columns(db):
+    """view=summary and fields select status columns only; payloads are never read."""
+    for i in range(3):
+        _queue(db, payload={"texts": ["x" * 1000] * 50, "n": i})
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("SELECT") and "ai_jobs" in statement:
+            statements.append(statement)
+
+    client = TestClient(app)
+    params = {"tenant_id": "tenant_jobs"}
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", record)
+    try:
+        summary = client.get("/api/v1/jobs", params={**params, "view": "summary"}, headers=TENANT_HEADERS)
+        picked = client.get(
+            "/api/v1/jobs", params={**params, "fields": "id,status,created_at"}, headers=TENANT_HEADERS
+        )
+    finally:
+        event.remove(get_async_engine().sync_engine, "before_cursor_execute", record)
+
+    assert summary.status_code == 200
+    jobs = summary.json()["jobs"]
+    assert len(jobs) == 3
+    assert set(jobs[0]) == {
+        "id", "feature", "status", "priority", "attempts", "progress", "error_message",
+        "created_at", "started_at", "finished_at",
+    }
+    assert jobs[0]["status"] == "queued"
+    assert list(picked.json()["jobs"][0]) == ["id", "status", "created_at"]
+    assert statements and not any("payload" in statement for statement in statements)
+
+    full = client.get("/api/v1/jobs", params=params, headers=TENANT_HEADERS).json()["jobs"]
+    assert full[0]["input_payload"]["texts"]
+    bad = client.get("/api/v1/jobs", params={**params, "fields": "id,input_payload"}, headers=TENANT_HEADERS)
+    assert bad.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_async_services_share_the_database_with_workers(db):
+    """Jobs written by the sync API are visible to the async one and vice versa."""
+    queued = _queue(db, payload={"n": 1})
+
+    async with get_async_session_local()() as adb:
+        job = await get_job_async(adb, queued.id, "tenant_jobs")
+        assert job.status == JobStatus.QUEUED
+        assert await get_job_async(adb, queued.id, "other_tenant") is None
+
+        submitted, created = await submit_job_async(
+            adb, tenant_id="tenant_jobs", user_id="user_1", feature="test_echo", input_payload={"n": 2}
+        )
+        assert created
+        assert [j.id for j in await list_jobs_async(adb, "tenant_jobs")] == [submitted.id, queued.id]
+        summaries = await list_job_summaries_async(adb, "tenant_jobs", ("id", "status"))
+        assert summaries[0] == {"id": submitted.id, "status": "queued"}
+
+        assert await cancel_job_async(adb, job) is True
+        assert job.status == JobStatus.CANCELLED
+
+    db.expire_all()
+    assert db.get(AIJob, submitted.id).input_payload == json.dumps({"n": 2})
+    assert db.get(AIJob, queued.id).status == JobStatus.CANCELLED
@@ -408,6 +408,112 @@ def test_get_artifact(client):
     assert data["feature"] == "categorization"
 
 
+def test_get_archived_artifact(client, tmp_path, monkeypatch):
+    """Compacted artifacts are still listed, and their payloads are read back from the archive."""
+    from datetime import datetime, timedelta
+    from artifact_retention import compact_artifacts
+    from config import settings
+    from database import get_session_local
+
+    monkeypatch.setattr(settings, "ARTIFACT_ARCHIVE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "ARTIFACT_RETENTION_DAYS", 30)
+    headers = {"X-Tenant-ID": "tenant_archive"}
+    client.post("/api/v1/categorize", json={
+        "request_id": "req_archived",
+        "tenant_id": "tenant_archive",
+        "user_id": "user_1",
+        "feature": "categorization",
+        "payload": {"item_name": "Yogurt", "candidate_labels": ["Dairy"]}
+    })
+    db = get_session_local()()
+    try:
+        later = datetime.utcnow() + timedelta(days=settings.ARTIFACT_RETENTION_DAYS + 1)
+        assert compact_artifacts(db, now=later)["archived"] == 1
+    finally:
+        db.close()
+
+    listed = client.get("/api/v1/artifacts", params={"tenant_id": "tenant_archive"}, headers=headers).json()
+    artifact = listed["artifacts"][0]
+    assert artifact["archived"] is True
+    assert artifact["input_payload"] is None
+
+    response = client.get(
+        f"/api/v1/artifacts/{artifact['id']}", params={"tenant_id": "tenant_archive"}, headers=headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["archived"] is True
+    assert data["input_payload"]["item_name"] == "Yogurt"
+    assert data["output_payload"] is not None
+
+
+def test_receipt_image_is_stored_as_payload_blob(client):
+    """Receipt images are listed as blob references and returned in full by the detail endpoint."""
+    from unittest.mock import patch
+    from config import settings
+
+    image = "QUJD" * 4000
+    headers = {"X-Tenant-ID": "tenant_blobs"}
+    with patch.object(settings, "USE_VLLM_OCR", False), \
+         patch.object(settings, "USE_TESSERACT_OCR", False):
+        client.post("/api/v1/extract-receipt", json={
+            "request_id": "req_blob",
+            "tenant_id": "tenant_blobs",
+            "user_id": "user_1",
+            "feature": "receipt_extraction",
+            "payload": {"image_base64": image}
+        })
+
+    listed = client.get("/api/v1/artifacts", params={"tenant_id": "tenant_blobs"}, headers=headers).json()
+    artifact = listed["artifacts"][0]
+    assert set(artifact["input_payload"]["image_base64"]) == {"$blob"}
+
+    response = client.get(
+        f"/api/v1/artifacts/{artifact['id']}", params={"tenant_id": "tenant_blobs"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.json()["input_payload"] == {"image_base64": image}
+
+
+def test_uncaptured_artifacts_are_found_by_input_hash(client, monkeypatch):
+    """Calls whose payloads the capture policy skipped still list, with their input hash."""
+    from config import settings
+
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_CAPTURE_POLICIES", {"categorization": "errors"})
+    headers = {"X-Tenant-ID": "tenant_capture"}
+    for request_id in ("req_capture_1", "req_capture_2"):
+        client.post("/api/v1/categorize", json={
+            "request_id": request_id,
+            "tenant_id": "tenant_capture",
+            "user_id": "user_1",
+            "feature": "categorization",
+            "payload": {"item_name": "Butter", "candidate_labels": ["Dairy"]}
+        })
+
+    artifacts = client.get(
+        "/api/v1/artifacts", params={"tenant_id": "tenant_capture"}, headers=headers
+    ).json()["artifacts"]
+    assert [a["capture"] for a in artifacts] == ["hash", "hash"]
+    assert all(a["input_payload"] is None and a["latency_ms"] is not None for a in artifacts)
+    assert artifacts[0]["input_hash"] == artifacts[1]["input_hash"]
+
+    response = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_capture", "input_hash": artifacts[0]["input_hash"], "fields": "request_id"},
+        headers=headers
+    )
+    assert [a["request_id"] for a in response.json()["artifacts"]] == ["req_capture_2", "req_capture_1"]
+
+    # Feedback links to the artifact as usual
+    response = client.post("/api/v1/feedback", json={
+        "tenant_id": "tenant_capture",
+        "user_id": "user_1",
+        "rating": "thumbs_down",
+        "artifact_id": artifacts[0]["id"],
+    })
+    assert response.status_code == 200
+
+
 def test_artifact_tenant_isolation(client):
     """Test that artifacts are isolated by tenant."""
     # Create artifact for tenant A
@@ -447,6 +553,70 @@ def test_artifact_tenant_isolation(client):
     assert all(a["tenant_id"] == "tenant_iso_b" for a in artifacts_b)
 
 
+def test_list_artifacts_summary_view(client):
+    """Test the summary list view omits payloads."""
+    client.post("/api/v1/categorize", json={
+        "request_id": "req_summary",
+        "tenant_id": "tenant_summary",
+        "user_id": "user_1",
+        "feature": "categorization",
+        "payload": {"item_name": "Milk", "candidate_labels": ["Dairy"]}
+    })
+
+    response = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_summary", "view": "summary"},
+        headers={"X-Tenant-ID": "tenant_summary"}
+    )
+    assert response.status_code == 200
+    artifact = response.json()["artifacts"][0]
+    assert artifact["request_id"] == "req_summary"
+    assert "input_payload" not in artifact
+    assert "output_payload" not in artifact
+
+    response = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_summary", "fields": "id,status"},
+        headers={"X-Tenant-ID": "tenant_summary"}
+    )
+    assert list(response.json()["artifacts"][0]) == ["id", "status"]
+
+
+def test_list_artifacts_cursor_pagination(client):
+    """Test paging through artifacts with next_cursor."""
+    headers = {"X-Tenant-ID": "tenant_pages"}
+    for i in range(5):
+        client.post("/api/v1/categorize", json={
+            "request_id": f"req_page_{i}",
+            "tenant_id": "tenant_pages",
+            "user_id": "user_1",
+            "feature": "categorization",
+            "payload": {"item_name": "Milk", "candidate_labels": ["Dairy"]}
+        })
+
+    seen = []
+    params = {"tenant_id": "tenant_pages", "limit": 2, "fields": "request_id", "count": "true"}
+    while True:
+        response = client.get("/api/v1/artifacts", params=params, headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["approximate_total"] == 5
+        assert all(list(artifact) == ["request_id"] for artifact in data["artifacts"])
+        seen.extend(artifact["request_id"] for artifact in data["artifacts"])
+        if data["next_cursor"] is None:
+            break
+        params["cursor"] = data["next_cursor"]
+
+    assert seen == [f"req_page_{i}" for i in reversed(range(5))]
+
+    response = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_pages", "cursor": "not-a-cursor"},
+        headers=headers
+    )
+    assert response.status_code == 400
+
+
 # =============================================================================
 # Feedback Tests
 # =============================================================================
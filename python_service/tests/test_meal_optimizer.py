@@ -0,0 +1,524 @@
+"""
+Tests for meal plan optimization (Z3 and heuristic planners).
+
+Tests cover:
+- Heuristic planner feasibility (locks, time budgets, no repetition)
+- Heuristic vs Z3 objective agreement on small problems
+- /api/v1/optimize/meal-plan endpoint solver modes
+- Solution cache canonicalization, LRU/TTL and metrics
+- Portfolio solving across encodings, seeds and the heuristic
+- Batch meal plan streaming endpoint
+- Vectorized quick suggestions over the cached recipe matrix
+"""
+
+import json
+import os
+import random
+import time
+import pytest
+import tempfile
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+
+from main import app
+from database import Base, get_engine, reset_engine
+from meal_optimizer import (
+    PORTFOLIO_CONFIGS, HeuristicMealPlanner, MealPlanOptimizer, RecipeLibrary,
+    get_recipe_matrix, optimize_meal_plan, quick_suggestions, solve_portfolio,
+)
+from solution_cache import SolutionCache, meal_plan_cache, problem_hash, recipe_library_hash
+
+# Create a temporary database file for tests
+_test_db_file = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+os.environ["AI_DATABASE_URL"] = f"sqlite:///{_test_db_file.name}"
+
+
+@pytest.fixture(scope="function")
+def db_session():
+    """Create a fresh database for each test."""
+    reset_engine()
+    engine = get_engine()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def clear_solution_cache():
+    """Start every test with an empty meal plan cache."""
+    meal_plan_cache.clear()
+    yield
+    meal_plan_cache.clear()
+
+
+@pytest.fixture
+def client(db_session):
+    """Create test client with fresh database."""
+    return TestClient(app)
+
+
+@pytest.fixture
+def problem():
+    """A small weekly planning problem with expiring items and constraints."""
+    return {
+        "planning_horizon": {"start_date": "2024-01-01", "days": 3, "meal_types": ["dinner"]},
+        "inventory": [
+            {"ingredient_id": "spinach", "name": "Spinach", "quantity": 1, "days_until_expiry": 1},
+            {"ingredient_id": "chicken", "name": "Chicken", "quantity": 2, "days_until_expiry": 3},
+            {"ingredient_id": "rice", "name": "Rice", "quantity": 5},
+        ],
+        "recipes": [
+            {
+                "id": "r_salad", "name": "Spinach Salad", "prep_time": 10, "cook_time": 0,
+                "ingredients": [{"ingredient_id": "spinach", "quantity": 1}],
+            },
+            {
+                "id": "r_curry", "name": "Chicken Curry", "prep_time": 20, "cook_time": 40,
+                "ingredients": [
+                    {"ingredient_id": "chicken", "quantity": 1},
+                    {"ingredient_id": "rice", "quantity": 1},
+                ],
+            },
+            {
+                "id": "r_stirfry", "name": "Chicken Stir Fry", "prep_time": 10, "cook_time": 15,
+                "ingredients": [
+                    {"ingredient_id": "chicken", "quantity": 1},
+                    {"ingredient_id": "rice", "quantity": 1},
+                ],
+            },
+            {
+                "id": "r_steak", "name": "Steak", "prep_time": 5, "cook_time": 10,
+                "ingredients": [{"ingredient_id": "beef", "name": "Beef", "quantity": 2}],
+            },
+        ],
+        "constraints": {
+            "time_budgets": {"2024-01-01": 30},
+            "locked_meals": [{"date": "2024-01-03", "recipe_id": "r_salad"}],
+        },
+        "weights": {},
+    }
+
+
+# =============================================================================
+# Heuristic Planner
+# =============================================================================
+
+
+def test_heuristic_plan_respects_constraints(problem):
+    """Heuristic plan keeps locks, time budgets and recipe uniqueness."""
+    result = optimize_meal_plan(problem, timeout_ms=50, solver="heuristic")
+
+    assert result["status"] == "feasible"
+    plan = {entry["day_index"]: entry["recipe_id"] for entry in result["solution"]["meal_plan"]}
+    assert plan[2] == "r_salad"
+    assert plan.get(0) != "r_curry"  # 60 minutes exceeds the 30 minute budget
+    assert len(set(plan.values())) == len(plan)
+
+
+def test_heuristic_objective_matches_z3_on_small_problem(problem):
+    """Heuristic reaches the Z3 optimum here and reports a valid upper bound."""
+    heuristic = optimize_meal_plan(problem, timeout_ms=50, solver="heuristic")
+    exact = optimize_meal_plan(problem, timeout_ms=5000)
+
+    assert exact["status"] == "optimal"
+    assert heuristic["objective_value"] == exact["objective_value"]
+    assert heuristic["objective_bound"] >= exact["objective_value"]
+
+
+def test_heuristic_objective_agrees_with_plan(problem):
+    """Reported objective equals the objective of the returned recipes."""
+    planner = HeuristicMealPlanner(problem)
+    result = planner.solve(time_limit_ms=50)
+    selected = [entry["recipe_id"] for entry in result["solution"]["meal_plan"]]
+    assert planner.objective(selected) == result["objective_value"]
+
+
+def test_heuristic_conflicting_locks_have_no_solution(problem):
+    """Locking one recipe onto two days is infeasible, as in the Z3 model."""
+    problem["constraints"]["locked_meals"].append({"date": "2024-01-02", "recipe_id": "r_salad"})
+    result = optimize_meal_plan(problem, timeout_ms=50, solver="heuristic")
+    assert result["status"] == "no_solution"
+
+
+def test_unknown_solver_rejected(problem):
+    """Unknown solver names raise ValueError."""
+    with pytest.raises(ValueError):
+        optimize_meal_plan(problem, solver="simulated_annealing")
+
+
+# =============================================================================
+# /api/v1/optimize/meal-plan
+# =============================================================================
+
+
+def test_meal_plan_endpoint_heuristic(client, problem):
+    """Heuristic mode returns a plan with objective and bound."""
+    response = client.post("/api/v1/optimize/meal-plan", json={
+        "request_id": "req_meal_h",
+        "tenant_id": "tenant_meal",
+        "user_id": "user_1",
+        "feature": "meal_optimization",
+        "payload": {**problem, "solver": "heuristic"},
+    })
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "success"
+    assert data["payload"]["status"] == "feasible"
+    assert data["payload"]["objective_value"] <= data["payload"]["objective_bound"]
+    assert "refinement_job_id" not in data["payload"]
+
+
+def test_meal_plan_endpoint_heuristic_with_refinement_job(client, problem):
+    """refine=true submits a background Z3 job visible via the jobs API."""
+    response = client.post("/api/v1/optimize/meal-plan", json={
+        "request_id": "req_meal_r",
+        "tenant_id": "tenant_meal",
+        "user_id": "user_1",
+        "feature": "meal_optimization",
+        "payload": {**problem, "solver": "heuristic", "refine": True},
+    })
+    job_id = response.json()["payload"]["refinement_job_id"]
+
+    job_response = client.get(
+        f"/api/v1/jobs/{job_id}",
+        params={"tenant_id": "tenant_meal"},
+        headers={"X-Tenant-ID": "tenant_meal"},
+    )
+    assert job_response.status_code == 200
+    assert job_response.json()["feature"] == "meal_optimization"
+
+
+def test_meal_plan_endpoint_z3_reports_objective(client, problem):
+    """Default Z3 mode reports its objective value and stores an artifact."""
+    response = client.post("/api/v1/optimize/meal-plan", json={
+        "request_id": "req_meal_z3",
+        "tenant_id": "tenant_meal",
+        "user_id": "user_1",
+        "feature": "meal_optimization",
+        "payload": problem,
+    })
+    data = response.json()
+    assert data["payload"]["status"] == "optimal"
+    assert isinstance(data["payload"]["objective_value"], int)
+
+    artifacts = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_meal"},
+        headers={"X-Tenant-ID": "tenant_meal"},
+    ).json()["artifacts"]
+    assert any(a["request_id"] == "req_meal_z3" for a in artifacts)
+
+
+def test_meal_plan_endpoint_solves_off_the_event_loop(client, problem):
+    """Z3 and portfolio solves run on the solver pool, not the event loop thread."""
+    import threading
+    solve_threads = []
+
+    def recording_optimize(*args, **kwargs):
+        solve_threads.append(threading.current_thread().name)
+        return optimize_meal_plan(*args, **kwargs)
+
+    with patch("main.optimize_meal_plan", recording_optimize):
+        for solver in ("z3", "portfolio"):
+            response = client.post("/api/v1/optimize/meal-plan", json={
+                "request_id": f"req_meal_{solver}_pool",
+                "tenant_id": "tenant_meal",
+                "user_id": "user_1",
+                "feature": "meal_optimization",
+                "payload": {**problem, "solver": solver},
+            })
+            assert response.json()["status"] == "success"
+
+    assert len(solve_threads) == 2
+    assert all(name.startswith("meal-solver") for name in solve_threads)
+
+
+# =============================================================================
+# Solution Cache
+# =============================================================================
+
+
+def test_canonical_hash_ignores_ordering_and_float_noise(problem):
+    """Reordered recipes/inventory and 1 vs 1.0 produce the same hash."""
+    reordered = {
+        **problem,
+        "recipes": list(reversed(problem["recipes"])),
+        "inventory": list(reversed(problem["inventory"])),
+    }
+    reordered["inventory"][0] = {**reordered["inventory"][0], "quantity": 5.0}
+
+    assert problem_hash(problem) == problem_hash(reordered)
+    assert problem_hash(problem, "z3") != problem_hash(problem, "heuristic")
+
+
+def test_cache_hit_skips_solver(problem):
+    """A repeated problem is served from cache without invoking Z3."""
+    first = optimize_meal_plan(problem)
+    assert "cached" not in first
+
+    with patch("meal_optimizer.MealPlanOptimizer.solve") as solve:
+        second = optimize_meal_plan(problem)
+    solve.assert_not_called()
+    assert second["cached"] is True
+    assert second["objective_value"] == first["objective_value"]
+    assert meal_plan_cache.stats()["hits"] == 1
+
+
+def test_cache_lru_eviction_and_ttl():
+    """Entries are evicted beyond max_entries and expire after the TTL."""
+    cache = SolutionCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    cache.get("a")
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_cache_disk_persistence(tmp_path):
+    """A fresh cache instance reads entries persisted by another."""
+    SolutionCache(disk_dir=str(tmp_path)).set("key", {"status": "optimal"})
+    cache = SolutionCache(disk_dir=str(tmp_path))
+    assert cache.get("key") == {"status": "optimal"}
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_cache_respects_time_budget(problem):
+    """Feasible Z3 results are not cached; heuristic results are reused only for the same budget."""
+    feasible = {"status": "feasible", "objective_value": 1, "meal_plan": []}
+    with patch("meal_optimizer._solve_with_config", return_value=feasible) as solve:
+        optimize_meal_plan(problem, timeout_ms=50)
+        optimize_meal_plan(problem, timeout_ms=5000)
+    assert solve.call_count == 2
+
+    optimize_meal_plan(problem, solver="heuristic", timeout_ms=50)
+    with patch("meal_optimizer._solve_with_config", return_value=feasible) as solve:
+        assert optimize_meal_plan(problem, solver="heuristic", timeout_ms=50)["cached"] is True
+        assert "cached" not in optimize_meal_plan(problem, solver="heuristic", timeout_ms=500)
+    assert solve.call_count == 1
+
+
+def test_cache_disk_is_pruned(tmp_path):
+    """Expired files are deleted on startup and on read; the oldest go beyond the file cap."""
+    old = SolutionCache(disk_dir=str(tmp_path))
+    old.set("stale", {"v": 0})
+    old.set("expired_read", {"v": 0})
+    stale_time = time.time() - 7200
+    os.utime(tmp_path / "stale.json", (stale_time, stale_time))
+
+    cache = SolutionCache(ttl_seconds=3600, disk_dir=str(tmp_path), max_disk_entries=10)
+    assert not (tmp_path / "stale.json").exists()
+    assert cache.stats()["disk_pruned"] == 1
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("expired_read") is None
+    assert not (tmp_path / "expired_read.json").exists()
+
+    cache.ttl_seconds = 3600
+    for i in range(11):
+        cache.set(f"key_{i}", {"v": i})
+        modified = time.time() - 100 + i
+        os.utime(tmp_path / f"key_{i}.json", (modified, modified))
+    files = sorted(path.name for path in tmp_path.glob("*.json"))
+    assert len(files) == 9 and "key_0.json" not in files and "key_10.json" in files
+    assert cache.stats()["disk_files"] == 9
+
+
+def test_metrics_endpoint_reports_cache_hit_rate(client, problem):
+    """/metrics exposes meal plan cache counters."""
+    optimize_meal_plan(problem, solver="heuristic")
+    optimize_meal_plan(problem, solver="heuristic")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    stats = response.json()["meal_plan_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+# =============================================================================
+# Portfolio Solving
+# =============================================================================
+
+
+def test_pb_encoding_matches_arith_encoding(problem):
+    """The pseudo-boolean encoding reaches the same optimum."""
+    results = []
+    for encoding in ("arith", "pb"):
+        optimizer = MealPlanOptimizer(problem, encoding=encoding, random_seed=3)
+        optimizer.build_model()
+        results.append(optimizer.solve(timeout_ms=5000))
+    assert results[0]["objective_value"] == results[1]["objective_value"]
+
+
+def test_portfolio_returns_first_optimal(problem):
+    """A Z3 configuration proves optimality and is reported as the winner."""
+    result = solve_portfolio(
+        problem,
+        timeout_ms=5000,
+        configs=[c for c in PORTFOLIO_CONFIGS if c["solver"] == "z3"][:2],
+    )
+    assert result["status"] == "optimal"
+    assert result["portfolio"]["winner"] in ("z3_arith", "z3_pb")
+
+
+def test_portfolio_falls_back_to_best_at_deadline():
+    """When Z3 cannot finish in time, the heuristic's plan wins at the deadline."""
+    rng = random.Random(1)
+    large_problem = {
+        "planning_horizon": {"start_date": "2024-01-01", "days": 7},
+        "inventory": [
+            {"ingredient_id": f"i{k}", "name": f"I{k}", "quantity": rng.randint(0, 3),
+             "days_until_expiry": rng.choice([None, 1, 2, 3, 5])}
+            for k in range(40)
+        ],
+        "recipes": [
+            {"id": f"r{j}", "name": f"R{j}", "ingredients": [
+                {"ingredient_id": f"i{rng.randrange(40)}", "quantity": rng.randint(1, 2)}
+                for _ in range(rng.randint(2, 6))
+            ]}
+            for j in range(40)
+        ],
+    }
+
+    result = solve_portfolio(
+        large_problem,
+        timeout_ms=300,
+        configs=[
+            {"name": "heuristic", "solver": "heuristic"},
+            {"name": "z3_arith", "solver": "z3", "encoding": "arith"},
+        ],
+    )
+    assert result["status"] == "feasible"
+    assert result["portfolio"]["winner"] == "heuristic"
+    assert result["portfolio"]["statuses"].get("z3_arith") != "optimal"
+
+
+# =============================================================================
+# /api/v1/optimize/meal-plan/batch
+# =============================================================================
+
+
+def test_meal_plan_batch_streams_result_per_household(client, problem):
+    """Each household gets one NDJSON line; problems share the batch recipe library."""
+    shared_recipes = problem.pop("recipes")
+    problems = [
+        {**problem, "household_id": f"household_{i}", "solver": "heuristic"}
+        for i in range(3)
+    ]
+    problems.append({**problem, "household_id": "household_z3", "recipes": shared_recipes})
+
+    with patch("main.RecipeLibrary", wraps=RecipeLibrary) as library_cls:
+        response = client.post("/api/v1/optimize/meal-plan/batch", json={
+            "request_id": "req_meal_batch",
+            "tenant_id": "tenant_meal",
+            "user_id": "user_1",
+            "feature": "meal_optimization",
+            "payload": {"problems": problems, "recipes": shared_recipes, "max_concurrency": 2},
+        })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["household_id"] for line in lines) == [
+        "household_0", "household_1", "household_2", "household_z3",
+    ]
+    assert all(line["status"] == "success" for line in lines)
+    assert library_cls.call_count == 1
+
+    artifacts = client.get(
+        "/api/v1/artifacts",
+        params={"tenant_id": "tenant_meal", "feature": "meal_optimization_batch"},
+        headers={"X-Tenant-ID": "tenant_meal"},
+    ).json()["artifacts"]
+    assert len(artifacts[0]["output_payload"]["statuses"]) == 4
+
+
+def test_meal_plan_batch_invalid_payload(client):
+    """An invalid batch payload returns a regular error response."""
+    response = client.post("/api/v1/optimize/meal-plan/batch", json={
+        "request_id": "req_meal_batch_bad",
+        "tenant_id": "tenant_meal",
+        "feature": "meal_optimization",
+        "payload": {"problems": [{"household_id": "h1"}]},
+    })
+    assert response.status_code == 200
+    assert response.json()["status"] == "error"
+
+
+def test_meal_plan_batch_rejects_too_many_problems(client, problem, monkeypatch):
+    """Batches over MEAL_PLAN_BATCH_MAX_PROBLEMS are rejected with 422 and nothing is solved."""
+    import main
+
+    monkeypatch.setattr(main.settings, "MEAL_PLAN_BATCH_MAX_PROBLEMS", 2)
+    households = [{**problem, "household_id": f"h{i}", "solver": "heuristic"} for i in range(3)]
+    with patch("main.optimize_meal_plan") as solve:
+        response = client.post("/api/v1/optimize/meal-plan/batch", json={
+            "request_id": "req_meal_batch_big",
+            "tenant_id": "tenant_meal",
+            "feature": "meal_optimization",
+            "payload": {"problems": households},
+        })
+    assert response.status_code == 422
+    solve.assert_not_called()
+
+
+# =============================================================================
+# Quick suggestions
+# =============================================================================
+
+
+def test_quick_suggestions_ranking(problem):
+    """Recipes using the soonest-expiring stock rank first; ties keep input order."""
+    suggestions = quick_suggestions(problem["inventory"], problem["recipes"], limit=5)
+
+    assert [s["recipe_id"] for s in suggestions] == ["r_salad", "r_curry", "r_stirfry"]
+    assert suggestions[0]["expiring_used"] == ["Spinach"]
+    assert all(s["missing"] == [] for s in suggestions)
+    assert quick_suggestions(problem["inventory"], problem["recipes"], limit=0) == []
+
+
+def test_quick_suggestions_reuses_recipe_matrix(problem):
+    """The recipe matrix is built once per library and can be passed directly."""
+    matrix = get_recipe_matrix(problem["recipes"])
+    assert get_recipe_matrix(list(problem["recipes"])) is matrix
+
+    with patch("meal_optimizer.RecipeMatrix") as matrix_cls:
+        direct = quick_suggestions(problem["inventory"], None, limit=2, matrix=matrix)
+        cached = quick_suggestions(problem["inventory"], problem["recipes"], limit=2)
+    matrix_cls.assert_not_called()
+    assert direct == cached
+
+    # A known library hash skips hashing the library again
+    assert matrix.key == recipe_library_hash(problem["recipes"])
+    with patch("meal_optimizer.recipe_library_hash", side_effect=AssertionError("rehashed")):
+        by_hash = quick_suggestions(problem["inventory"], problem["recipes"], limit=2, library_hash=matrix.key)
+    assert by_hash == cached
+
+
+def test_suggestions_endpoint_accepts_library_hash(client, problem):
+    """Clients may send recipe_library_hash instead of resending the recipes."""
+    request = {
+        "request_id": "req_suggest",
+        "tenant_id": "tenant_meal",
+        "feature": "meal_optimization",
+        "payload": {"inventory": problem["inventory"], "recipes": problem["recipes"], "limit": 2},
+    }
+    first = client.post("/api/v1/optimize/suggestions", json=request).json()
+    assert first["status"] == "success"
+    library_hash = first["payload"]["recipe_library_hash"]
+
+    request["payload"] = {"inventory": problem["inventory"], "recipe_library_hash": library_hash, "limit": 2}
+    second = client.post("/api/v1/optimize/suggestions", json=request).json()
+    assert second["payload"]["suggestions"] == first["payload"]["suggestions"]
+
+    request["payload"]["recipe_library_hash"] = "unknown"
+    assert client.post("/api/v1/optimize/suggestions", json=request).json()["status"] == "error"
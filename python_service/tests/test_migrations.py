@@ -0,0 +1,164 @@
+"""
+Tests for the schema migrations.
+
+Tests cover:
+- Upgrading fresh databases and databases created before migrations
+- Online index creation and rebuilds
+- Failing migrations and startup without migrating
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Column, Enum as SQLEnum, MetaData, String, Table, inspect, text
+
+import database
+import migrations
+from config import settings
+from database import AIJob, Base, JobStatus
+from db_config import create_db_engine
+from migrations import (
+    MIGRATIONS, Migration, add_column, applied_versions, create_index, pending_migrations, schema_drift, upgrade,
+)
+
+
+@pytest.fixture
+def engine():
+    """Engine on an empty scratch SQLite database file."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'migrations.db')}")
+        yield engine
+        engine.dispose()
+
+
+def _indexes(engine, table):
+    return {index["name"]: index["column_names"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_creates_a_fresh_database(engine):
+    """All migrations run on an empty database, once."""
+    versions = [migration.version for migration in MIGRATIONS]
+
+    assert upgrade(engine) == versions
+    assert applied_versions(engine) == set(versions)
+    assert schema_drift(engine) == []
+    assert upgrade(engine) == []
+
+
+def test_upgrade_brings_an_old_database_up_to_date(engine):
+    """A database from before migrations keeps its rows and gets the missing columns and indexes."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_ai_jobs_tenant_created"))
+        conn.execute(text("DROP INDEX ix_ai_jobs_tenant_status_created"))
+        conn.execute(text("CREATE INDEX ix_ai_jobs_tenant_created ON ai_jobs (tenant_id, created_at)"))
+        conn.execute(text("CREATE INDEX ix_ai_jobs_tenant_id ON ai_jobs (tenant_id)"))
+        conn.execute(text("ALTER TABLE ai_jobs DROP COLUMN deadline_at"))
+        conn.execute(text(
+            "INSERT INTO ai_jobs (id, tenant_id, user_id, feature, status, priority, attempts, created_at) "
+            "VALUES ('job_old', 'tenant_1', 'user_1', 'categorization', 'QUEUED', 0, 0, :now)"
+        ), {"now": datetime.utcnow()})
+    assert schema_drift(engine)
+
+    upgrade(engine)
+
+    assert schema_drift(engine) == []
+    indexes = _indexes(engine, "ai_jobs")
+    assert indexes["ix_ai_jobs_tenant_created"] == ["tenant_id", "created_at", "id"]
+    assert "ix_ai_jobs_tenant_id" not in indexes
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT id, deadline_at FROM ai_jobs")).all() == [("job_old", None)]
+
+
+def test_create_index_is_idempotent_and_rebuilds_changed_indexes(engine):
+    """create_index adds a missing index, leaves a matching one and rebuilds one with other columns."""
+    Base.metadata.create_all(bind=engine)
+    index = next(i for i in AIJob.__table__.indexes if i.name == "ix_ai_jobs_tenant_feature_created")
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_ai_jobs_tenant_feature_created"))
+
+    create_index(engine, index)
+    create_index(engine, index)
+    assert _indexes(engine, "ai_jobs")[index.name] == ["tenant_id", "feature", "created_at", "id"]
+
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_ai_jobs_tenant_feature_created"))
+        conn.execute(text("CREATE INDEX ix_ai_jobs_tenant_feature_created ON ai_jobs (tenant_id, feature)"))
+    create_index(engine, index)
+    assert _indexes(engine, "ai_jobs")[index.name] == ["tenant_id", "feature", "created_at", "id"]
+
+
+def test_add_column_renders_defaults_as_sql_literals(engine):
+    """Enum and quoted string defaults are filled into existing rows."""
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE ai_test_items (id VARCHAR(16) PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO ai_test_items (id) VALUES ('item_1')"))
+    table = Table(
+        "ai_test_items", MetaData(),
+        Column("id", String(16), primary_key=True),
+        Column("status", SQLEnum(JobStatus, native_enum=False), default=JobStatus.QUEUED, nullable=False),
+        Column("note", String(32), default="it's new", nullable=False),
+    )
+
+    add_column(engine, table.c.status)
+    add_column(engine, table.c.note)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT status, note FROM ai_test_items")).all() == [("QUEUED", "it's new")]
+
+
+def test_failed_migration_stays_pending(engine, monkeypatch):
+    """A failing migration is not recorded and runs again on the next upgrade."""
+    calls = []
+
+    def flaky(engine):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("interrupted")
+        with engine.begin() as conn:
+            conn.execute(text("CREATE TABLE IF NOT EXISTS ai_test_cache (key VARCHAR(64) PRIMARY KEY)"))
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", MIGRATIONS + [Migration(99, "test_cache", flaky)])
+
+    with pytest.raises(RuntimeError):
+        upgrade(engine)
+    assert [m.version for m in pending_migrations(engine)] == [99]
+
+    assert upgrade(engine) == [99]
+    assert pending_migrations(engine) == []
+    assert inspect(engine).has_table("ai_test_cache")
+
+
+def test_upgrade_stops_at_target(engine):
+    """upgrade(target=...) applies migrations up to that version only."""
+    assert upgrade(engine, target=1) == [1]
+    assert [m.version for m in pending_migrations(engine)] == [m.version for m in MIGRATIONS[1:]]
+
+
+def test_baseline_is_frozen(engine):
+    """On a fresh database the baseline creates the original schema; later migrations add the rest."""
+    upgrade(engine, target=1)
+    drift = schema_drift(engine)
+    assert "missing table ai_payload_blobs" in drift
+    assert "missing column ai_artifacts.archive_ref" in drift
+    assert "missing index ix_ai_artifacts_tenant_input_hash_created" in drift
+
+    upgrade(engine)
+    assert schema_drift(engine) == []
+
+
+def test_init_db_only_warns_when_startup_migrations_are_disabled(engine, monkeypatch):
+    """With DB_MIGRATE_ON_STARTUP=false the schema is left for `python migrations.py upgrade`."""
+    warnings = []
+    monkeypatch.setattr(database, "get_engine", lambda: engine)
+    monkeypatch.setattr(database.logger, "warning", warnings.append)
+    monkeypatch.setattr(settings, "DB_MIGRATE_ON_STARTUP", False)
+
+    database.init_db()
+    assert "pending schema migration" in warnings[0]
+    assert not inspect(engine).has_table("ai_jobs")
+
+    monkeypatch.setattr(settings, "DB_MIGRATE_ON_STARTUP", True)
+    database.init_db()
+    assert pending_migrations(engine) == []
@@ -0,0 +1,186 @@
+"""
+Tests for deduplicated and compressed artifact payload storage.
+
+Tests cover:
+- Long payload strings moved to deduplicated, reference-counted blobs
+- Compressed payload columns on SQLite
+- Blobs inlined into the archive and released by compaction
+"""
+
+import base64
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+from artifact_retention import compact_artifacts, restore_archived_payloads
+from artifacts import artifact_row, artifact_to_dict, insert_artifacts
+from config import settings
+from database import AIArtifact, AIPayloadBlob, Base
+from db_config import create_db_engine
+from payload_blobs import BLOB_KEY, blob_hashes, extract_blobs, load_blobs, restore_blobs
+
+IMAGE = base64.b64encode(os.urandom(30_000)).decode()
+
+
+@pytest.fixture
+def engine():
+    """Engine on a scratch SQLite database file with the current schema."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(f"sqlite:///{os.path.join(tmp, 'blobs.db')}")
+        Base.metadata.create_all(bind=engine)
+        yield engine
+        engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def storage_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARTIFACT_BLOB_MIN_BYTES", 4096)
+    monkeypatch.setattr(settings, "ARTIFACT_PAYLOAD_COMPRESS_MIN_BYTES", 512)
+    monkeypatch.setattr(settings, "ARTIFACT_PAYLOAD_COMPRESSION", "zlib")
+    monkeypatch.setattr(settings, "ARTIFACT_CAPTURE_POLICY", "always")
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_CAPTURE_POLICIES", {})
+    monkeypatch.setattr(settings, "ARTIFACT_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(settings, "ARTIFACT_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_RETENTION_DAYS", {})
+    monkeypatch.setattr(settings, "ARTIFACT_ARCHIVE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "ARTIFACT_FEATURE_ARCHIVE_SAMPLE_RATES", {})
+
+
+def _receipt(i=0, image=IMAGE, **fields):
+    return artifact_row(
+        request_id=f"req_{i}", tenant_id="tenant_1", feature="receipt_extraction",
+        input_payload={"image_base64": image, "store": "Corner Shop"},
+        output_payload={"items": [{"name": "Milk", "price": 1.99}], "total": 1.99},
+        **fields,
+    )
+
+
+def _blobs(db):
+    return {blob.hash: blob for blob in db.query(AIPayloadBlob)}
+
+
+def test_duplicate_images_are_stored_once(db):
+    """Re-uploads of an image reference the same blob; the rows stay small."""
+    rows = [_receipt(i) for i in range(3)]
+    insert_artifacts(db, rows[:2])
+    insert_artifacts(db, rows[2:])
+
+    blobs = _blobs(db)
+    assert len(blobs) == 1
+    blob = next(iter(blobs.values()))
+    assert blob.refs == 3
+    assert blob.codec == "base64"
+    assert blob.size == len(IMAGE) and len(blob.data) == 30_000  # stored decoded
+
+    artifact = db.get(AIArtifact, rows[0]["id"])
+    assert artifact.blob_hashes == blob.hash
+    assert len(artifact.input_payload) < 200
+    record = artifact_to_dict(artifact)
+    assert record["input_payload"]["image_base64"] == {BLOB_KEY: blob.hash}
+    # The input hash is of the full input
+    assert artifact.input_hash == rows[1]["input_hash"]
+
+    restored = restore_blobs(record, load_blobs(db, blob_hashes(artifact.blob_hashes)))
+    assert restored["input_payload"] == {"image_base64": IMAGE, "store": "Corner Shop"}
+
+
+def test_long_text_blobs_are_compressed(db):
+    """Long strings that are not base64 are stored compressed and read back as they were."""
+    notes = "Milk, eggs & bread; " * 500
+    row = artifact_row(
+        request_id="req_1", tenant_id="tenant_1", feature="chat",
+        input_payload={"notes": notes, "short": "kept inline"}, output_payload={"echo": [notes]},
+    )
+    insert_artifacts(db, [row])
+
+    (blob,) = _blobs(db).values()
+    assert blob.codec == "zlib" and blob.refs == 1  # one reference per artifact
+    assert len(blob.data) < len(notes) / 10
+
+    artifact = db.get(AIArtifact, row["id"])
+    record = restore_blobs(artifact_to_dict(artifact), load_blobs(db, blob_hashes(artifact.blob_hashes)))
+    assert record["input_payload"] == {"notes": notes, "short": "kept inline"}
+    assert record["output_payload"] == {"echo": [notes]}
+
+
+def test_large_payloads_are_compressed_on_sqlite(engine, db):
+    """Payload JSON above the threshold is stored as a compressed BLOB value; small payloads stay TEXT."""
+    large = artifact_row(
+        request_id="req_large", tenant_id="tenant_1", feature="categorization",
+        input_payload={"items": [f"item {i}" for i in range(300)]}, output_payload={"category": "Dairy"},
+    )
+    small = artifact_row(
+        request_id="req_small", tenant_id="tenant_1", feature="categorization",
+        input_payload={"item_name": "Milk"}, output_payload={"category": "Dairy"},
+    )
+    insert_artifacts(db, [large, small])
+
+    with engine.connect() as conn:
+        stored = dict(conn.execute(text(
+            "SELECT request_id, typeof(input_payload) || ':' || length(input_payload) FROM ai_artifacts"
+        )).all())
+    assert stored["req_small"].startswith("text:")
+    kind, size = stored["req_large"].split(":")
+    assert kind == "blob" and int(size) < len(large["input_payload"]) / 2
+
+    assert json.loads(db.get(AIArtifact, large["id"]).input_payload)["items"][299] == "item 299"
+
+
+def test_reference_lookalikes_are_not_resolved(db):
+    """A payload that merely contains a blob reference does not read that blob."""
+    original = _receipt(1)
+    blob_hash = next(iter(original["payload_blobs"]))
+    forged = artifact_row(
+        request_id="req_forged", tenant_id="tenant_2", feature="chat",
+        input_payload={"message": {BLOB_KEY: blob_hash}},
+    )
+    insert_artifacts(db, [original, forged])
+
+    artifact = db.get(AIArtifact, forged["id"])
+    assert artifact.blob_hashes is None
+    assert load_blobs(db, blob_hashes(artifact.blob_hashes)) == {}
+    assert _blobs(db)[blob_hash].refs == 1
+
+
+def test_compaction_archives_and_releases_blobs(db):
+    """Compacted artifacts keep their images in the archive; blobs nobody references are deleted."""
+    now = datetime(2024, 6, 1)
+    old = [{**_receipt(i), "created_at": now - timedelta(days=40)} for i in range(2)]
+    other_image = base64.b64encode(os.urandom(6_000)).decode()
+    recent = {**_receipt(9, image=other_image), "created_at": now - timedelta(days=1)}
+    shared = {**_receipt(10), "created_at": now - timedelta(days=1)}
+    insert_artifacts(db, [*old, recent])
+    assert len(_blobs(db)) == 2
+
+    assert compact_artifacts(db, now=now) == {"archived": 2, "deleted": 0}
+    assert set(_blobs(db)) == set(recent["payload_blobs"])
+
+    artifact = db.get(AIArtifact, old[0]["id"])
+    assert artifact.blob_hashes is None
+    restored = restore_archived_payloads(artifact_to_dict(artifact), artifact.archive_ref)
+    assert restored["input_payload"]["image_base64"] == IMAGE
+
+    # A new upload of a released image stores it again
+    insert_artifacts(db, [shared])
+    assert _blobs(db)[next(iter(shared["payload_blobs"]))].refs == 1
+
+
+def test_extract_blobs_leaves_short_payloads_unchanged():
+    """Payloads without long strings are returned as they are, without copying."""
+    payload = {"a": ["x" * 10, {"b": 1}], "c": None}
+    blobs = {}
+    assert extract_blobs(payload, blobs, min_bytes=100) is payload
+    assert extract_blobs(payload, blobs, min_bytes=0) is payload
+    assert blobs == {}
@@ -0,0 +1,212 @@
+"""
+Job worker for the durable ai_jobs queue.
+
+Workers poll the queue, claim jobs with a lease (see jobs.claim_next_job),
+renew the lease while the handler runs and periodically sweep expired leases
+back into the queue, so jobs survive API restarts and crashed workers. Claims,
+sweeps and lease renewals use the sync session on a thread, so a worker
+embedded in the API never blocks its event loop.
+
+By default one worker runs inside the API process (JOB_EMBEDDED_WORKER). To run
+jobs in dedicated processes instead, set JOB_EMBEDDED_WORKER=false on the API
+and start:
+
+    python worker.py --processes 2
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import uuid
+from collections import Counter
+from typing import Optional
+
+from config import settings
+from database import get_session_local
+from jobs import (
+    add_queued_listener, claim_next_job, execute_job, expire_overdue_jobs,
+    fail_unhandled_jobs, get_handler_concurrency, recover_expired_leases, registered_features,
+    remove_queued_listener,
+)
+
+logger = logging.getLogger("grocery-planner-ai.worker")
+
+
+class JobWorker:
+    """
+    Claims and executes queued jobs with per-feature concurrency limits.
+
+    Args:
+        worker_id: Lease owner identifier (default: host, pid and a random suffix)
+        concurrency: Per-feature limits (default: settings.JOB_FEATURE_CONCURRENCY)
+        default_concurrency: Limit for features not in concurrency and whose
+            handler declares no concurrency
+        lease_seconds: Lease duration renewed by heartbeats
+        poll_interval: Seconds to wait between polls when idle
+    """
+
+    def __init__(
+        self,
+        worker_id: Optional[str] = None,
+        concurrency: Optional[dict[str, int]] = None,
+        default_concurrency: Optional[int] = None,
+        lease_seconds: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = settings.JOB_FEATURE_CONCURRENCY if concurrency is None else concurrency
+        self.default_concurrency = default_concurrency or settings.JOB_DEFAULT_CONCURRENCY
+        self.lease_seconds = lease_seconds or settings.JOB_LEASE_SECONDS
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+
+        self.in_flight: Counter[str] = Counter()
+        self._tasks: set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def limit(self, feature: str) -> int:
+        """Maximum concurrent jobs for a feature on this worker."""
+        if feature in self.concurrency:
+            return self.concurrency[feature]
+        return get_handler_concurrency(feature) or self.default_concurrency
+
+    def available_features(self) -> list[str]:
+        """Registered features that still have a free slot."""
+        return [f for f in registered_features() if self.in_flight[f] < self.limit(f)]
+
+    def wake(self, feature: Optional[str] = None) -> None:
+        """Skip the idle wait (called when a job is queued in this process)."""
+        self._wakeup.set()
+
+    def sweep(self) -> dict[str, int]:
+        """Re-queue expired leases, fail jobs nobody can handle and expire overdue jobs (blocking)."""
+        db = get_session_local()()
+        try:
+            counts = recover_expired_leases(db)
+            counts["unhandled"] = fail_unhandled_jobs(db, registered_features())
+            counts["expired"] = expire_overdue_jobs(db)
+        finally:
+            db.close()
+        if any(counts.values()):
+            logger.info(f"Worker {self.worker_id} sweep: {counts}")
+        return counts
+
+    async def claim_available(self) -> int:
+        """Claim jobs until every feature is at its limit or the queue is empty, and start them."""
+        claimed = await asyncio.to_thread(self._claim, Counter(self.in_flight))
+        for job_id, feature in claimed:
+            self._start(job_id, feature)
+        return len(claimed)
+
+    def _claim(self, in_flight: Counter[str]) -> list[tuple[str, str]]:
+        """Claim jobs (blocking) given a snapshot of the in-flight counts; returns (job ID, feature) pairs."""
+        claimed = []
+        db = get_session_local()()
+        try:
+            while True:
+                features = [f for f in registered_features() if in_flight[f] < self.limit(f)]
+                job = claim_next_job(db, self.worker_id, features, self.lease_seconds)
+                if job is None:
+                    return claimed
+                in_flight[job.feature] += 1
+                claimed.append((job.id, job.feature))
+        finally:
+            db.close()
+
+    def _start(self, job_id: str, feature: str) -> None:
+        self.in_flight[feature] += 1
+        task = asyncio.create_task(execute_job(job_id, self.worker_id, self.lease_seconds))
+        self._tasks.add(task)
+
+        def done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            self.in_flight[feature] -= 1
+            self._wakeup.set()
+
+        task.add_done_callback(done)
+
+    async def drain(self) -> None:
+        """Wait for all in-flight jobs to finish."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stop(self) -> None:
+        """Stop claiming new jobs; run() returns once in-flight jobs finish."""
+        self._stopping = True
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        """Poll, claim and execute jobs until stop() is called."""
+        logger.info(f"Job worker {self.worker_id} started")
+        add_queued_listener(self.wake)
+        loop = asyncio.get_running_loop()
+        next_sweep = 0.0
+        try:
+            while not self._stopping:
+                try:
+                    if loop.time() >= next_sweep:
+                        await asyncio.to_thread(self.sweep)
+                        next_sweep = loop.time() + self.lease_seconds
+                    await self.claim_available()
+                except Exception as e:
+                    logger.exception(f"Job worker {self.worker_id} poll failed: {e}")
+
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            remove_queued_listener(self.wake)
+            await self.drain()
+            logger.info(f"Job worker {self.worker_id} stopped")
+
+
+def _run_process() -> None:
+    """Entry point for one worker process."""
+    import main  # noqa: F401  (registers the job handlers)
+    from database import init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+
+    async def run() -> None:
+        worker = JobWorker()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        await worker.run()
+
+    asyncio.run(run())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run job worker processes")
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_process()
+        return
+
+    processes = [multiprocessing.Process(target=_run_process) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()